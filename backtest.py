@@ -0,0 +1,274 @@
+import argparse
+import json
+import time
+import numpy as np
+from grid_builder import InstrumentRounding, build_grid, step_decimals
+
+
+# Векторизованный бэктест сетки с той же логикой, что strategy() и sma_updater():
+# - на закрытии каждой свечи, если открытых уровней нет, сетка строится заново от SMA (build_grid)
+# - buy уровень срабатывает, когда цена <= entry_price, sell уровень - когда цена >= close_price,
+#   все уровни, пересечённые одним тиком, исполняются по цене этого тика
+# - продажа уровня 0 сбрасывает сетку, новая строится на следующем закрытии свечи
+#
+# Пока есть позиция, сетка не меняется, а уровни торгуют независимо друг от друга, поэтому вместо
+# прохода по каждому тику бэктест переходит от сделки к сделке: "первый тик после i, где цена <= x"
+# ищется по пирамиде минимумов/максимумов блоков (FirstPassage) за O(log n) срезами NumPy.
+# Отсюда же следует, что к моменту продажи уровня 0 все остальные уровни уже проданы.
+
+
+class FirstPassage:
+	"""Поиск первого индекса >= i, где prices <= x (или >= x), по пирамиде минимумов и максимумов блоков"""
+
+	def __init__(self, prices: np.ndarray, fanout: int = 64):
+		self.n = len(prices)
+		self.fanout = fanout
+		self.mins = [prices]
+		self.maxs = [prices]
+		while len(self.mins[-1]) > fanout:
+			pad = (-len(self.mins[-1])) % fanout
+			self.mins.append(np.pad(self.mins[-1], (0, pad), constant_values=np.inf).reshape(-1, fanout).min(axis=1))
+			self.maxs.append(np.pad(self.maxs[-1], (0, pad), constant_values=-np.inf).reshape(-1, fanout).max(axis=1))
+
+	def _first(self, levels: list, i: int, x: float, below: bool) -> int:
+		if i >= self.n:
+			return self.n
+		fanout = self.fanout
+		level, pos = 0, i
+		# Вверх по пирамиде, пока в остатке текущего блока нет нужной цены
+		while True:
+			arr = levels[level]
+			top = level == len(levels) - 1
+			end = len(arr) if top else min(len(arr), (pos // fanout + 1) * fanout)
+			chunk = arr[pos:end]
+			hit = chunk <= x if below else chunk >= x
+			k = int(hit.argmax()) if len(hit) else 0
+			if len(hit) and hit[k]:
+				pos += k
+				break
+			if top:
+				return self.n
+			pos = pos // fanout + 1
+			level += 1
+		# Вниз до конкретного тика
+		while level > 0:
+			level -= 1
+			start = pos * fanout
+			chunk = levels[level][start:start + fanout]
+			pos = start + int((chunk <= x if below else chunk >= x).argmax())
+		return pos
+
+	def first_le(self, i: int, x: float) -> int:
+		"""Первый индекс >= i с ценой <= x, или n"""
+		return self._first(self.mins, i, x, True)
+
+	def first_ge(self, i: int, x: float) -> int:
+		"""Первый индекс >= i с ценой >= x, или n"""
+		return self._first(self.maxs, i, x, False)
+
+
+def ticks_from_candles(ts, opens, highs, lows, closes) -> tuple:
+	"""
+	Путь цены из свечей: 4 точки на свечу, open -> low -> high -> close для растущей свечи
+	и open -> high -> low -> close для падающей. ts - начало свечи, сек.
+	"""
+	ts, opens, highs, lows, closes = (np.asarray(a, dtype=np.float64) for a in (ts, opens, highs, lows, closes))
+	bar = np.diff(ts).min() if len(ts) > 1 else 60.0
+	up = closes >= opens
+	path = np.empty((len(ts), 4))
+	path[:, 0] = opens
+	path[:, 1] = np.where(up, lows, highs)
+	path[:, 2] = np.where(up, highs, lows)
+	path[:, 3] = closes
+	times = ts[:, None] + bar * np.array([0.0, 0.25, 0.5, 0.99])
+	return times.ravel(), path.ravel()
+
+
+def bar_closes(ts: np.ndarray, prices: np.ndarray, bar_seconds: float) -> tuple:
+	"""
+	Закрытия свечей по тикам: (время закрытия каждой свечи, close). Свечи без тиков
+	получают close предыдущей, как у биржи.
+	"""
+	bars = np.floor(ts / bar_seconds).astype(np.int64)
+	first, last = bars[0], bars[-1]
+	last_tick = np.searchsorted(bars, np.arange(first, last + 1), side='right') - 1
+	closes = prices[last_tick]
+	return (np.arange(first, last + 1) + 1) * bar_seconds, closes
+
+
+def sma_anchors(closes: np.ndarray, length: int, decimals: int) -> np.ndarray:
+	"""SMA на закрытии каждой свечи, округлённая до тика (NaN, пока не набралось length свечей)"""
+	sma = np.full(len(closes), np.nan)
+	if len(closes) >= length:
+		# Сумма каждого окна заново, без накопленной ошибки cumsum - иначе на границе округления якорь уезжает на тик
+		sma[length - 1:] = np.lib.stride_tricks.sliding_window_view(closes, length).sum(axis=1) / length
+	return np.round(sma, decimals)
+
+
+class TickSeries:
+	"""
+	Тики одного инструмента и всё, что не зависит от параметров сетки: пирамида FirstPassage,
+	окна свечей и SMA по таймфреймам. Один объект переиспользуется для всех прогонов (optimize.py).
+	"""
+
+	def __init__(self, ts, prices):
+		self.ts = np.asarray(ts, dtype=np.float64)
+		self.prices = np.asarray(prices, dtype=np.float64)
+		self.n = len(self.prices)
+		self.passage = FirstPassage(self.prices)
+		self._bars = {}
+		self._anchors = {}
+
+	def bars(self, bar_seconds: float) -> tuple:
+		"""(closes, start_tick, window_min): close свечи, тик, с которого действует сетка этой свечи, и минимум цены до следующей"""
+		if bar_seconds not in self._bars:
+			close_times, closes = bar_closes(self.ts, self.prices, bar_seconds)
+			start_tick = np.searchsorted(self.ts, close_times, side='left')
+			next_tick = np.append(start_tick[1:], self.n)
+			# Непустые окна идут подряд, поэтому минимум каждого - один reduceat по их началам
+			window_min = np.full(len(closes), np.inf)
+			nonempty = start_tick < next_tick
+			if nonempty.any():
+				window_min[nonempty] = np.minimum.reduceat(self.prices, start_tick[nonempty])
+			self._bars[bar_seconds] = closes, start_tick, window_min
+		return self._bars[bar_seconds]
+
+	def anchors(self, bar_seconds: float, sma_length: int, decimals: int) -> np.ndarray:
+		key = (bar_seconds, sma_length, decimals)
+		if key not in self._anchors:
+			self._anchors[key] = sma_anchors(self.bars(bar_seconds)[0], sma_length, decimals)
+		return self._anchors[key]
+
+
+def backtest(ts, prices, **params) -> dict:
+	"""Прогон сетки по тикам. ts - время тиков в секундах (по возрастанию), prices - цены. Параметры - как у run_grid()"""
+	return run_grid(TickSeries(ts, prices), **params)
+
+
+def run_grid(series: TickSeries, grid_step: float = 0.003, profit_target: float = 0.004, quantity: int = 100,
+			 sma_length: int = 14, bar_seconds: float = 60, balance: float = 50, tick_size: float = 0.000001,
+			 lot_size: float = 1, ct_val: float = 1, min_size: float = 1, fee_rate: float = 0.0005) -> dict:
+	"""Возвращает PnL, комиссии, максимальную позицию и количество сделок"""
+	prices = series.prices
+	n = series.n
+	passage = series.passage
+	rounding = InstrumentRounding(tick_size, lot_size)
+	usdt_amount = balance * 0.01
+
+	# SMA на закрытии каждой свечи и тик, с которого действует пересчитанная сетка
+	_, start_tick, window_min = series.bars(bar_seconds)
+	anchors = series.anchors(bar_seconds, sma_length, step_decimals(tick_size))
+
+	# Свечи, в окне которых цена дошла до уровня 0 свежей сетки (только они могут открыть позицию)
+	entry0 = rounding.ticks_to_price(rounding.price_ticks(np.nan_to_num(anchors)))
+	candidates = np.flatnonzero(~np.isnan(anchors) & (window_min <= entry0))
+
+	buys_idx, buys_px, buys_sz, sells_idx, sells_px, sells_sz, pair_buy_px = [], [], [], [], [], [], []
+	open_px, open_sz = [], []
+	resets = 0
+	grids_built = 0
+	bar = 0
+	while True:
+		k = np.searchsorted(candidates, bar)
+		if k >= len(candidates):
+			break
+		bar = int(candidates[k])
+		entry, close, sizes = build_grid(anchors[bar], quantity, grid_step, profit_target, usdt_amount, ct_val, min_size, rounding)
+		grids_built += 1
+		b0 = passage.first_le(int(start_tick[bar]), entry[0])
+		r = passage.first_ge(b0 + 1, close[0])
+		# Уровни, до которых цена дошла за эпизод
+		low = prices[b0:min(r + 1, n)].min()
+		active = int(np.count_nonzero(entry >= low))
+		for level in range(active):
+			j = b0 if level == 0 else passage.first_le(b0, entry[level])
+			while j < min(r, n):
+				buys_idx.append(j)
+				buys_px.append(prices[j])
+				buys_sz.append(sizes[level])
+				s = passage.first_ge(j + 1, close[level])
+				if s >= n:
+					# Данные кончились - уровень остаётся открытым
+					open_px.append(prices[j])
+					open_sz.append(sizes[level])
+					break
+				sells_idx.append(s)
+				sells_px.append(prices[s])
+				sells_sz.append(sizes[level])
+				pair_buy_px.append(prices[j])
+				if level == 0:
+					break
+				j = passage.first_le(s + 1, entry[level])
+		if r >= n:
+			break
+		resets += 1
+		# Следующая сетка - на первом закрытии свечи после сброса
+		bar = int(np.searchsorted(start_tick, r, side='right'))
+
+	buys_px, buys_sz, sells_px, sells_sz, pair_buy_px = (np.asarray(a, dtype=np.float64) for a in (buys_px, buys_sz, sells_px, sells_sz, pair_buy_px))
+	# Позиция во времени: в одном тике сначала покупки, потом продажи (как в strategy())
+	idx = np.concatenate((buys_idx, sells_idx)).astype(np.int64)
+	order = np.lexsort((np.concatenate((np.zeros(len(buys_sz)), np.ones(len(sells_sz)))), idx))
+	inventory = np.cumsum(np.concatenate((buys_sz, -sells_sz))[order]) if len(idx) else np.zeros(1)
+	inv_px = np.concatenate((buys_px, sells_px))[order] if len(idx) else np.zeros(1)
+
+	realized = float(np.sum((sells_px - pair_buy_px) * sells_sz) * ct_val)
+	fees = float((np.sum(buys_px * buys_sz) + np.sum(sells_px * sells_sz)) * ct_val * fee_rate)
+	open_px, open_sz = np.asarray(open_px, dtype=np.float64), np.asarray(open_sz, dtype=np.float64)
+	unrealized = float(np.sum((prices[-1] - open_px) * open_sz) * ct_val) if n else 0.0
+	return {
+		'realized_pnl': round(realized, 8),
+		'fees': round(fees, 8),
+		'net_pnl': round(realized - fees, 8),
+		'unrealized_pnl': round(unrealized, 8),
+		'buys': len(buys_sz),
+		'sells': len(sells_sz),
+		'resets': resets,
+		'grids_built': grids_built,
+		'max_inventory': float(inventory.max()) if len(idx) else 0.0,
+		'max_inventory_usdt': round(float((inventory * inv_px).max() * ct_val), 6) if len(idx) else 0.0,
+		'open_inventory': float(open_sz.sum()),
+		'ticks': n,
+	}
+
+
+def load_recording(root: str, inst_id: str) -> tuple:
+	"""Тики из записи recorder.py: (ts в секундах, цены)"""
+	from recorder import TickReader
+	ticks = TickReader(root).ticks(inst_id)
+	return ticks['ts'] / 1e9, ticks['price']
+
+
+def load_candles_csv(path: str) -> tuple:
+	"""CSV со столбцами ts,open,high,low,close (ts - начало свечи, сек или мс)"""
+	data = np.loadtxt(path, delimiter=',', skiprows=1, usecols=(0, 1, 2, 3, 4))
+	ts = data[:, 0] / 1000 if data[0, 0] > 1e11 else data[:, 0]
+	return ticks_from_candles(ts, data[:, 1], data[:, 2], data[:, 3], data[:, 4])
+
+
+if __name__ == '__main__':
+	parser = argparse.ArgumentParser(description="Vectorized grid backtest")
+	source = parser.add_mutually_exclusive_group(required=True)
+	source.add_argument("--record-dir", help="каталог записи recorder.py (нужен --inst)")
+	source.add_argument("--candles", help="CSV ts,open,high,low,close")
+	parser.add_argument("--inst", help="instId в записи")
+	parser.add_argument("--grid-step", type=float, default=0.003)
+	parser.add_argument("--profit-target", type=float, default=0.004)
+	parser.add_argument("--quantity", type=int, default=100)
+	parser.add_argument("--sma-length", type=int, default=14)
+	parser.add_argument("--bar-seconds", type=float, default=60)
+	parser.add_argument("--balance", type=float, default=50)
+	parser.add_argument("--tick-size", type=float, default=0.000001)
+	parser.add_argument("--lot-size", type=float, default=1)
+	parser.add_argument("--ct-val", type=float, default=1)
+	parser.add_argument("--min-size", type=float, default=1)
+	parser.add_argument("--fee-rate", type=float, default=0.0005)
+	args = parser.parse_args()
+
+	ts, prices = load_recording(args.record_dir, args.inst) if args.record_dir else load_candles_csv(args.candles)
+	started = time.perf_counter()
+	result = backtest(ts, prices, grid_step=args.grid_step, profit_target=args.profit_target, quantity=args.quantity,
+					  sma_length=args.sma_length, bar_seconds=args.bar_seconds, balance=args.balance, tick_size=args.tick_size,
+					  lot_size=args.lot_size, ct_val=args.ct_val, min_size=args.min_size, fee_rate=args.fee_rate)
+	result['seconds'] = round(time.perf_counter() - started, 3)
+	print(json.dumps(result, indent=1))
@@ -0,0 +1,68 @@
+import json
+import os
+import sys
+import timeit
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+import decode_okx
+from decode_okx import decode_tickers, decode_private
+
+# Сравнение старого пути (json.loads + .get() + float() в стратегии) с decode_okx.
+# Запуск: python benchmarks/bench_decode.py [число повторов]
+
+TICKER = json.dumps({
+	"arg": {"channel": "tickers", "instId": "DEGEN-USDT-SWAP"},
+	"data": [{
+		"instType": "SWAP", "instId": "DEGEN-USDT-SWAP", "last": "0.004321", "lastSz": "120",
+		"askPx": "0.004322", "askSz": "5400", "bidPx": "0.00432", "bidSz": "3100",
+		"open24h": "0.0041", "high24h": "0.0045", "low24h": "0.0040", "volCcy24h": "123456789",
+		"vol24h": "1234567", "sodUtc0": "0.0042", "sodUtc8": "0.0041", "ts": "1700000000123",
+	}],
+}, separators=(',', ':'))
+
+ORDER = json.dumps({
+	"arg": {"channel": "orders", "instType": "SWAP", "uid": "1"},
+	"data": [{
+		"instType": "SWAP", "instId": "DEGEN-USDT-SWAP", "ordId": "680800019749904384", "clOrdId": "",
+		"px": "", "sz": "12", "notionalUsd": "5.18", "ordType": "market", "side": "buy", "posSide": "net",
+		"tdMode": "cross", "accFillSz": "12", "fillPx": "0.004321", "tradeId": "1", "fillSz": "12",
+		"fillTime": "1700000000123", "state": "filled", "avgPx": "0.004321", "lever": "2", "fee": "-0.0026",
+		"feeCcy": "USDT", "pnl": "0", "uTime": "1700000000125", "cTime": "1700000000100",
+	}],
+}, separators=(',', ':'))
+
+EVENT = '{"event":"subscribe","arg":{"channel":"tickers","instId":"DEGEN-USDT-SWAP"},"connId":"a4d3ae55"}'
+
+
+def legacy_ticker(msg):
+	data = json.loads(msg)
+	if "arg" in data and data["arg"].get("channel") == "tickers":
+		for tick in data.get("data", []):
+			return float(tick.get("last"))
+
+
+def legacy_order(msg):
+	data = json.loads(msg)
+	if "arg" in data and data["arg"].get("channel") == "orders":
+		for item in data.get("data", []):
+			return (item.get("ordId"), item.get("state"), float(item.get('accFillSz')), float(item.get('avgPx')),
+					float(item.get('notionalUsd')), float(item.get('fee')))
+
+
+def run(label, func, msg, number):
+	seconds = timeit.timeit(lambda: func(msg), number=number)
+	print(f"{label:<34} {seconds / number * 1e6:8.2f} us/frame")
+	return seconds
+
+
+if __name__ == '__main__':
+	number = int(sys.argv[1]) if len(sys.argv) > 1 else 200_000
+	print(f"decode_okx backend: {decode_okx.loads.__module__}, {number} frames")
+	for name, legacy, fast, msg in (
+		("tickers", legacy_ticker, decode_tickers, TICKER),
+		("orders", legacy_order, decode_private, ORDER),
+		("event", legacy_ticker, decode_tickers, EVENT),
+	):
+		old = run(f"{name}: json.loads + get/float", legacy, msg, number)
+		new = run(f"{name}: decode_okx", fast, msg, number)
+		print(f"{name}: x{old / new:.2f}\n")
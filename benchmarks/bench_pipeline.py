@@ -0,0 +1,219 @@
+import argparse
+import asyncio
+import itertools
+import json
+import multiprocessing
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+RESULTS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'results')
+sys.path.insert(0, ROOT)
+
+# Сквозной нагрузочный тест: okx_sim (фид + приём ордеров) в отдельном процессе,
+# в другом процессе - настоящий create_tasks(): WebSocketClient -> strategy() -> Trading -> ордера в симулятор.
+# Перебирает частоту тиков, размер сетки и количество инструментов, пишет JSON в benchmarks/results/
+# и сравнивает с предыдущим прогоном.
+#
+# python benchmarks/bench_pipeline.py --quick
+# python benchmarks/bench_pipeline.py --rates 100 1000 5000 --levels 100 1000 10000 --instruments 1 4 --duration 10
+
+START_PRICE = 100.0
+TICK_SIZE = 0.0001
+WARMUP = 6.0  # strategy()/sma_updater() ждут 4 с до старта, плюс заполнение SMA
+
+
+def free_port() -> int:
+	with socket.socket() as s:
+		s.bind(("127.0.0.1", 0))
+		return s.getsockname()[1]
+
+
+def inst_ids(count: int) -> list:
+	return [f"BENCH{i}-USDT-SWAP" for i in range(count)]
+
+
+def grid_step_for(levels: int) -> float:
+	# Сетка покрывает ~50% цены вниз при любом количестве уровней
+	return min(0.003, 0.5 / levels)
+
+
+def run_simulator(port: int, rate: float, instruments: int, volatility: float, workdir: str):
+	os.chdir(workdir)
+	from okx_sim import OkxSimulator, serve
+	sim = OkxSimulator(
+		{inst_id: {"price": START_PRICE, "tick_size": TICK_SIZE, "volatility": volatility, "seed": i, "mean_reversion": 0.01}
+		 for i, inst_id in enumerate(inst_ids(instruments))},
+		tick_interval=1 / rate, bar_seconds=1, port=port,
+	)
+	asyncio.run(serve(sim))
+
+
+def rss_mb() -> float:
+	try:
+		with open("/proc/self/status") as f:
+			for line in f:
+				if line.startswith("VmRSS:"):
+					return int(line.split()[1]) / 1024
+	except OSError:
+		pass
+	import resource
+	return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def percentiles(samples: list) -> dict:
+	if not samples:
+		return {'count': 0, 'p50_ms': None, 'p99_ms': None, 'p999_ms': None, 'max_ms': None}
+	ordered = sorted(samples)
+
+	def pick(q):
+		return round(ordered[min(len(ordered) - 1, int(q / 100 * len(ordered)))] * 1000, 3)
+	return {'count': len(ordered), 'p50_ms': pick(50), 'p99_ms': pick(99), 'p999_ms': pick(99.9), 'max_ms': round(ordered[-1] * 1000, 3)}
+
+
+def run_bot(port: int, levels: int, instruments: int, duration: float, workdir: str, conn):
+	os.chdir(workdir)
+	os.environ["OKX_REST_URL"] = f"http://127.0.0.1:{port}"
+	os.environ["OKX_WS_URL"] = f"ws://127.0.0.1:{port}"
+	import logging
+	import main
+	# Консольный вывод каждой сделки исказил бы замер - логи остаются только в grid.log рабочего каталога
+	for handler in logging.root.handlers[:]:
+		if type(handler) is logging.StreamHandler:
+			logging.root.removeHandler(handler)
+	main.tg_token = "123456789:" + "A" * 35  # поллер не запускается, но TelegramBot проверяет формат токена
+	main.journal_path = os.path.join(workdir, "grid_journal.db")
+	main.tf = 1
+	step = grid_step_for(levels)
+	main.instruments = {inst_id: {"quantity": levels, "grid_step": step, "profit_target": step} for inst_id in inst_ids(instruments)}
+
+	async def measure():
+		ipc_parent, ipc_child = multiprocessing.Pipe()
+		bot = asyncio.create_task(main.create_tasks(ipc=ipc_child))
+		await asyncio.sleep(WARMUP)
+
+		lag, order_samples, fill_samples = [], [], []
+		seen = {}
+		start_counts = {inst_id: (g.price_mailbox.published, g.price_mailbox.delivered) for inst_id, g in main.grids.items()}
+		start_round_trips = sum(g.trading.strategy_orders.round_trips for g in main.grids.values())
+		started = time.monotonic()
+		peak_rss = rss_mb()
+
+		def collect(name, stats, out):
+			# Забираем только новые замеры из скользящего окна LatencyStats
+			new = stats.count - seen.get(name, 0)
+			if new > 0:
+				out.extend(list(stats.samples)[-min(new, len(stats.samples)):])
+			seen[name] = stats.count
+
+		for inst_id, g in main.grids.items():
+			seen[(inst_id, 'order')] = g.trading.order_latency.count
+			seen[(inst_id, 'fill')] = g.trading.fill_latency.count
+		while time.monotonic() - started < duration:
+			before = time.monotonic()
+			await asyncio.sleep(0.01)
+			lag.append(time.monotonic() - before - 0.01)
+			for inst_id, g in main.grids.items():
+				collect((inst_id, 'order'), g.trading.order_latency, order_samples)
+				collect((inst_id, 'fill'), g.trading.fill_latency, fill_samples)
+			peak_rss = max(peak_rss, rss_mb())
+		elapsed = time.monotonic() - started
+
+		published = sum(g.price_mailbox.published - start_counts[i][0] for i, g in main.grids.items())
+		delivered = sum(g.price_mailbox.delivered - start_counts[i][1] for i, g in main.grids.items())
+		orders = sum(g.trading.strategy_orders.round_trips for g in main.grids.values()) - start_round_trips
+		result = {
+			'ticks_per_s_received': round(published / elapsed, 1),
+			'ticks_per_s_processed': round(delivered / elapsed, 1),
+			'conflated_pct': round(100 * (1 - delivered / published), 2) if published else None,
+			'round_trips': orders,
+			'tick_to_order': percentiles(order_samples),
+			'fill_processing': percentiles(fill_samples),
+			'loop_lag': percentiles(lag),
+			'rss_mb': round(peak_rss, 1),
+			'levels_built': {i: len(g.trading.buy_grid_orders) for i, g in main.grids.items()},
+		}
+		conn.send(result)
+		bot.cancel()
+
+	try:
+		asyncio.run(measure())
+	except (asyncio.CancelledError, KeyboardInterrupt):
+		pass
+	os._exit(0)
+
+
+def run_case(rate: float, levels: int, instruments: int, duration: float) -> dict:
+	ctx = multiprocessing.get_context("spawn")
+	port = free_port()
+	with tempfile.TemporaryDirectory() as workdir:
+		sim = ctx.Process(target=run_simulator, args=(port, rate, instruments, grid_step_for(levels), workdir), daemon=True)
+		sim.start()
+		deadline = time.monotonic() + 10
+		while time.monotonic() < deadline:
+			try:
+				socket.create_connection(("127.0.0.1", port), timeout=0.2).close()
+				break
+			except OSError:
+				time.sleep(0.1)
+		parent_conn, child_conn = ctx.Pipe()
+		bot = ctx.Process(target=run_bot, args=(port, levels, instruments, duration, workdir, child_conn), daemon=True)
+		bot.start()
+		result = parent_conn.recv() if parent_conn.poll(WARMUP + duration + 30) else {'error': 'bot did not report'}
+		bot.join(5)
+		sim.terminate()
+		sim.join(5)
+	return {'tick_rate': rate, 'levels': levels, 'instruments': instruments, 'duration_s': duration, **result}
+
+
+def git_revision() -> str:
+	try:
+		return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, text=True).strip()
+	except (OSError, subprocess.CalledProcessError):
+		return "unknown"
+
+
+def compare(previous: dict, current: dict):
+	"""Печатает изменение p99 tick->order и обработанных тиков относительно прошлого прогона"""
+	old = {(c['tick_rate'], c['levels'], c['instruments']): c for c in previous.get('cases', [])}
+	print(f"\nvs {previous.get('revision')} ({previous.get('created')}):")
+	for case in current['cases']:
+		key = (case['tick_rate'], case['levels'], case['instruments'])
+		if key not in old or 'error' in case or 'error' in old[key]:
+			continue
+		before, after = old[key]['tick_to_order']['p99_ms'], case['tick_to_order']['p99_ms']
+		delta = f"{after - before:+.3f} ms" if before is not None and after is not None else "n/a"
+		print(f"  rate={key[0]:<6} levels={key[1]:<6} inst={key[2]:<3} p99 tick->order {delta}, "
+			  f"processed {old[key]['ticks_per_s_processed']} -> {case['ticks_per_s_processed']} ticks/s")
+
+
+if __name__ == '__main__':
+	parser = argparse.ArgumentParser(description="End-to-end pipeline benchmark against okx_sim")
+	parser.add_argument("--rates", type=float, nargs="+", default=[100, 1000, 5000])
+	parser.add_argument("--levels", type=int, nargs="+", default=[100, 1000, 10000])
+	parser.add_argument("--instruments", type=int, nargs="+", default=[1, 4])
+	parser.add_argument("--duration", type=float, default=10)
+	parser.add_argument("--quick", action="store_true", help="один короткий прогон: 1000 тиков/с, 1000 уровней, 1 инструмент")
+	args = parser.parse_args()
+	if args.quick:
+		args.rates, args.levels, args.instruments, args.duration = [1000], [1000], [1], 5
+
+	report = {'revision': git_revision(), 'created': time.strftime('%Y-%m-%dT%H:%M:%S'), 'python': sys.version.split()[0], 'cases': []}
+	for rate, levels, instruments in itertools.product(args.rates, args.levels, args.instruments):
+		case = run_case(rate, levels, instruments, args.duration)
+		report['cases'].append(case)
+		print(json.dumps(case))
+
+	os.makedirs(RESULTS_DIR, exist_ok=True)
+	previous = sorted(f for f in os.listdir(RESULTS_DIR) if f.endswith('.json'))
+	path = os.path.join(RESULTS_DIR, f"{time.strftime('%Y%m%d-%H%M%S')}_{report['revision']}.json")
+	with open(path, "w") as f:
+		json.dump(report, f, indent=1)
+	print(f"\nSaved {path}")
+	if previous:
+		with open(os.path.join(RESULTS_DIR, previous[-1])) as f:
+			compare(json.load(f), report)
@@ -0,0 +1,157 @@
+from orderbook import BOOK_CHANNELS
+
+try:
+	import orjson
+	loads = orjson.loads
+	dumps = lambda obj: orjson.dumps(obj).decode()
+except ImportError:
+	import json
+	loads = json.loads
+	dumps = json.dumps
+
+
+# Декодирование кадров OKX WebSocket в компактные объекты с уже переведёнными в числа полями.
+# Кадры, которые не являются данными (pong, subscribe/error события), распознаются по началу строки
+# и не проходят через разбор каналов. orjson используется, если установлен, иначе стандартный json.
+
+# op приватного WS, ответы на которые ждёт send_order_request()
+ORDER_OPS = ('order', 'batch-orders', 'cancel-order', 'batch-cancel-orders', 'amend-order', 'batch-amend-orders')
+
+def _num(value) -> float:
+	"""OKX присылает числа строками, пустая строка - поле ещё не заполнено"""
+	return float(value) if value else 0.0
+
+
+class Ticker:
+	__slots__ = ('inst_id', 'last', 'bid', 'ask', 'ts', 'size')
+
+	def __init__(self, inst_id: str, last: float, bid: float, ask: float, ts: int, size: float = 0.0):
+		self.inst_id = inst_id
+		self.last = last
+		self.bid = bid
+		self.ask = ask
+		self.ts = ts
+		self.size = size
+
+	def __repr__(self):
+		return f"Ticker({self.inst_id} last={self.last} bid={self.bid} ask={self.ask} ts={self.ts})"
+
+
+class BookUpdate:
+	"""Один push канала стакана. Уровни [px, sz, ...] остаются строками - по ним OrderBook считает checksum"""
+	__slots__ = ('action', 'bids', 'asks', 'ts', 'seq_id', 'prev_seq_id', 'checksum')
+
+	def __init__(self, item: dict, action: str):
+		self.action = action
+		self.bids = item.get('bids') or ()
+		self.asks = item.get('asks') or ()
+		self.ts = int(item.get('ts') or 0)
+		self.seq_id = int(item['seqId']) if 'seqId' in item else None
+		self.prev_seq_id = int(item['prevSeqId']) if 'prevSeqId' in item else None
+		self.checksum = int(item['checksum']) if 'checksum' in item else None
+
+	def __repr__(self):
+		return f"BookUpdate({self.action} seqId={self.seq_id} bids={len(self.bids)} asks={len(self.asks)})"
+
+
+class OrderUpdate:
+	"""Одно обновление из приватного канала orders"""
+	__slots__ = ('inst_id', 'ord_id', 'cl_ord_id', 'side', 'state', 'acc_fill_sz', 'avg_px',
+				 'fill_px', 'fill_sz', 'fee', 'notional_usd', 'pnl', 'u_time')
+
+	def __init__(self, item: dict):
+		self.inst_id = item.get('instId')
+		self.ord_id = item.get('ordId')
+		self.cl_ord_id = item.get('clOrdId')
+		self.side = item.get('side')
+		self.state = item.get('state')
+		self.acc_fill_sz = _num(item.get('accFillSz'))
+		self.avg_px = _num(item.get('avgPx'))
+		self.fill_px = _num(item.get('fillPx'))
+		self.fill_sz = _num(item.get('fillSz'))
+		self.fee = _num(item.get('fee'))
+		self.notional_usd = _num(item.get('notionalUsd'))
+		self.pnl = _num(item.get('pnl'))
+		self.u_time = int(item.get('uTime') or 0)
+
+	def __repr__(self):
+		return f"OrderUpdate({self.inst_id} {self.ord_id} {self.side} {self.state} {self.acc_fill_sz}@{self.avg_px})"
+
+
+class Event:
+	"""Служебный кадр: login / subscribe / error / channel-conn-count"""
+	__slots__ = ('event', 'code', 'msg', 'arg')
+
+	def __init__(self, data: dict):
+		self.event = data.get('event')
+		self.code = data.get('code', '0')
+		self.msg = data.get('msg', '')
+		self.arg = data.get('arg')
+
+	@property
+	def ok(self) -> bool:
+		return self.event != 'error' and self.code == '0'
+
+	def __repr__(self):
+		return f"Event({self.event} code={self.code} msg={self.msg!r} arg={self.arg})"
+
+
+def _is_control(raw: str) -> bool:
+	"""pong и события определяются по началу строки, без парсинга"""
+	return raw == 'pong' or raw.startswith('{"event"')
+
+
+def decode_tickers(raw: str):
+	"""
+	Кадр канала tickers -> (instId, [Ticker, ...]).
+	Служебные кадры -> (None, Event), всё остальное (pong и т.п.) -> (None, None).
+	"""
+	if _is_control(raw):
+		return None, (Event(loads(raw)) if raw != 'pong' else None)
+	data = loads(raw)
+	arg = data.get('arg')
+	if not arg or arg.get('channel') != 'tickers':
+		return None, None
+	inst_id = arg.get('instId')
+	ticks = [
+		Ticker(inst_id, float(t['last']), _num(t.get('bidPx')), _num(t.get('askPx')), int(t.get('ts') or 0), _num(t.get('lastSz')))
+		for t in data.get('data', ())
+	]
+	return inst_id, ticks
+
+
+def decode_books(raw: str):
+	"""
+	Кадр канала стакана (bbo-tbt, books5, books) -> (instId, [BookUpdate, ...]).
+	bbo-tbt и books5 не присылают action - каждый их push это снимок.
+	Служебные кадры -> (None, Event), всё остальное -> (None, None).
+	"""
+	if _is_control(raw):
+		return None, (Event(loads(raw)) if raw != 'pong' else None)
+	data = loads(raw)
+	arg = data.get('arg')
+	if not arg or arg.get('channel') not in BOOK_CHANNELS:
+		return None, None
+	action = data.get('action', 'snapshot')
+	return arg.get('instId'), [BookUpdate(item, action) for item in data.get('data', ())]
+
+
+def decode_private(raw: str):
+	"""
+	Кадр приватного WS:
+	- ответ на op ордеров (ORDER_OPS) -> ('response', dict) - как есть, его ждёт send_order_request()
+	- push канала orders -> ('orders', [OrderUpdate, ...])
+	- служебный кадр -> ('event', Event)
+	- остальное -> (None, None)
+	"""
+	if _is_control(raw):
+		return ('event', Event(loads(raw))) if raw != 'pong' else (None, None)
+	data = loads(raw)
+	arg = data.get('arg')
+	if arg is not None:
+		if arg.get('channel') != 'orders':
+			return None, None
+		return 'orders', [OrderUpdate(item) for item in data.get('data', ())]
+	if 'id' in data and data.get('op') in ORDER_OPS:
+		return 'response', data
+	return None, None
@@ -0,0 +1,90 @@
+from bisect import bisect_left, bisect_right, insort
+
+
+class GridBook:
+	"""
+	Индекс живых уровней сетки, отсортированный по цене.
+
+	Для каждой стороны хранится отсортированный список (entry_price, order_number)
+	только для уровней в статусе 'live'. Ближайший к рынку уровень - последний
+	элемент buy и первый элемент sell, поэтому тик между ними отсекается за O(1),
+	а поиск всех пересечённых уровней стоит O(log n + k).
+	"""
+
+	def __init__(self):
+		self._levels = {'buy': [], 'sell': []}
+		self._prices = {'buy': {}, 'sell': {}}
+
+	def clear(self):
+		for side in ('buy', 'sell'):
+			self._levels[side].clear()
+			self._prices[side].clear()
+
+	def load(self, side: str, grid_orders: dict):
+		"""Полностью перестраивает сторону из словаря сетки (buy_grid_orders / sell_grid_orders)"""
+		prices = {n: o['entry_price'] for n, o in grid_orders.items() if o['status'] == 'live'}
+		self._prices[side] = prices
+		self._levels[side] = sorted((px, n) for n, px in prices.items())
+
+	def add(self, side: str, order_number: int, entry_price: float):
+		"""Уровень стал 'live'"""
+		if order_number in self._prices[side]:
+			self.remove(side, order_number)
+		self._prices[side][order_number] = entry_price
+		insort(self._levels[side], (entry_price, order_number))
+
+	def remove(self, side: str, order_number: int):
+		"""Уровень перестал быть 'live' (исполнен, пересчитан или снят)"""
+		entry_price = self._prices[side].pop(order_number, None)
+		if entry_price is None:
+			return
+		levels = self._levels[side]
+		i = bisect_left(levels, (entry_price, order_number))
+		if i < len(levels) and levels[i] == (entry_price, order_number):
+			del levels[i]
+
+	def is_live(self, side: str, order_number: int) -> bool:
+		return order_number in self._prices[side]
+
+	@property
+	def best_buy(self):
+		"""Самый высокий живой buy уровень (entry_price, order_number) или None"""
+		levels = self._levels['buy']
+		return levels[-1] if levels else None
+
+	@property
+	def best_sell(self):
+		"""Самый низкий живой sell уровень (entry_price, order_number) или None"""
+		levels = self._levels['sell']
+		return levels[0] if levels else None
+
+	def crossed_buys(self, price: float) -> list:
+		"""Номера живых buy уровней с entry_price >= price, по возрастанию номера"""
+		levels = self._levels['buy']
+		if not levels or price > levels[-1][0]:
+			return []
+		i = bisect_left(levels, (price, -1))
+		return sorted(n for _, n in levels[i:])
+
+	def crossed_sells(self, price: float) -> list:
+		"""Номера живых sell уровней с entry_price <= price, по возрастанию номера"""
+		levels = self._levels['sell']
+		if not levels or price < levels[0][0]:
+			return []
+		i = bisect_right(levels, (price, float('inf')))
+		return sorted(n for _, n in levels[:i])
+
+	def nearest(self, side: str, price: float, count: int) -> list:
+		"""
+		count ближайших к рынку живых уровней, ещё не пересечённых ценой: buy ниже price, sell выше.
+		Возвращает [(entry_price, order_number), ...] от ближайшего к дальнему.
+		"""
+		levels = self._levels[side]
+		if side == 'buy':
+			i = bisect_left(levels, (price, -1))
+			return levels[max(0, i - count):i][::-1]
+		i = bisect_right(levels, (price, float('inf')))
+		return levels[i:i + count]
+
+	def __len__(self):
+		return len(self._levels['buy']) + len(self._levels['sell'])
@@ -0,0 +1,59 @@
+from decimal import Decimal
+from functools import lru_cache
+import numpy as np
+
+
+@lru_cache(maxsize=None)
+def step_decimals(step: float) -> int:
+	"""Количество знаков после запятой у шага цены/лота (0.0001 -> 4, 0.5 -> 1, 10 -> 0)"""
+	exponent = Decimal(str(step)).normalize().as_tuple().exponent
+	return max(0, -exponent)
+
+
+class InstrumentRounding:
+	"""
+	Округление под правила инструмента, посчитанное один раз.
+	Цены и размеры переводятся в целое число шагов (тиков/лотов), поэтому
+	результат всегда кратен tick_size / lot_size без накопления ошибки float.
+	"""
+
+	def __init__(self, tick_size: float, lot_size: float):
+		self.tick_size = tick_size
+		self.lot_size = lot_size
+		self.price_decimals = step_decimals(tick_size)
+		self.size_decimals = step_decimals(lot_size)
+
+	def price_ticks(self, prices) -> np.ndarray:
+		return np.rint(np.asarray(prices, dtype=np.float64) / self.tick_size).astype(np.int64)
+
+	def ticks_to_price(self, ticks) -> np.ndarray:
+		return np.round(np.asarray(ticks, dtype=np.float64) * self.tick_size, self.price_decimals)
+
+	def lots_to_size(self, lots) -> np.ndarray:
+		return np.round(np.asarray(lots, dtype=np.float64) * self.lot_size, self.size_decimals)
+
+	def round_price(self, price: float) -> float:
+		return round(round(price / self.tick_size) * self.tick_size, self.price_decimals)
+
+
+def build_grid(start_from: float, quantity: int, grid_step: float, profit_target: float, usdt_amount: float,
+			   ct_val: float, min_size: float, rounding: InstrumentRounding) -> tuple:
+	"""
+	Строит всю buy сетку одним проходом по массивам.
+	Возвращает (entry_prices, close_prices, sizes) - numpy массивы длиной <= quantity.
+	Уровни, цена которых ушла бы в ноль или ниже, отбрасываются.
+	"""
+	index = np.arange(quantity, dtype=np.float64)
+	entry_ticks = rounding.price_ticks(start_from * (1 - grid_step * index))
+	entry_ticks = entry_ticks[:np.count_nonzero(entry_ticks >= 1)]
+	close_ticks = np.rint(entry_ticks * (1 + profit_target)).astype(np.int64)
+
+	entry_prices = rounding.ticks_to_price(entry_ticks)
+	close_prices = rounding.ticks_to_price(close_ticks)
+
+	# Размер в контрактах на уровень, не меньше минимального, кратный lot_size
+	contracts = usdt_amount / (entry_prices * ct_val)
+	contracts = np.maximum(contracts, min_size)
+	lots = np.rint(contracts / rounding.lot_size).astype(np.int64)
+	sizes = rounding.lots_to_size(lots)
+	return entry_prices, close_prices, sizes
@@ -0,0 +1,310 @@
+from array import array
+import numpy as np
+
+
+# Потоковые индикаторы: состояние фиксированного размера, update()/update_bar() за O(1) на бар,
+# warmup()/warmup_bars() - векторизованный прогрев по истории (массивы от старой свечи к новой)
+
+class RingBuffer:
+	"""Кольцевой буфер фиксированного размера поверх array('d')"""
+
+	def __init__(self, size: int):
+		if size <= 0:
+			raise ValueError(f"Invalid ring buffer size: {size}")
+		self.size = size
+		self.data = array('d', [0.0]) * size
+		self.head = 0   # индекс, куда будет записано следующее значение
+		self.count = 0
+
+	def append(self, value: float):
+		"""Добавляет значение и возвращает вытесненное (или None, пока буфер не заполнен)"""
+		evicted = self.data[self.head] if self.count == self.size else None
+		self.data[self.head] = value
+		self.head = (self.head + 1) % self.size
+		if self.count < self.size:
+			self.count += 1
+		return evicted
+
+	@property
+	def full(self) -> bool:
+		return self.count == self.size
+
+	def last(self, offset: int = 0) -> float:
+		"""Последнее значение (offset=1 - предпоследнее и т.д.)"""
+		if offset >= self.count:
+			raise IndexError("ring buffer index out of range")
+		return self.data[(self.head - 1 - offset) % self.size]
+
+	def values(self) -> list:
+		"""Значения от старого к новому"""
+		start = (self.head - self.count) % self.size
+		return [self.data[(start + i) % self.size] for i in range(self.count)]
+
+	def __len__(self):
+		return self.count
+
+
+class SMA:
+	"""Скользящая средняя с обновлением за O(1): сумма окна поддерживается инкрементально"""
+
+	def __init__(self, length: int):
+		self.length = length
+		self.buffer = RingBuffer(length)
+		self.total = 0.0
+		self._updates = 0
+
+	def update(self, value: float):
+		evicted = self.buffer.append(value)
+		if evicted is not None:
+			self.total += value - evicted
+		else:
+			self.total += value
+		# Раз в окно пересчитываем сумму заново, чтобы не копилась ошибка округления float
+		self._updates += 1
+		if self._updates % self.length == 0:
+			self.total = sum(self.buffer.data)
+		return self.value
+
+	def update_bar(self, high: float, low: float, close: float, volume: float):
+		return self.update(close)
+
+	def warmup(self, closes):
+		"""Векторизованный прогрев по истории (массив от старого к новому)"""
+		closes = np.asarray(closes, dtype=np.float64)[-self.length:]
+		self.buffer = RingBuffer(self.length)
+		for value in closes:
+			self.buffer.append(float(value))
+		self.total = float(closes.sum())
+		self._updates = 0
+		return self.value
+
+	def warmup_bars(self, highs, lows, closes, volumes):
+		return self.warmup(closes)
+
+	@property
+	def value(self):
+		if not self.buffer.full:
+			return None
+		return self.total / self.length
+
+
+class EMA:
+	"""Экспоненциальная средняя. Первое значение - SMA за length баров, далее O(1)"""
+
+	def __init__(self, length: int):
+		self.length = length
+		self.alpha = 2 / (length + 1)
+		self.value = None
+		self._seed = SMA(length)
+
+	def update(self, value: float):
+		if self.value is None:
+			self.value = self._seed.update(value)
+		else:
+			self.value += self.alpha * (value - self.value)
+		return self.value
+
+	def update_bar(self, high: float, low: float, close: float, volume: float):
+		return self.update(close)
+
+	def warmup_bars(self, highs, lows, closes, volumes):
+		return self.warmup(closes)
+
+	def warmup(self, closes):
+		"""Векторизованный прогрев по истории (массив от старого к новому)"""
+		closes = np.asarray(closes, dtype=np.float64)
+		self.value = None
+		self._seed = SMA(self.length)
+		if len(closes) < self.length:
+			for value in closes:
+				self.update(float(value))
+			return self.value
+		ema = closes[:self.length].mean()
+		rest = closes[self.length:]
+		if len(rest):
+			# ema_n = (1-a)^n * ema_0 + sum(a * (1-a)^(n-1-i) * x_i)
+			decay = 1 - self.alpha
+			weights = self.alpha * decay ** np.arange(len(rest) - 1, -1, -1)
+			ema = decay ** len(rest) * ema + float(np.dot(weights, rest))
+		self.value = float(ema)
+		return self.value
+
+
+class ATR:
+	"""Average True Range со сглаживанием Уайлдера, O(1) на бар"""
+
+	def __init__(self, length: int = 14):
+		self.length = length
+		self.value = None
+		self.prev_close = None
+		self._seed = SMA(length)
+
+	def update(self, high: float, low: float, close: float):
+		if self.prev_close is None:
+			tr = high - low
+		else:
+			tr = max(high - low, abs(high - self.prev_close), abs(low - self.prev_close))
+		self.prev_close = close
+		if self.value is None:
+			self.value = self._seed.update(tr)
+		else:
+			self.value += (tr - self.value) / self.length
+		return self.value
+
+	def update_bar(self, high: float, low: float, close: float, volume: float):
+		return self.update(high, low, close)
+
+	def warmup_bars(self, highs, lows, closes, volumes):
+		return self.warmup(highs, lows, closes)
+
+	def warmup(self, highs, lows, closes):
+		highs = np.asarray(highs, dtype=np.float64)
+		lows = np.asarray(lows, dtype=np.float64)
+		closes = np.asarray(closes, dtype=np.float64)
+		prev = np.concatenate(([np.nan], closes[:-1]))
+		tr = np.nanmax(np.vstack((highs - lows, np.abs(highs - prev), np.abs(lows - prev))), axis=0)
+		self.prev_close = float(closes[-1]) if len(closes) else None
+		if len(tr) < self.length:
+			self.value = None
+			self._seed = SMA(self.length)
+			for value in tr:
+				self._seed.update(float(value))
+			return self.value
+		atr = tr[:self.length].mean()
+		rest = tr[self.length:]
+		if len(rest):
+			decay = 1 - 1 / self.length
+			weights = (1 / self.length) * decay ** np.arange(len(rest) - 1, -1, -1)
+			atr = decay ** len(rest) * atr + float(np.dot(weights, rest))
+		self.value = float(atr)
+		return self.value
+
+
+class Bollinger:
+	"""
+	Полосы Боллинджера: средняя, верхняя, нижняя полосы и ширина.
+	Сумма и сумма квадратов окна поддерживаются инкрементально.
+	"""
+
+	def __init__(self, length: int = 20, mult: float = 2.0):
+		self.length = length
+		self.mult = mult
+		self.buffer = RingBuffer(length)
+		self.total = 0.0
+		self.total_sq = 0.0
+		self._updates = 0
+
+	def update(self, value: float):
+		evicted = self.buffer.append(value)
+		self.total += value
+		self.total_sq += value * value
+		if evicted is not None:
+			self.total -= evicted
+			self.total_sq -= evicted * evicted
+		self._updates += 1
+		if self._updates % self.length == 0:
+			self.total = sum(self.buffer.data)
+			self.total_sq = sum(x * x for x in self.buffer.data)
+		return self.value
+
+	def update_bar(self, high: float, low: float, close: float, volume: float):
+		return self.update(close)
+
+	def warmup_bars(self, highs, lows, closes, volumes):
+		return self.warmup(closes)
+
+	def warmup(self, closes):
+		closes = np.asarray(closes, dtype=np.float64)[-self.length:]
+		self.buffer = RingBuffer(self.length)
+		for value in closes:
+			self.buffer.append(float(value))
+		self.total = float(closes.sum())
+		self.total_sq = float(np.dot(closes, closes))
+		self._updates = 0
+		return self.value
+
+	@property
+	def value(self):
+		"""(middle, upper, lower) или None, пока окно не заполнено"""
+		if not self.buffer.full:
+			return None
+		middle = self.total / self.length
+		variance = max(self.total_sq / self.length - middle * middle, 0.0)
+		deviation = self.mult * variance ** 0.5
+		return middle, middle + deviation, middle - deviation
+
+	@property
+	def width(self):
+		"""Относительная ширина полос (upper - lower) / middle"""
+		bands = self.value
+		if bands is None or bands[0] == 0:
+			return None
+		middle, upper, lower = bands
+		return (upper - lower) / middle
+
+
+class VWAP:
+	"""Скользящий VWAP за length баров по типичной цене (high + low + close) / 3"""
+
+	def __init__(self, length: int = 14):
+		self.length = length
+		self.pv = RingBuffer(length)
+		self.volume = RingBuffer(length)
+		self.total_pv = 0.0
+		self.total_volume = 0.0
+		self._updates = 0
+
+	def update(self, high: float, low: float, close: float, volume: float):
+		pv = (high + low + close) / 3 * volume
+		evicted_pv = self.pv.append(pv)
+		evicted_volume = self.volume.append(volume)
+		self.total_pv += pv - (evicted_pv or 0.0)
+		self.total_volume += volume - (evicted_volume or 0.0)
+		self._updates += 1
+		if self._updates % self.length == 0:
+			self.total_pv = sum(self.pv.data)
+			self.total_volume = sum(self.volume.data)
+		return self.value
+
+	def update_bar(self, high: float, low: float, close: float, volume: float):
+		return self.update(high, low, close, volume)
+
+	def warmup_bars(self, highs, lows, closes, volumes):
+		return self.warmup(highs, lows, closes, volumes)
+
+	def warmup(self, highs, lows, closes, volumes):
+		highs, lows, closes, volumes = (np.asarray(a, dtype=np.float64)[-self.length:] for a in (highs, lows, closes, volumes))
+		pv = (highs + lows + closes) / 3 * volumes
+		self.pv = RingBuffer(self.length)
+		self.volume = RingBuffer(self.length)
+		for p, v in zip(pv, volumes):
+			self.pv.append(float(p))
+			self.volume.append(float(v))
+		self.total_pv = float(pv.sum())
+		self.total_volume = float(volumes.sum())
+		self._updates = 0
+		return self.value
+
+	@property
+	def value(self):
+		if self.total_volume <= 0:
+			return None
+		return self.total_pv / self.total_volume
+
+
+def volatility_grid_params(price: float, atr: float = None, bollinger_width: float = None,
+						   step_mult: float = 0.5, target_mult: float = 0.7,
+						   min_step: float = 0.001, max_step: float = 0.05) -> tuple:
+	"""
+	Переводит волатильность в (grid_step, profit_target) для Trading.get_buy_grid.
+	Шаг сетки - доля ATR от цены (или ширины полос Боллинджера), тейк пропорционален шагу.
+	"""
+	if atr is not None and price:
+		volatility = atr / price
+	elif bollinger_width is not None:
+		volatility = bollinger_width / 4  # ширина 2σ-полос ~ 4 стандартных отклонения
+	else:
+		return None, None
+	grid_step = float(min(max(volatility * step_mult, min_step), max_step))
+	profit_target = grid_step * target_mult / step_mult
+	return grid_step, profit_target
@@ -0,0 +1,92 @@
+import asyncio
+import logging
+import sqlite3
+import time
+from decode_okx import loads, dumps
+
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s [%(levelname)s] %(message)s',
+    handlers=[
+        logging.FileHandler("grid.log"),
+        logging.StreamHandler()
+    ]
+)
+
+# Журнал состояния сеток (SQLite в режиме WAL).
+# События: grid (новая/пересчитанная сетка), order (маркет ордер уровня), fill (исполнение из WS), reset (сброс сетки),
+# resize / reduce (ордер уровня из стакана снят после частичного исполнения: новый объём продажи / проданная часть).
+# record() только кладёт событие в буфер, запись идёт пачками из фоновой задачи через asyncio.to_thread,
+# поэтому strategy() никогда не ждёт диск. reset удаляет из файла старые события инструмента -
+# при старте воспроизводится только текущая сетка.
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS events (
+	seq INTEGER PRIMARY KEY AUTOINCREMENT,
+	ts REAL NOT NULL,
+	inst_id TEXT NOT NULL,
+	kind TEXT NOT NULL,
+	payload TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS events_inst ON events (inst_id, seq);
+"""
+
+
+class GridJournal:
+	def __init__(self, path: str = "grid_journal.db", flush_interval: float = 0.05):
+		self.path = path
+		self.flush_interval = flush_interval
+		self._pending = []
+		self._conn = sqlite3.connect(path, timeout=5, check_same_thread=False)
+		self._conn.execute("PRAGMA journal_mode=WAL")
+		# В режиме WAL synchronous=NORMAL: fsync только на checkpoint, коммит не ждёт диск
+		self._conn.execute("PRAGMA synchronous=NORMAL")
+		self._conn.executescript(SCHEMA)
+		self._conn.commit()
+		self.written = 0
+
+	def record(self, inst_id: str, kind: str, **payload):
+		"""Добавляет событие в буфер (без ввода-вывода)"""
+		self._pending.append((time.time(), inst_id, kind, dumps(payload)))
+
+	def _write(self, batch: list):
+		with self._conn:
+			for ts, inst_id, kind, payload in batch:
+				if kind == 'reset':
+					self._conn.execute("DELETE FROM events WHERE inst_id = ?", (inst_id,))
+				self._conn.execute("INSERT INTO events (ts, inst_id, kind, payload) VALUES (?, ?, ?, ?)", (ts, inst_id, kind, payload))
+
+	async def flush(self):
+		if not self._pending:
+			return
+		batch, self._pending = self._pending, []
+		try:
+			await asyncio.to_thread(self._write, batch)
+		except Exception:
+			# Транзакция откатилась целиком: возвращаем пачку перед событиями, пришедшими за время записи
+			self._pending[:0] = batch
+			raise
+		self.written += len(batch)
+
+	async def run(self):
+		"""Фоновая запись буфера пачками"""
+		while True:
+			try:
+				await self.flush()
+			except Exception as e:
+				logging.warning(f"❗️ Journal write failed: {e}")
+			await asyncio.sleep(self.flush_interval)
+
+	def load(self, inst_id: str) -> list:
+		"""События текущей сетки инструмента: [(ts, kind, payload), ...] от старых к новым"""
+		rows = self._conn.execute(
+			"SELECT ts, kind, payload FROM events WHERE inst_id = ? AND seq >= "
+			"COALESCE((SELECT MAX(seq) FROM events WHERE inst_id = ? AND kind = 'reset'), 0) ORDER BY seq",
+			(inst_id, inst_id)
+		).fetchall()
+		return [(ts, kind, loads(payload)) for ts, kind, payload in rows]
+
+	async def close(self):
+		await self.flush()
+		self._conn.close()
+		logging.info(f"✅ Journal closed ({self.written} events written)")
@@ -1,12 +1,20 @@
 #!/usr/bin/env python3
 import asyncio
-from asyncio import QueueEmpty
-from datetime import datetime
+import json
 import logging
+import multiprocessing
+import os
+import time
 from ws_okx import WebSocketClient
 from trade_okx import Trading
-from tech import TechAnalysis
+from tech import TechAnalysis, get_instruments_info, okx_bar
 from telegram_bot import TelegramBot
+from rest_okx import OkxRestClient
+from price_mailbox import PriceMailbox
+from indicators import ATR, volatility_grid_params
+from md_bus import BusReader, bus_pump
+from journal import GridJournal
+from recorder import TickRecorder
 
 
 # Настройка логирования
@@ -19,18 +27,81 @@ logger = logging.getLogger(__name__)
 
 # === User and Coin data ===
 from keys import *
-inst_id = "DEGEN-USDT-SWAP"
 balance = 50
 leverage = 2
 allowed_user = "floppa_lohnes"
 chat_id = None
 tf = 1  # Timeframe in minutes, 1 = 1 minute candles, 24 = 1day candles
-trading = None # type: ignore
+atr_grid = False  # True - grid_step/profit_target считаются из ATR(14), а не берутся фиксированными
+workers = 0  # 0 - все инструменты в одном процессе, N - инструменты делятся между N процессами (supervise())
+# Адреса биржи: для бумажной торговли и нагрузочных тестов - локальный симулятор (python okx_sim.py),
+# например OKX_REST_URL=http://127.0.0.1:8080 OKX_WS_URL=ws://127.0.0.1:8080
+okx_rest_url = os.getenv("OKX_REST_URL", "https://www.okx.com")
+okx_ws_url = os.getenv("OKX_WS_URL", "wss://ws.okx.com:8443")
+journal_path = "grid_journal.db"  # журнал сеток для восстановления после рестарта, None - не вести
+record_dir = None  # каталог для записи тиков и событий ордеров (recorder.py), None - не записывать
+market_data_bus = None  # имя сегмента shared memory фида (python md_bus.py NAME instId...), None - свой публичный WS
+# Публичный фид: None - канал tickers, триггер по last. "bbo-tbt" / "books5" / "books" - локальный стакан,
+# buy уровни срабатывают по лучшему ask, sell уровни по лучшему bid (books - инкрементально, с проверкой checksum)
+book_channel = None
+# Сколько одинаковых публичных соединений держать: > 1 - горячий резерв, обновление берётся с того, где пришло раньше,
+# обрыв или зависание одного соединения не оставляет стратегию без цены
+public_connections = 1
+
+# Настройки по умолчанию для каждой сетки
+grid_defaults = {
+	"balance": balance,
+	"leverage": leverage,
+	"grid_step": 0.003,
+	"profit_target": 0.004,
+	"quantity": 100,
+	"sma_length": 14,
+	# "market" - маркет ордер, когда тик пересёк уровень; "limit" - post-only ордера стоят в стакане
+	# на resting_levels ближайших уровнях с каждой стороны, исполнения приходят из канала orders
+	"order_mode": "market",
+	"resting_levels": 5,
+}
+# Инструменты, которые торгуются в одном процессе. Пустой словарь - настройки по умолчанию,
+# любой ключ из grid_defaults можно переопределить для конкретной монеты
+instruments = {
+	"DEGEN-USDT-SWAP": {},
+}
+instruments_file = None  # JSON из optimize.py --out: поверх instruments накладываются подобранные grid_step, profit_target, quantity, sma_length
+grids = {}  # instId -> GridInstance
+journal = None
+recorder = None
+
+
+class GridInstance:
+	"""Всё, что относится к одной сетке: настройки, Trading, TechAnalysis и каналы от общего WebSocketClient"""
+
+	def __init__(self, inst_id: str, settings: dict):
+		self.inst_id = inst_id
+		self.settings = {**grid_defaults, **settings}
+		self.price_mailbox = PriceMailbox()
+		self.orders_queue = asyncio.Queue()
+		self.candle_queue = asyncio.Queue()
+		self.last_price = None
+		self.trading = None
+		self.ta = None
 
 # === Cancel all tasks after TgBot Button ====
 async def full_shutdown():
-	# 1. Shutdown websocket
+	# 1. Cancel resting limit orders, shutdown websocket and REST connection pool
+	for grid in grids.values():
+		if grid.trading is not None and grid.trading.order_mode == 'limit':
+			# state_lock не отпускаем до отмены задач: strategy() и order_events() не вернут ордера в стакан
+			await grid.trading.state_lock.acquire()
+			try:
+				await grid.trading.cancel_resting()
+			except Exception as e:
+				logging.warning(f"❗️ {grid.inst_id}: failed to cancel resting orders: {e}")
 	await ws.shutdown()
+	await rest.close()
+	if journal is not None:
+		await journal.close()
+	if recorder is not None:
+		recorder.close()
 	# 2. Cancel all other asyncio tasks except this one
 	current_task = asyncio.current_task()
 	tasks = [t for t in asyncio.all_tasks() if t is not current_task]
@@ -44,47 +115,65 @@ async def full_shutdown():
 		logging.root.removeHandler(handler)
 
 # === Buy line updater coroutine ===
-async def sma_updater():
+async def sma_updater(grid: GridInstance):
+	trading, ta, candle_queue = grid.trading, grid.ta, grid.candle_queue
+	sma_length = grid.settings["sma_length"]
 	
 	await asyncio.sleep(4)  # Give some time for the program to connect Websockets
+	# SMA заполняется по REST один раз, дальше обновляется закрытыми свечами из WS
+	sma = await ta.seed_sma(length=sma_length)
 	while True:
 		if not tg_bot.bot_work:
 			await asyncio.sleep(4)
 			continue
 		try:
-			# Проверяем: если нет ни одного ордера в статусе 'filled' или 'partially_filled'	
-			if not any(order['status'] in ['filled', 'partially_filled'] for order in trading.strategy_orders.values()):
-				candles = await ta.get_candle_data()
-				sma = await ta.calculate_sma(candles, length=14)
-				buy_grid = await trading.get_buy_grid(start_from=sma, quantity=100)
-				sell_grid = await trading.get_sell_grid(buy_orders=buy_grid)
-				
-			now = datetime.now()
+			# Проверяем: если нет ни одного уровня с открытой позицией (счётчик, без обхода ордеров)
+			if sma is not None and trading.strategy_orders.open_positions == 0:
+				grid_step, profit_target = None, None
+				if atr_grid:
+					grid_step, profit_target = volatility_grid_params(sma, atr=ta.indicator_value('atr'))
+				# Меняются только сдвинувшиеся уровни, при том же якоре пересчёт пропускается
+				stats = await trading.recenter_grid(start_from=sma, quantity=grid.settings["quantity"], grid_step=grid_step, profit_target=profit_target)
+				if stats is not None and trading.order_mode == 'limit':
+					# Ордера в стакане переезжают на новые цены уровней сразу, не дожидаясь тика
+					async with trading.state_lock:
+						await trading.sync_resting()
 
-			# Вычисляем количество минут, прошедших с начала часа
-			minute = now.minute
-			second = now.second
-			elapsed = (minute % tf) * 60 + second
-			interval_seconds = tf * 60
-			seconds = interval_seconds - elapsed
+			# Сколько тиков схлопнуто и насколько свежей была цена, отданная стратегии
+			logging.info(f"📬 {grid.inst_id} price mailbox: {grid.price_mailbox.stats()}")
+			logging.info(f"⏱ {grid.inst_id} fill processing latency: {trading.fill_latency.summary()}")
+			logging.info(f"⏱ {grid.inst_id} tick to order latency: {trading.order_latency.summary()}")
+			# Очередь REST запросов процесса: глубина, ожидание токенов лимитов OKX, объединённые чтения
+			logging.info(f"🚦 REST scheduler: {rest.scheduler.stats()}")
 
-			await asyncio.sleep(seconds + 1)
+			# Ждём закрытия следующей свечи и сразу пересчитываем сетку.
+			# Если канал свечей молчит дольше двух баров (реконнект) - заново заполняем SMA по REST
+			try:
+				candle = await asyncio.wait_for(candle_queue.get(), timeout=2 * ta.bar_seconds + 5)
+				sma = ta.update_candle(candle)
+			except asyncio.TimeoutError:
+				logging.warning("❗️ No confirmed candles from WS, reseeding SMA from REST")
+				sma = await ta.seed_sma(length=sma_length)
 
 		except Exception as e:
-			logging.warning(f"😈Ошибка обновления sma_updater: {e}")
+			logging.warning(f"😈Ошибка обновления sma_updater {grid.inst_id}: {e}")
+			await asyncio.sleep(4)
 
 # === Strategy coroutine ===
-async def strategy(price_queue: asyncio.Queue, orders_queue: asyncio.Queue):
+async def strategy(grid: GridInstance):
+	trading, inst_id, price_mailbox = grid.trading, grid.inst_id, grid.price_mailbox
 	await asyncio.sleep(4)  # Give some time for the program to connect Websockets
 	orders_cancelled = False
 	while True:
 				
 		# --- Stop function if we pressed TgBot Pause Button ---
 		if not tg_bot.bot_work:
-			if trading.strategy_orders and not orders_cancelled:
-				trading.buy_grid_orders.clear()
-				trading.sell_grid_orders.clear()
-				trading.strategy_orders.clear()
+			if not orders_cancelled:
+				if trading.resting:
+					async with trading.state_lock:
+						await trading.cancel_resting()
+				if trading.strategy_orders:
+					trading.clear_grid()
 				orders_cancelled = True
 
 			await asyncio.sleep(4)
@@ -95,169 +184,447 @@ async def strategy(price_queue: asyncio.Queue, orders_queue: asyncio.Queue):
 
 		# --- Getting price from queue and analyse it ---
 		try:
-			if not hasattr(strategy, "_last_price"):
-				strategy._last_price = None
-			price = await price_queue.get()
-			if price != strategy._last_price:
-				strategy._last_price = price
-
-				# === BUY GRID ORDERS ===
-				if hasattr(trading, 'buy_grid_orders'):
-					for order_number, order in list(trading.buy_grid_orders.items()):
-						if order['status'] == 'live' and price <= order['entry_price']:
-							
-							logging.info(f"🟢🟢🟢🟢🟢🟢🟢Buy {order['size']} {inst_id} | {price}, entry_price {order['entry_price']}. Close price {order['close_price']}. Order {order_number}")
-
-							# Размещаем маркет ордер на покупку
-							market_order_id = await trading.place_market_buy_order(order, price)
-							
-							# Обновляем статус ордера в buy_grid_orders
-							order['status'] = 'filled'
-
-							# Активируем соответствующий sell ордер
-							trading.sell_grid_orders[order_number]['status'] = 'live'
-							trading.sell_grid_orders[order_number]['group_with_id'] = market_order_id
-							
-				# === SELL GRID ORDERS ===
-				if hasattr(trading, 'sell_grid_orders'):
-					for order_number, order in list(trading.sell_grid_orders.items()):
-						if order['status'] == 'live' and price >= order['entry_price']:
-							
-							logging.info(f"🔴🔴🔴🔴🔴🔴🔴Sell {order['size']} {inst_id} | {price}, entry_price {order['entry_price']}. Order {order_number}")
-							
-							order_copy = order.copy()
-							order_copy['group_with_id'] = order['group_with_id']  # Это уже реальный ID после обновления в buy блоке
-							market_order_id = await trading.place_market_sell_order(order_copy, price)
-
-							# Обновляем статус ордера в sell_grid_orders
-							order['status'] = 'filled'
-							
-							# Проверяем, если продали первый ордер  - сбрасываем все
-							if order_number == 0: 
+			price = await price_mailbox.get()
+			tick_time = time.monotonic() - price_mailbox.last_age
+			if price != grid.last_price:
+				grid.last_price = price
+				# Фид стакана (book_channel) отдаёт (bid, ask): маркет покупка исполнится по ask, продажа по bid
+				buy_price, sell_price = (price[1], price[0]) if type(price) is tuple else (price, price)
+
+				if trading.order_mode == 'limit':
+					# Исполняет биржа, тик только сдвигает окно ордеров в стакане (без запросов, если окно не изменилось)
+					async with trading.state_lock:
+						await trading.sync_resting(price)
+					continue
+
+				# Пока тик обрабатывается, события ордеров ждут: order_events() применит их
+				# только после того, как ордера тика будут записаны в strategy_orders
+				async with trading.state_lock:
+					# === BUY GRID ORDERS ===
+					# grid_book отдаёт только пересечённые живые уровни, без обхода всей сетки
+					crossed_buys = trading.ready_levels('buy', trading.grid_book.crossed_buys(buy_price))
+					if crossed_buys:
+						buy_orders = {n: trading.buy_grid_orders[n] for n in crossed_buys}
+						for order_number, order in buy_orders.items():
+							logging.info(f"🟢🟢🟢🟢🟢🟢🟢Buy {order['size']} {inst_id} | {buy_price}, entry_price {order['entry_price']}. Close price {order['close_price']}. Order {order_number}")
+
+						# Все уровни, пересечённые тиком, уходят одним пакетом
+						market_order_ids = await trading.place_market_orders('buy', buy_orders, buy_price)
+						trading.order_latency.add(time.monotonic() - tick_time)
+
+						for order_number, market_order_id in market_order_ids.items():
+							if market_order_id is None:
+								# Ордер не размещён - уровень остаётся живым и будет повторён следующим тиком
+								continue
+							# buy уровень исполнен, активируем соответствующий sell ордер
+							trading.open_level(order_number, market_order_id)
+
+					# === SELL GRID ORDERS ===
+					crossed_sells = trading.ready_levels('sell', trading.grid_book.crossed_sells(sell_price))
+					if crossed_sells:
+						sell_orders = {n: trading.sell_grid_orders[n] for n in crossed_sells}
+						for order_number, order in sell_orders.items():
+							logging.info(f"🔴🔴🔴🔴🔴🔴🔴Sell {order['size']} {inst_id} | {sell_price}, entry_price {order['entry_price']}. Order {order_number}")
+
+						market_order_ids = await trading.place_market_orders('sell', sell_orders, sell_price)
+						trading.order_latency.add(time.monotonic() - tick_time)
+
+						# Первый ордер обрабатываем последним: после него сетка сбрасывается целиком
+						placed = [n for n, market_order_id in market_order_ids.items() if market_order_id is not None]
+						for order_number in sorted(placed, key=lambda n: n == 0):
+							# Продали не первый ордер - buy уровень снова активен
+							# (ордера закрытого круга уже переехали в архив strategy_orders).
+							# Продали первый ордер - сетка сбрасывается целиком
+							if trading.close_level(order_number):
 								logging.info("🔶Cбрасываем все и пересчитываем buyline")
-								
-								trading.strategy_orders.clear()
-								trading.buy_grid_orders.clear()
-								trading.sell_grid_orders.clear()
-
-								try:
-									await tg_bot.send_message(
-										tg_bot.chat_id,
-										"✅ Setup Done"
-									)
-								except Exception as e:
-									logging.warning(f"🔅❌ Failed to send reset notification: {e}")
-
-							else:
-								# Если продали не первый ордер - активируем соответствующий buy ордер
-								trading.buy_grid_orders[order_number]['status'] = 'live'
-								trading.strategy_orders[market_order_id]['status'] = 'live'
-
-				else: 
-					logging.info(f'ERROR: Dont have buy/sell grid orders')
-				
+
+								# Не держим state_lock на время запроса к Telegram
+								asyncio.create_task(tg_bot.send_message(
+									tg_bot.chat_id,
+									"✅ Setup Done"
+								))
+
 		except RuntimeError as e:
 			if "attached to a different loop" in str(e):
-				logging.warning("Price queue attached to a different event loop. Exiting strategy loop.")
+				logging.warning("Price mailbox attached to a different event loop. Exiting strategy loop.")
 				break
 			else:
-				logging.info(f"Price queue error: {e}")
+				logging.info(f"Price mailbox error: {e}")
 				raise
 
-		# --- Process order events and update orders ---
-		while True:
-			try:
-				msg = orders_queue.get_nowait()
-			except QueueEmpty:
-				break
+# === Order events consumer coroutine ===
+async def order_events(grid: GridInstance):
+	"""
+	Обрабатывает сообщения приватного канала orders сразу по приходу, независимо от тиков.
+	Порядок относительно strategy() гарантирует trading.state_lock: событие применяется
+	либо до обработки тика, либо после того, как ордера тика записаны в strategy_orders.
+	"""
+	trading, orders_queue = grid.trading, grid.orders_queue
+	while True:
+		# Обновления уже декодированы в OrderUpdate: числа переведены из строк в ws_okx
+		received_at, updates = await orders_queue.get()
+
+		notifications = []
+		async with trading.state_lock:
+			if trading.order_mode == 'limit':
+				# Уровни открывают и закрывают исполнения ордеров из стакана
+				await resting_events(grid, updates, notifications)
+			else:
+				# ---  Checking order Status  ---
+				for update in updates:
+					order_id = update.ord_id
+					state = update.state
+
+					if state == "filled" or state == "partially_filled":
+						# Ордер может быть уже в архиве (круг закрыт раньше, чем пришло событие)
+						order = trading.apply_fill(order_id, state, update.acc_fill_sz, update.avg_px,
+												   update.notional_usd, update.fee, update.u_time / 1000)
+						if order is not None:
+							notifications.append((order.side, state, update))
+
+		# Время от получения сообщения из сокета до обновления strategy_orders
+		trading.fill_latency.add(time.monotonic() - received_at)
+
+		# Send TgBot message about filled order (не задерживаем следующие события)
+		for side, state, update in notifications:
+			asyncio.create_task(notify_fill(side, state, update))
+
+async def resting_events(grid: GridInstance, updates: list, notifications: list):
+	"""
+	order_mode='limit': исполнения ордеров из стакана меняют уровни сетки, после чего окно ордеров
+	сразу пересобирается - купленный уровень получает продажу, проданный снова встаёт на покупку.
+	Вызывается под state_lock.
+	"""
+	trading, inst_id = grid.trading, grid.inst_id
+	changed = False
+	for update in updates:
+		fill = trading.apply_resting_update(update)
+		if fill is None:
+			# Исполнения ордеров, ушедших мимо стакана (продажа остатков после сброса), - как в маркет режиме
+			if update.state in ("filled", "partially_filled") and trading.apply_fill(
+					update.ord_id, update.state, update.acc_fill_sz, update.avg_px, update.notional_usd, update.fee, update.u_time / 1000):
+				notifications.append((update.side, update.state, update))
+			continue
+		side, reset, leftovers = fill
+		changed = True
+		notifications.append((side, update.state, update))
+		emoji = "🟢🟢🟢🟢🟢🟢🟢Buy" if side == 'buy' else "🔴🔴🔴🔴🔴🔴🔴Sell"
+		logging.info(f"{emoji} {update.acc_fill_sz} {inst_id} | {update.avg_px} (resting order {update.cl_ord_id})")
+		if leftovers:
+			# Продажа уровня 0 исполнилась раньше, чем продажи уровней ниже - закрываем их по рынку
+			logging.warning(f"❗️ {inst_id}: grid reset with {len(leftovers)} open levels, selling them at market")
+			await trading.close_leftovers(leftovers, update.avg_px)
+		if reset:
+			logging.info("🔶Cбрасываем все и пересчитываем buyline")
+			asyncio.create_task(tg_bot.send_message(tg_bot.chat_id, "✅ Setup Done"))
+	# На паузе ордера сняты и окно не восстанавливается
+	if changed and tg_bot.bot_work:
+		await trading.sync_resting()
+
+async def notify_fill(side: str, state: str, update):
+	try:
+		if tg_bot.chat_id:
+			filled_price = update.avg_px
+			usdt_size = update.notional_usd
+			side_emoji = "🛒" if side == "buy" else "💰"
+			side_text = "Buy" if side == "buy" else "Sell"
+			
+			# Добавляем (partial) если статус partially_filled
+			if state == "partially_filled":
+				side_text += " (partial)"
+			
+			await tg_bot.send_message(
+				tg_bot.chat_id,
+				f"{side_emoji} {side_text} at {filled_price} | {round(usdt_size, 2)} USDT"
+			)
+		else:
+			logging.warning("🔅❌ tg_bot.chat_id is None, skipping notification")
+	except Exception as e:
+		logging.warning(f"🔅❌ Failed to send order notification: {e}")
 
-			# Process the message about orders
-			data = msg.get("data", [])
-			if not data:	
-				continue
-
-			# # ---  Checking order Status  ---
-			for item in data:
-				order_id = item.get("ordId")
-				state = item.get("state")
-
-				if state == "filled" or state == "partially_filled":
-					if order_id in trading.strategy_orders:
-						trading.strategy_orders[order_id]["status"] = state
-						side = trading.strategy_orders[order_id].get("side")
-						trading.strategy_orders[order_id]['size'] = float(item.get('accFillSz'))
-						trading.strategy_orders[order_id]['filledPrice'] = float(item.get('avgPx'))
-						trading.strategy_orders[order_id]['usdt_size'] = float(item.get('notionalUsd'))
-						trading.strategy_orders[order_id]['fee'] = float(item.get('fee'))
-
-						# Send TgBot message about filled order
-						try:
-							if tg_bot.chat_id:
-								filled_price = item.get('avgPx')
-								usdt_size = float(item.get('notionalUsd', 0))
-								side_emoji = "🛒" if side == "buy" else "💰"
-								side_text = "Buy" if side == "buy" else "Sell"
-								
-								# Добавляем (partial) если статус partially_filled
-								if state == "partially_filled":
-									side_text += " (partial)"
-								
-								await tg_bot.send_message(
-									tg_bot.chat_id,
-									f"{side_emoji} {side_text} at {filled_price} | {round(usdt_size, 2)} USDT"
-								)
-							else:
-								logging.warning("🔅❌ tg_bot.chat_id is None, skipping notification")
-						except Exception as e:
-							logging.warning(f"🔅❌ Failed to send order notification: {e}")
-						
 # === Initialize all objects and creating (waiting) async tasks ===
-async def create_tasks():
-	global tg_bot, trading, ta, ws
-	price_queue = asyncio.Queue()
-	orders_queue = asyncio.Queue()
-
-	# === Getting instrument parameters from exchange ===
-	ta = TechAnalysis(instrument_id=inst_id, lookback=15, timeframe=tf)
-	lot_size, ct_val, min_size, tick_size = await ta.get_lot_tick_min()
-	ta.tick_size = tick_size
+async def create_tasks(selected: dict = None, ipc=None):
+	"""
+	selected - подмножество instruments для этого процесса (по умолчанию все).
+	ipc - конец multiprocessing.Pipe, если процесс запущен супервизором: тогда Telegram поллер
+	не запускается (он один на токен и живёт в супервизоре), а команды и отчёты идут через pipe.
+	"""
+	global tg_bot, ws, rest, journal, recorder
+	selected = instruments if selected is None else selected
+	journal = GridJournal(journal_path) if journal_path else None
+
+	# One HTTP/2 connection pool shared by every TechAnalysis and Trading
+	rest = OkxRestClient(api_key=api_key, secret_key=secret_key, passphrase=passphrase, flag='0', base_url=okx_rest_url)
+	# One public, one private and one business socket shared by every grid
+	# С market_data_bus публичный сокет не нужен: цены читаются из shared memory фида
 	ws = WebSocketClient(api_key=api_key, 
 						 secret_key=secret_key, 
 						 passphrase=passphrase,
-						 instrument_id=inst_id,
-						 price_queue=price_queue, 
-						 orders_queue=orders_queue
+						 candle_bar=okx_bar(tf),
+						 public=market_data_bus is None,
+						 ws_url=okx_ws_url,
+						 book_channel=book_channel,
+						 public_connections=public_connections,
+						 scheduler=rest.scheduler
 						 )
-	trading = Trading(api_key=api_key, 
-				  secret_key=secret_key, 
-				  passphrase=passphrase,
-				  instrument_id=inst_id,
-				  balance=balance, 
-				  leverage=leverage,
-				  lot_size=lot_size, ct_val=ct_val, min_size=min_size, tick_size=tick_size,
-				  grid_step=0.003, profit_target=0.004
-				  )
+	if record_dir:
+		recorder = TickRecorder(record_dir)
+		ws.tick_listeners.append(recorder.tick)
+		ws.order_listeners.append(recorder.order)
+
+	# === Getting instrument parameters from exchange (one request for all instruments) ===
+	instruments_info = await get_instruments_info(rest, list(selected))
+	for inst_id, settings in selected.items():
+		if inst_id not in instruments_info:
+			continue
+		grid = GridInstance(inst_id, settings)
+		lot_size, ct_val, min_size, tick_size = instruments_info[inst_id]
+		logging.info(f"{inst_id} lot_size: {lot_size}, ct_val: {ct_val}, min_size: {min_size}, tick_size: {tick_size}")
+
+		grid.ta = TechAnalysis(instrument_id=inst_id, lookback=15, timeframe=tf, rest=rest)
+		grid.ta.tick_size = tick_size
+		if atr_grid:
+			grid.ta.add_indicator('atr', ATR(14))
+		grid.trading = Trading(api_key=api_key, 
+					  secret_key=secret_key, 
+					  passphrase=passphrase,
+					  instrument_id=inst_id,
+					  balance=grid.settings["balance"], 
+					  leverage=grid.settings["leverage"],
+					  lot_size=lot_size, ct_val=ct_val, min_size=min_size, tick_size=tick_size,
+					  grid_step=grid.settings["grid_step"], profit_target=grid.settings["profit_target"],
+					  rest=rest,
+					  order_ws=ws,
+					  journal=journal,
+					  order_mode=grid.settings["order_mode"],
+					  resting_levels=grid.settings["resting_levels"]
+					  )
+		# После рестарта сетка и открытые уровни восстанавливаются из журнала и сверяются с биржей
+		if journal is not None and grid.trading.restore(journal.load(inst_id)):
+			await grid.trading.reconcile()
+		# Ордера в стакане с прошлого запуска не знают о восстановленном состоянии - снимаем, окно выставится заново
+		if grid.trading.order_mode == 'limit':
+			try:
+				await grid.trading.cancel_stale_orders()
+			except Exception as e:
+				logging.warning(f"❗️ {inst_id}: failed to cancel stale resting orders: {e}")
+		ws.add_instrument(inst_id, grid.price_mailbox, grid.orders_queue, grid.candle_queue)
+		grids[inst_id] = grid
+		logging.info(f"{inst_id} lot_precision: {grid.trading.lot_precision}")
+
 	tg_bot = TelegramBot(shutdown_coroutine=full_shutdown,
 							 tg_token=tg_token,
-							 trading=trading, 
+							 trading={inst_id: grid.trading for inst_id, grid in grids.items()}, 
 							 allowed_user=allowed_user,
 							 chat_id=chat_id
 						)
-	logging.info(f"lot_precision: {trading.lot_precision}")
-	tasks = [
-		asyncio.create_task(ws.start()),
-		asyncio.create_task(tg_bot.start()),
-		asyncio.create_task(sma_updater()),
-		asyncio.create_task(strategy(price_queue, orders_queue)),
-	]
+	tasks = [asyncio.create_task(ws.start())]
+	if journal is not None:
+		tasks.append(asyncio.create_task(journal.run()))
+	if market_data_bus:
+		reader = BusReader(market_data_bus)
+		missing = [inst_id for inst_id in grids if reader.symbol_id(inst_id) is None]
+		if missing:
+			logging.warning(f"❗️ Market data bus {market_data_bus} does not publish {missing}")
+		tasks.append(asyncio.create_task(bus_pump(reader, {inst_id: grid.price_mailbox for inst_id, grid in grids.items()})))
+	if ipc is None:
+		tasks.append(asyncio.create_task(tg_bot.start()))
+	else:
+		tasks.append(asyncio.create_task(worker_ipc(ipc)))
+	for grid in grids.values():
+		tasks += [
+			asyncio.create_task(sma_updater(grid)),
+			asyncio.create_task(strategy(grid)),
+			asyncio.create_task(order_events(grid)),
+		]
 	try:
 		await asyncio.wait(tasks)
 	except asyncio.CancelledError:
 		pass
 
+# === Multi-process sharding ===
+def grid_health() -> dict:
+	"""Короткий отчёт по сеткам процесса для супервизора"""
+	report = {}
+	for inst_id, grid in grids.items():
+		trading = grid.trading
+		report[inst_id] = {
+			'open_levels': trading.strategy_orders.open_positions,
+			'strategy_orders': len(trading.strategy_orders),
+			'resting_orders': len(trading.resting),
+			'round_trips': trading.strategy_orders.round_trips,
+			'realized_pnl': round(trading.realized_pnl, 6),
+			'fees': round(trading.fees_paid, 6),
+			'last_price': grid.last_price,
+			'mailbox': grid.price_mailbox.stats(),
+			'fill_latency': trading.fill_latency.summary(),
+			'order_latency': trading.order_latency.summary(),
+		}
+		book = ws.books.get(inst_id)
+		if book is not None:
+			report[inst_id]['book'] = {'updates': book.updates, 'resyncs': book.resyncs, 'levels': len(book)}
+	return report
+
+async def worker_ipc(conn, report_interval: float = 5):
+	"""Выполняет команды супервизора (pause/resume/chat_id/stop) и отправляет отчёты о здоровье и PnL"""
+	last_report = 0.0
+	while True:
+		while conn.poll():
+			msg = conn.recv()
+			cmd = msg.get("cmd")
+			if cmd == "pause":
+				tg_bot.bot_work = False
+			elif cmd == "resume":
+				tg_bot.bot_work = True
+			elif cmd == "chat_id":
+				tg_bot.chat_id = msg.get("chat_id")
+			elif cmd == "stop":
+				await full_shutdown()
+				return
+		if time.monotonic() - last_report >= report_interval:
+			last_report = time.monotonic()
+			conn.send({"type": "health", "pid": os.getpid(), "ts": time.time(), "grids": grid_health(),
+					   "feeds": [feed.stats() for feed in ws.feeds], "rest": rest.scheduler.stats()})
+		await asyncio.sleep(0.2)
+
+def run_worker(selected: dict, conn, core: int = None, worker_journal: str = None):
+	"""
+	Точка входа процесса-воркера: свой event loop, свои сокеты и свой путь ордеров.
+	worker_journal - свой файл журнала (None - не вести): SQLite журнал не делится между процессами.
+	"""
+	global journal_path
+	journal_path = worker_journal
+	if core is not None and hasattr(os, "sched_setaffinity"):
+		try:
+			os.sched_setaffinity(0, {core})
+		except OSError as e:
+			logging.warning(f"❗️ Failed to pin worker to core {core}: {e}")
+	try:
+		asyncio.run(create_tasks(selected, ipc=conn))
+	except KeyboardInterrupt:
+		pass
+
+async def supervise(n_workers: int, restart_delay: float = 5):
+	"""
+	Делит instruments между n_workers процессами, каждый закреплён за своим ядром.
+	Сам супервизор держит Telegram поллер, пересылает воркерам pause/resume/stop,
+	собирает отчёты о здоровье и PnL и перезапускает упавшие воркеры, не трогая остальные.
+	"""
+	global tg_bot
+	ctx = multiprocessing.get_context("spawn")
+	shards = [dict(list(instruments.items())[i::n_workers]) for i in range(n_workers)]
+	shards = [shard for shard in shards if shard]
+	cores = sorted(os.sched_getaffinity(0)) if hasattr(os, "sched_getaffinity") else list(range(os.cpu_count() or 1))
+	slots = {}  # номер шарда -> {'process', 'conn', 'health', 'restarts'}
+
+	def start_worker(i: int):
+		parent_conn, child_conn = ctx.Pipe()
+		# Шард воркера не меняется между перезапусками, поэтому и журнал у него всегда один: grid_journal.w0.db, ...
+		worker_journal = None
+		if journal_path:
+			root, ext = os.path.splitext(journal_path)
+			worker_journal = f"{root}.w{i}{ext}"
+		process = ctx.Process(target=run_worker, args=(shards[i], child_conn, cores[i % len(cores)], worker_journal),
+							  name=f"grid-worker-{i}", daemon=True)
+		process.start()
+		# Конец воркера остался у дочернего процесса, свой закрываем - иначе смерть воркера не даст EOF
+		child_conn.close()
+		previous = slots.get(i, {})
+		if previous:
+			previous['conn'].close()
+		slots[i] = {'process': process, 'conn': parent_conn, 'health': None, 'restarts': previous.get('restarts', -1) + 1}
+		logging.info(f"🧩 Worker {i} started (pid {process.pid}): {list(shards[i])}")
+		if tg_bot.chat_id:
+			parent_conn.send({"cmd": "chat_id", "chat_id": tg_bot.chat_id})
+		if not tg_bot.bot_work:
+			parent_conn.send({"cmd": "pause"})
+
+	def broadcast(msg: dict):
+		for slot in slots.values():
+			try:
+				slot['conn'].send(msg)
+			except (BrokenPipeError, OSError):
+				pass
+
+	async def stop_workers():
+		broadcast({"cmd": "stop"})
+		for slot in slots.values():
+			await asyncio.to_thread(slot['process'].join, 10)
+			if slot['process'].is_alive():
+				slot['process'].terminate()
+		current_task = asyncio.current_task()
+		for task in [t for t in asyncio.all_tasks() if t is not current_task]:
+			task.cancel()
+		logging.info("✅Supervisor shutdown completed: workers stopped.")
+
+	tg_bot = TelegramBot(shutdown_coroutine=stop_workers,
+							 tg_token=tg_token,
+							 trading=None,
+							 allowed_user=allowed_user,
+							 chat_id=chat_id
+						)
+	for i in range(len(shards)):
+		start_worker(i)
+
+	async def monitor():
+		bot_work, known_chat_id, last_log = tg_bot.bot_work, tg_bot.chat_id, 0.0
+		died_at = {}
+		while True:
+			# Кнопки Telegram -> воркеры
+			if tg_bot.bot_work != bot_work:
+				bot_work = tg_bot.bot_work
+				broadcast({"cmd": "resume" if bot_work else "pause"})
+			if tg_bot.chat_id != known_chat_id:
+				known_chat_id = tg_bot.chat_id
+				broadcast({"cmd": "chat_id", "chat_id": known_chat_id})
+
+			for i, slot in list(slots.items()):
+				try:
+					while slot['conn'].poll():
+						slot['health'] = slot['conn'].recv()
+				except (EOFError, OSError):
+					pass
+				# Перезапуск упавшего воркера с задержкой, остальные продолжают работать
+				if not slot['process'].is_alive() and not tg_bot.stopping:
+					if i not in died_at:
+						died_at[i] = time.monotonic()
+						logging.warning(f"❗️ Worker {i} exited with code {slot['process'].exitcode}, restarting in {restart_delay}s")
+					elif time.monotonic() - died_at[i] >= restart_delay:
+						del died_at[i]
+						start_worker(i)
+
+			if time.monotonic() - last_log >= 30:
+				last_log = time.monotonic()
+				total_pnl = 0.0
+				for i, slot in slots.items():
+					health = slot['health'] or {}
+					pnl = sum(g['realized_pnl'] for g in health.get('grids', {}).values())
+					total_pnl += pnl
+					logging.info(f"🧩 Worker {i} pid {slot['process'].pid} alive={slot['process'].is_alive()} restarts={slot['restarts']} pnl={round(pnl, 4)}")
+				logging.info(f"🧩 Total realized PnL: {round(total_pnl, 4)}")
+			await asyncio.sleep(0.5)
+
+	tasks = [asyncio.create_task(tg_bot.start()), asyncio.create_task(monitor())]
+	try:
+		await asyncio.wait(tasks)
+	except asyncio.CancelledError:
+		pass
+
+def load_instruments_file(path: str):
+	"""Накладывает настройки сеток из файла optimize.py на instruments"""
+	with open(path) as f:
+		for inst_id, settings in json.load(f).items():
+			instruments[inst_id] = {**instruments.get(inst_id, {}), **settings}
+	logging.info(f"🧩 Grid settings loaded from {path}: {', '.join(instruments)}")
+
 if __name__ == '__main__':
+	if instruments_file:
+		load_instruments_file(instruments_file)
 	try:
-		asyncio.run(create_tasks())
+		if workers > 0:
+			asyncio.run(supervise(workers))
+		else:
+			asyncio.run(create_tasks())
 	except RuntimeError as e:
 		# Ignore loop closed before all tasks completed
 		if 'Event loop stopped before Future completed.' not in str(e):
@@ -0,0 +1,288 @@
+from multiprocessing import resource_tracker
+from multiprocessing.shared_memory import SharedMemory
+import asyncio
+import logging
+import os
+import struct
+import sys
+import time
+import numpy as np
+
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s [%(levelname)s] %(message)s',
+    handlers=[
+        logging.FileHandler("grid.log"),
+        logging.StreamHandler()
+    ]
+)
+
+# Шина рыночных данных в разделяемой памяти: один процесс фида пишет тики, процессы ботов читают.
+#
+# [header 32B][symbol table: max_symbols * 32B][ring: capacity * 56B]
+# header: magic, version, capacity, max_symbols, write_seq, n_symbols
+# record: seq, inst_id, flags, last, bid, ask, exchange ts (ms), local ts (ns)
+# flags & FLAG_BOOK - запись из стакана (book_channel фида): стратегии уходит (bid, ask), last - середина спреда
+#
+# Запись - seqlock на уровне записи: сначала seq = 0, затем поля, затем seq = номер записи,
+# и только потом растёт write_seq в заголовке. Читатель сверяет seq до и после чтения полей,
+# если писатель успел обогнать его на целый круг - запись считается потерянной (overrun).
+
+MAGIC = 0x4F4B5842  # "OKXB"
+VERSION = 1
+HEADER = struct.Struct('<IIIIQI4x')
+WRITE_SEQ_OFFSET = 16
+N_SYMBOLS_OFFSET = 24
+SYMBOL_SIZE = 32
+RECORD = struct.Struct('<QIIdddqq')
+FLAG_BOOK = 1
+SEQ = struct.Struct('<Q')
+RECORD_DTYPE = np.dtype([
+	('seq', '<u8'), ('inst', '<u4'), ('flags', '<u4'),
+	('last', '<f8'), ('bid', '<f8'), ('ask', '<f8'),
+	('exch_ts', '<i8'), ('local_ts', '<i8'),
+])
+
+
+class MarketDataBus:
+	def __init__(self, name: str, create: bool = False, capacity: int = 65536, max_symbols: int = 1024):
+		if create:
+			size = HEADER.size + max_symbols * SYMBOL_SIZE + capacity * RECORD.size
+			try:
+				self.shm = SharedMemory(name=name, create=True, size=size)
+				HEADER.pack_into(self.shm.buf, 0, MAGIC, VERSION, capacity, max_symbols, 0, 0)
+			except FileExistsError:
+				self.shm = self._reclaim(name, size, capacity, max_symbols)
+		else:
+			# Читатель не владеет сегментом: иначе resource_tracker удалит его при выходе процесса
+			if sys.version_info >= (3, 13):
+				self.shm = SharedMemory(name=name, track=False)
+			else:
+				self.shm = SharedMemory(name=name)
+				resource_tracker.unregister(self.shm._name, "shared_memory")
+		magic, version, self.capacity, self.max_symbols, _, _ = HEADER.unpack_from(self.shm.buf, 0)
+		if magic != MAGIC or version != VERSION:
+			raise ValueError(f"{name} is not a market data bus segment (magic {magic:#x}, version {version})")
+		self.name = name
+		self.owner = create
+		self.buf = self.shm.buf
+		self.symbols_offset = HEADER.size
+		self.ring_offset = HEADER.size + self.max_symbols * SYMBOL_SIZE
+		self._symbol_ids = {}
+
+	@staticmethod
+	def _reclaim(name: str, size: int, capacity: int, max_symbols: int) -> SharedMemory:
+		"""
+		Сегмент с этим именем остался от упавшего фида. Шина той же версии и разметки используется дальше:
+		write_seq и таблица символов сохраняются, подключённые читатели продолжают с места. Шина другой
+		версии или размера удаляется и создаётся заново, чужой сегмент (не шина) не трогаем.
+		"""
+		shm = SharedMemory(name=name)
+		magic, version, old_capacity, old_max_symbols, _, _ = HEADER.unpack_from(shm.buf, 0)
+		if magic != MAGIC:
+			shm.close()
+			if sys.version_info < (3, 13):
+				# Открытие зарегистрировало сегмент в resource_tracker - иначе он удалит чужой сегмент при выходе
+				resource_tracker.unregister(shm._name, "shared_memory")
+			raise FileExistsError(f"{name} exists and is not a market data bus segment (magic {magic:#x})")
+		if (version, old_capacity, old_max_symbols) == (VERSION, capacity, max_symbols):
+			logging.warning(f"❗️ Market data bus {name} left by a previous feed, reusing it")
+			return shm
+		logging.warning(f"❗️ Market data bus {name} left by a previous feed has another layout "
+						f"(version {version}, capacity {old_capacity}), recreating it")
+		shm.close()
+		shm.unlink()
+		shm = SharedMemory(name=name, create=True, size=size)
+		HEADER.pack_into(shm.buf, 0, MAGIC, VERSION, capacity, max_symbols, 0, 0)
+		return shm
+
+	@property
+	def write_seq(self) -> int:
+		return SEQ.unpack_from(self.buf, WRITE_SEQ_OFFSET)[0]
+
+	@property
+	def n_symbols(self) -> int:
+		return struct.unpack_from('<I', self.buf, N_SYMBOLS_OFFSET)[0]
+
+	def symbol_name(self, symbol_id: int) -> str:
+		offset = self.symbols_offset + symbol_id * SYMBOL_SIZE
+		return bytes(self.buf[offset:offset + SYMBOL_SIZE]).rstrip(b'\0').decode()
+
+	def symbol_id(self, inst_id: str) -> int:
+		"""Номер инструмента в таблице символов (None, если фид его не публикует)"""
+		if inst_id not in self._symbol_ids:
+			for i in range(self.n_symbols):
+				self._symbol_ids.setdefault(self.symbol_name(i), i)
+		return self._symbol_ids.get(inst_id)
+
+	def records(self) -> np.ndarray:
+		"""Zero-copy numpy представление всего кольца (для пакетной обработки)"""
+		return np.ndarray((self.capacity,), dtype=RECORD_DTYPE, buffer=self.buf, offset=self.ring_offset)
+
+	def close(self):
+		self.buf = None
+		self.shm.close()
+		if self.owner:
+			self.shm.unlink()
+
+
+class BusWriter(MarketDataBus):
+	"""Писатель шины: ровно один на сегмент (процесс фида)"""
+
+	def __init__(self, name: str, capacity: int = 65536, max_symbols: int = 1024):
+		super().__init__(name, create=True, capacity=capacity, max_symbols=max_symbols)
+		# Сегмент мог остаться от прошлого фида: продолжаем его нумерацию и таблицу символов
+		self._seq = self.write_seq
+		for i in range(self.n_symbols):
+			self._symbol_ids[self.symbol_name(i)] = i
+
+	def register_symbol(self, inst_id: str) -> int:
+		symbol_id = self._symbol_ids.get(inst_id)
+		if symbol_id is not None:
+			return symbol_id
+		symbol_id = self.n_symbols
+		if symbol_id >= self.max_symbols:
+			raise ValueError(f"Market data bus symbol table is full ({self.max_symbols})")
+		encoded = inst_id.encode()[:SYMBOL_SIZE]
+		offset = self.symbols_offset + symbol_id * SYMBOL_SIZE
+		self.buf[offset:offset + SYMBOL_SIZE] = encoded.ljust(SYMBOL_SIZE, b'\0')
+		struct.pack_into('<I', self.buf, N_SYMBOLS_OFFSET, symbol_id + 1)
+		self._symbol_ids[inst_id] = symbol_id
+		return symbol_id
+
+	def publish(self, symbol_id: int, last: float, bid: float, ask: float, exch_ts: int, flags: int = 0):
+		self._seq += 1
+		seq = self._seq
+		offset = self.ring_offset + (seq % self.capacity) * RECORD.size
+		SEQ.pack_into(self.buf, offset, 0)
+		RECORD.pack_into(self.buf, offset, 0, symbol_id, flags, last, bid, ask, exch_ts, time.time_ns())
+		SEQ.pack_into(self.buf, offset, seq)
+		SEQ.pack_into(self.buf, WRITE_SEQ_OFFSET, seq)
+
+
+class BusReader(MarketDataBus):
+	"""
+	Читатель шины. Начинает с текущей позиции писателя и отдаёт только новые записи.
+	overruns - сколько записей потеряно, потому что читатель отстал больше чем на capacity.
+	"""
+
+	def __init__(self, name: str):
+		super().__init__(name, create=False)
+		self.next_seq = self.write_seq + 1
+		self.overruns = 0
+		self._ring = self.records()
+		self._empty = np.empty(0, dtype=RECORD_DTYPE)
+
+	def read_array(self, max_records: int = 4096) -> np.ndarray:
+		"""
+		Новые записи структурным массивом RECORD_DTYPE. Срез кольца копируется одним memcpy по
+		zero-copy представлению records(), затем seq копии и seq в кольце сверяются с ожидаемыми
+		номерами векторно - запись, которую писатель успел перезаписать, отбрасывается (overrun).
+		"""
+		write_seq = self.write_seq
+		if write_seq < self.next_seq:
+			return self._empty
+		# Писатель обогнал на круг - пропускаем перезаписанное
+		if write_seq - self.next_seq >= self.capacity:
+			oldest = write_seq - self.capacity + 1
+			self.overruns += oldest - self.next_seq
+			self.next_seq = oldest
+
+		last_seq = min(write_seq, self.next_seq + max_records - 1)
+		count = last_seq - self.next_seq + 1
+		start = self.next_seq % self.capacity
+		end = start + count
+		if end <= self.capacity:
+			batch = self._ring[start:end].copy()
+			after = self._ring['seq'][start:end]
+		else:
+			# Срез переходит через конец кольца
+			batch = np.concatenate((self._ring[start:], self._ring[:end - self.capacity]))
+			after = np.concatenate((self._ring['seq'][start:], self._ring['seq'][:end - self.capacity]))
+		expected = np.arange(self.next_seq, last_seq + 1, dtype=np.uint64)
+		valid = (batch['seq'] == expected) & (after == expected)
+		self.next_seq = last_seq + 1
+		if not valid.all():
+			self.overruns += count - int(valid.sum())
+			batch = batch[valid]
+		return batch
+
+	def read(self, max_records: int = 4096) -> list:
+		"""Новые записи [(seq, inst, flags, last, bid, ask, exch_ts, local_ts), ...]"""
+		return self.read_array(max_records).tolist()
+
+
+async def bus_pump(reader: BusReader, mailboxes: dict, poll_interval: float = 0.001, max_poll_interval: float = 0.02):
+	"""
+	Перекладывает тики из шины в PriceMailbox сеток процесса: {instId: PriceMailbox}.
+	PriceMailbox всё равно хранит только последнюю цену, поэтому из пакета каждому инструменту
+	уходит одна, последняя запись - отбор векторный, Python работает только на инструмент, а не на тик.
+	Пока шина пуста, интервал опроса удваивается от poll_interval до max_poll_interval, новая запись сбрасывает его.
+	"""
+	by_symbol = {}  # symbol_id -> PriceMailbox (None - инструмент торгуется в другом процессе)
+	reported_overruns = 0
+	interval = poll_interval
+	while True:
+		batch = reader.read_array()
+		if not len(batch):
+			await asyncio.sleep(interval)
+			interval = min(interval * 2, max_poll_interval)
+			continue
+		interval = poll_interval
+		if len(batch) > 1:
+			# Индекс последней записи каждого инструмента: первое вхождение в развёрнутом массиве
+			symbols = batch['inst'][::-1]
+			_, first = np.unique(symbols, return_index=True)
+			batch = batch[len(batch) - 1 - first]
+		for symbol_id, flags, last, bid, ask in zip(batch['inst'].tolist(), batch['flags'].tolist(), batch['last'].tolist(),
+													 batch['bid'].tolist(), batch['ask'].tolist()):
+			if symbol_id not in by_symbol:
+				by_symbol[symbol_id] = mailboxes.get(reader.symbol_name(symbol_id))
+			mailbox = by_symbol[symbol_id]
+			if mailbox is not None:
+				mailbox.put((bid, ask) if flags & FLAG_BOOK else last)
+		if reader.overruns != reported_overruns:
+			logging.warning(f"❗️ Market data bus reader lost {reader.overruns - reported_overruns} ticks (overrun)")
+			reported_overruns = reader.overruns
+		await asyncio.sleep(0)
+
+
+async def run_feed_daemon(bus_name: str, inst_ids: list, capacity: int = 65536, ws_url: str = "wss://ws.okx.com:8443",
+						  book_channel: str = None, public_connections: int = 1):
+	"""
+	Процесс фида: один публичный WebSocketClient на весь хост, каждый тик декодируется один раз
+	и публикуется в шину для всех процессов ботов. book_channel - вести стакан вместо тикеров,
+	public_connections - резервные соединения фида (см. WebSocketClient).
+	"""
+	from ws_okx import WebSocketClient
+	from price_mailbox import PriceMailbox
+
+	writer = BusWriter(bus_name, capacity=capacity)
+	symbol_ids = {inst_id: writer.register_symbol(inst_id) for inst_id in inst_ids}
+
+	flags = FLAG_BOOK if book_channel else 0
+
+	def publish_tick(tick):
+		writer.publish(symbol_ids[tick.inst_id], tick.last, tick.bid, tick.ask, tick.ts, flags)
+
+	ws = WebSocketClient(api_key="", secret_key="", passphrase="", private=False, ws_url=ws_url, book_channel=book_channel,
+						 public_connections=public_connections)
+	for inst_id in inst_ids:
+		ws.add_instrument(inst_id, PriceMailbox(), None)
+	ws.tick_listeners.append(publish_tick)
+	logging.info(f"📡 Market data bus {bus_name} is publishing {inst_ids}")
+	try:
+		await ws.start()
+	finally:
+		writer.close()
+
+
+if __name__ == '__main__':
+	# python md_bus.py okx_md DEGEN-USDT-SWAP BTC-USDT-SWAP ...
+	# OKX_BOOK_CHANNEL=bbo-tbt - фид из стакана, OKX_PUBLIC_CONNECTIONS=2 - резервное соединение
+	try:
+		asyncio.run(run_feed_daemon(sys.argv[1], sys.argv[2:], ws_url=os.getenv("OKX_WS_URL", "wss://ws.okx.com:8443"),
+									book_channel=os.getenv("OKX_BOOK_CHANNEL") or None,
+									public_connections=int(os.getenv("OKX_PUBLIC_CONNECTIONS", "1"))))
+	except KeyboardInterrupt:
+		pass
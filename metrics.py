@@ -0,0 +1,35 @@
+from collections import deque
+
+
+class LatencyStats:
+	"""
+	Скользящая статистика задержек по последним `window` замерам.
+	Значения хранятся в секундах, summary() отдаёт миллисекунды.
+	"""
+
+	def __init__(self, window: int = 1000):
+		self.samples = deque(maxlen=window)
+		self.count = 0
+		self.max = 0.0
+
+	def add(self, seconds: float):
+		self.samples.append(seconds)
+		self.count += 1
+		if seconds > self.max:
+			self.max = seconds
+
+	def percentile(self, q: float) -> float:
+		if not self.samples:
+			return 0.0
+		ordered = sorted(self.samples)
+		index = min(len(ordered) - 1, int(q / 100 * len(ordered)))
+		return ordered[index]
+
+	def summary(self) -> dict:
+		return {
+			'count': self.count,
+			'p50_ms': round(self.percentile(50) * 1000, 3),
+			'p99_ms': round(self.percentile(99) * 1000, 3),
+			'p999_ms': round(self.percentile(99.9) * 1000, 3),
+			'max_ms': round(self.max * 1000, 3),
+		}
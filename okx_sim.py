@@ -0,0 +1,598 @@
+import argparse
+import asyncio
+import itertools
+import logging
+import random
+import time
+from aiohttp import web, WSMsgType
+from decode_okx import loads, dumps
+from orderbook import BOOK_CHANNELS, OrderBook
+
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s [%(levelname)s] %(message)s',
+    handlers=[
+        logging.FileHandler("grid.log"),
+        logging.StreamHandler()
+    ]
+)
+
+# Локальный симулятор OKX для бумажной торговли и нагрузочных тестов.
+# REST: /api/v5/public/instruments, /api/v5/market/candles, /api/v5/trade/order, /api/v5/trade/batch-orders,
+#       /api/v5/trade/cancel-batch-orders, /api/v5/trade/amend-batch-orders, /api/v5/trade/orders-pending,
+#       /api/v5/account/positions, /api/v5/trade/orders-history
+# WS:   /ws/v5/public (tickers, bbo-tbt, books5, books), /ws/v5/business (candle*), /ws/v5/private (login, orders, op ордеров)
+# Маркет ордера исполняются по текущей цене сценария: покупка по ask, продажа по bid, комиссия taker.
+# Лимитные ордера (limit, post_only) встают в стакан и исполняются по своей цене с комиссией maker, когда
+# last доходит до цены ордера; limit, пересекающий рынок, исполняется сразу как taker, post_only - снимается.
+# Стакан синтетический: bid = last, ask = last + tick_size, дальше уровни через tick_size с меняющимися размерами;
+# books присылает снимок при подписке, затем обновления с seqId/prevSeqId и checksum, как OKX.
+# Бот переключается на симулятор через OKX_REST_URL=http://127.0.0.1:8080 и OKX_WS_URL=ws://127.0.0.1:8080
+
+
+class PricePath:
+	"""
+	Сценарий цены: случайное блуждание с заданной волатильностью на тик (воспроизводимое по seed)
+	или повтор заранее записанного ряда цен по кругу.
+	mean_reversion > 0 тянет цену обратно к стартовой (боковик, в котором сетка торгует).
+	"""
+
+	def __init__(self, start: float, volatility: float = 0.001, seed: int = 0, replay: list = None, mean_reversion: float = 0.0):
+		self.start = start
+		self.price = start
+		self.volatility = volatility
+		self.mean_reversion = mean_reversion
+		self.random = random.Random(seed)
+		self.replay = itertools.cycle(replay) if replay else None
+
+	def next(self) -> float:
+		if self.replay is not None:
+			self.price = float(next(self.replay))
+		else:
+			self.price *= 1 + self.random.gauss(0, self.volatility)
+			self.price += self.mean_reversion * (self.start - self.price)
+		return self.price
+
+
+BOOKS_DEPTH = 50  # уровней на сторону в канале books (checksum считается по 25)
+
+
+class SimInstrument:
+	def __init__(self, inst_id: str, price: float, tick_size: float, lot_size: float = 1, ct_val: float = 1,
+				 min_size: float = 1, volatility: float = 0.001, seed: int = 0, replay: list = None, mean_reversion: float = 0.0):
+		self.inst_id = inst_id
+		self.tick_size = tick_size
+		self.lot_size = lot_size
+		self.ct_val = ct_val
+		self.min_size = min_size
+		self.decimals = max(0, len(f"{tick_size:.10f}".rstrip('0').split('.')[1]))
+		self.path = PricePath(price, volatility, seed, replay, mean_reversion)
+		self.last = self.round(price)
+		self.position = 0.0
+		self.resting = {}  # ordId -> лимитный ордер в стакане (поля push канала orders)
+		self.ticks = 0
+		self.book = None        # OrderBook для checksum канала books, ведётся, пока есть подписчики
+		self.book_levels = None  # {'bids': {px: sz}, 'asks': {px: sz}} - последнее, что ушло в books
+		self.candles = []  # закрытые свечи [ts_ms, o, h, l, c, vol], от старых к новым
+		self.bar = None    # текущая свеча
+
+	def round(self, price: float) -> float:
+		return round(round(price / self.tick_size) * self.tick_size, self.decimals)
+
+	@property
+	def bid(self) -> float:
+		return self.last
+
+	@property
+	def ask(self) -> float:
+		return self.round(self.last + self.tick_size)
+
+	def step(self) -> float:
+		self.last = max(self.tick_size, self.round(self.path.next()))
+		self.ticks += 1
+		return self.last
+
+	def levels(self, depth: int) -> dict:
+		"""Синтетический стакан {'bids': {px: sz}, 'asks': {px: sz}}: размер каждого уровня меняется раз в 5 тиков"""
+		book = {'bids': {}, 'asks': {}}
+		for side, start, sign in (('bids', self.bid, -1), ('asks', self.ask, 1)):
+			for i in range(depth):
+				px = self.round(start + sign * i * self.tick_size)
+				if px <= 0:
+					break
+				key = int(round(px / self.tick_size))
+				book[side][f"{px:.{self.decimals}f}"] = str(1 + (key * 7919 + (self.ticks + key % 5) // 5) % 50)
+		return book
+
+	def seed_history(self, bars: int, bar_ms: int, now_ms: int):
+		"""История свечей для REST candles: сценарий прокручивается назад от текущего момента"""
+		start = now_ms - now_ms % bar_ms - bars * bar_ms
+		for i in range(bars):
+			prices = [self.step() for _ in range(5)]
+			self.candles.append([start + i * bar_ms, prices[0], max(prices), min(prices), prices[-1], 100.0])
+
+	def on_tick(self, price: float, now_ms: int, bar_ms: int):
+		"""Обновляет текущую свечу, возвращает закрытую свечу, если бар сменился"""
+		bar_ts = now_ms - now_ms % bar_ms
+		closed = None
+		if self.bar is not None and self.bar[0] != bar_ts:
+			closed = self.bar
+			self.candles.append(closed)
+			del self.candles[:-1000]
+			self.bar = None
+		if self.bar is None:
+			self.bar = [bar_ts, price, price, price, price, 0.0]
+		self.bar[2] = max(self.bar[2], price)
+		self.bar[3] = min(self.bar[3], price)
+		self.bar[4] = price
+		self.bar[5] += 1.0
+		return closed
+
+
+def _candle_row(candle: list, confirm: str) -> list:
+	ts, o, h, l, c, vol = candle
+	return [str(ts), str(o), str(h), str(l), str(c), str(vol), str(vol), str(vol * c), confirm]
+
+
+class OkxSimulator:
+	def __init__(self, instruments: dict, tick_interval: float = 0.1, bar_seconds: int = 60, fee_rate: float = 0.0005,
+				 fill_delay: float = 0.0, history_bars: int = 300, host: str = "127.0.0.1", port: int = 8080, maker_fee_rate: float = 0.0002):
+		"""instruments: {instId: параметры SimInstrument (price, tick_size, lot_size, ct_val, min_size, volatility, seed, replay, mean_reversion)}"""
+		self.instruments = {inst_id: SimInstrument(inst_id, **params) for inst_id, params in instruments.items()}
+		self.tick_interval = tick_interval
+		self.bar_ms = int(bar_seconds * 1000)
+		self.fee_rate = fee_rate
+		self.maker_fee_rate = maker_fee_rate
+		self.fill_delay = fill_delay
+		self.host = host
+		self.port = port
+		self.ticker_subs = {inst_id: set() for inst_id in self.instruments}  # instId -> {ws}
+		self.candle_subs = {inst_id: {} for inst_id in self.instruments}   # instId -> {ws: channel}
+		self.book_subs = {inst_id: {} for inst_id in self.instruments}     # instId -> {ws: канал стакана}
+		self.order_subs = set()
+		self.orders_history = []
+		self.order_states = {}  # (instId, ordId или clOrdId) -> последний push ордера, для GET /trade/order
+		self._ord_id = itertools.count(int(time.time() * 1000) * 1000)
+		self.runner = None
+		self._ticker_task = None
+		self.ticks_sent = 0
+
+		now_ms = int(time.time() * 1000)
+		for inst in self.instruments.values():
+			inst.seed_history(history_bars, self.bar_ms, now_ms)
+
+		self.app = web.Application()
+		self.app.add_routes([
+			web.get('/api/v5/public/instruments', self.rest_instruments),
+			web.get('/api/v5/market/candles', self.rest_candles),
+			web.post('/api/v5/trade/order', self.rest_order),
+			web.get('/api/v5/trade/order', self.rest_order_details),
+			web.post('/api/v5/trade/batch-orders', self.rest_batch_orders),
+			web.post('/api/v5/trade/cancel-batch-orders', self.rest_cancel_batch_orders),
+			web.post('/api/v5/trade/amend-batch-orders', self.rest_amend_batch_orders),
+			web.get('/api/v5/trade/orders-pending', self.rest_orders_pending),
+			web.get('/api/v5/account/positions', self.rest_positions),
+			web.get('/api/v5/trade/orders-history', self.rest_orders_history),
+			web.get('/ws/v5/public', self.ws_public),
+			web.get('/ws/v5/business', self.ws_business),
+			web.get('/ws/v5/private', self.ws_private),
+		])
+
+	# === Market ===
+	async def ticker_loop(self):
+		# Тики выпускаются по расписанию: при малом tick_interval за один проход уходит несколько тиков,
+		# поэтому частота не упирается в разрешение asyncio.sleep
+		started = time.monotonic()
+		emitted = 0
+		while True:
+			due = int((time.monotonic() - started) / self.tick_interval) + 1 - emitted
+			for _ in range(due):
+				await self.emit_tick()
+			emitted += due
+			self.ticks_sent = emitted
+			await asyncio.sleep(self.tick_interval)
+
+	async def emit_tick(self):
+		now_ms = int(time.time() * 1000)
+		for inst_id, inst in self.instruments.items():
+			price = inst.step()
+			closed = inst.on_tick(price, now_ms, self.bar_ms)
+			if inst.resting:
+				self.match_resting(inst)
+			if self.ticker_subs[inst_id]:
+				msg = dumps({
+					"arg": {"channel": "tickers", "instId": inst_id},
+					"data": [{"instType": "SWAP", "instId": inst_id, "last": str(price), "lastSz": "1",
+							  "bidPx": str(inst.bid), "askPx": str(inst.ask), "ts": str(now_ms)}],
+				})
+				await self._broadcast(self.ticker_subs[inst_id], msg)
+			if self.book_subs[inst_id]:
+				await self.emit_book(inst, now_ms)
+			if closed is not None:
+				for ws, channel in list(self.candle_subs[inst_id].items()):
+					await self._send(ws, dumps({"arg": {"channel": channel, "instId": inst_id}, "data": [_candle_row(closed, "1")]}))
+
+	async def emit_book(self, inst: SimInstrument, now_ms: int):
+		"""bbo-tbt / books5 - снимок верха стакана на каждый тик, books - разница с прошлым push"""
+		messages = {}
+		for channel in set(self.book_subs[inst.inst_id].values()):
+			if channel == 'books':
+				messages[channel] = self._books_update(inst, now_ms)
+			else:
+				top = inst.levels(1 if channel == 'bbo-tbt' else 5)
+				messages[channel] = dumps({"arg": {"channel": channel, "instId": inst.inst_id}, "data": [{
+					"asks": [[px, sz, "0", "1"] for px, sz in top['asks'].items()],
+					"bids": [[px, sz, "0", "1"] for px, sz in top['bids'].items()],
+					"ts": str(now_ms), "seqId": inst.ticks}]})
+		for ws, channel in list(self.book_subs[inst.inst_id].items()):
+			if messages[channel] is not None:
+				await self._send(ws, messages[channel])
+
+	def _books_snapshot(self, inst: SimInstrument, now_ms: int) -> str:
+		if inst.book is None:
+			inst.book_levels = inst.levels(BOOKS_DEPTH)
+			inst.book = OrderBook()
+			inst.book.snapshot([[px, sz] for px, sz in inst.book_levels['bids'].items()],
+							   [[px, sz] for px, sz in inst.book_levels['asks'].items()], inst.ticks, now_ms)
+		return dumps({"arg": {"channel": "books", "instId": inst.inst_id}, "action": "snapshot", "data": [{
+			"asks": [[px, sz, "0", "1"] for px, sz in inst.book_levels['asks'].items()],
+			"bids": [[px, sz, "0", "1"] for px, sz in inst.book_levels['bids'].items()],
+			"ts": str(now_ms), "checksum": inst.book.checksum(), "prevSeqId": -1, "seqId": inst.book.seq_id}]})
+
+	def _books_update(self, inst: SimInstrument, now_ms: int):
+		if inst.book is None:
+			return None
+		levels = inst.levels(BOOKS_DEPTH)
+		changes = {}
+		for side in ('bids', 'asks'):
+			old, new = inst.book_levels[side], levels[side]
+			changes[side] = [[px, sz, "0", "1"] for px, sz in new.items() if old.get(px) != sz]
+			changes[side] += [[px, "0", "0", "0"] for px in old if px not in new]
+		inst.book_levels = levels
+		prev_seq_id = inst.book.seq_id
+		inst.book.update(changes['bids'], changes['asks'], prev_seq_id + 1, prev_seq_id, now_ms)
+		return dumps({"arg": {"channel": "books", "instId": inst.inst_id}, "action": "update", "data": [{
+			"asks": changes['asks'], "bids": changes['bids'], "ts": str(now_ms),
+			"checksum": inst.book.checksum(), "prevSeqId": prev_seq_id, "seqId": inst.book.seq_id}]})
+
+	async def _broadcast(self, subscribers: set, msg: str):
+		for ws in list(subscribers):
+			await self._send(ws, msg)
+
+	async def _send(self, ws, msg: str):
+		try:
+			await ws.send_str(msg)
+		except (ConnectionError, RuntimeError):
+			pass
+
+	# === Orders ===
+	def _reject(self, order: dict, code: str, msg: str) -> tuple:
+		return {"ordId": order.get('ordId', ""), "clOrdId": order.get('clOrdId', ""), "sCode": code, "sMsg": msg}, None
+
+	def _push(self, inst: SimInstrument, order: dict, state: str, fill_px: float = 0.0, fill_sz: float = 0.0, maker: bool = False) -> dict:
+		"""Обновляет ордер (накопленное исполнение, комиссия, позиция) и возвращает push канала orders"""
+		now_ms = str(int(time.time() * 1000))
+		if fill_sz:
+			acc = order['_acc'] + fill_sz
+			order['_avg'] = (order['_avg'] * order['_acc'] + fill_px * fill_sz) / acc
+			order['_acc'] = acc
+			notional = fill_px * fill_sz * inst.ct_val
+			order['_fee'] -= notional * (self.maker_fee_rate if maker else self.fee_rate)
+			order['_notional'] += notional
+			inst.position += fill_sz if order['side'] == 'buy' else -fill_sz
+		push = {
+			"instType": "SWAP", "instId": inst.inst_id, "ordId": order['ordId'], "clOrdId": order.get('clOrdId', ""),
+			"px": order.get('px', ""), "sz": str(order['_sz']), "ordType": order.get('ordType', "market"), "side": order['side'],
+			"posSide": "net", "tdMode": order.get('tdMode', "isolated"), "accFillSz": str(order['_acc']),
+			"fillPx": str(fill_px) if fill_sz else "", "fillSz": str(fill_sz) if fill_sz else "0",
+			"avgPx": str(order['_avg']) if order['_acc'] else "", "state": state, "fee": str(order['_fee']), "feeCcy": "USDT",
+			"notionalUsd": str(order['_notional']), "pnl": "0", "fillTime": now_ms if fill_sz else "",
+			"uTime": now_ms, "cTime": order['_ctime'], "reduceOnly": str(bool(order.get('reduceOnly'))).lower(),
+		}
+		self.order_states[(inst.inst_id, order['ordId'])] = push
+		if order.get('clOrdId'):
+			self.order_states[(inst.inst_id, order['clOrdId'])] = push
+		if state in ('filled', 'canceled'):
+			self.orders_history.append(push)
+			del self.orders_history[:-100]
+		return push
+
+	def execute(self, order: dict) -> tuple:
+		"""Исполняет маркет ордер целиком или ставит лимитный в стакан. Возвращает (элемент ответа, [push канала orders])"""
+		inst = self.instruments.get(order.get('instId'))
+		if inst is None:
+			return self._reject(order, "51001", "Instrument ID does not exist")
+		side = order.get('side')
+		try:
+			size = float(order.get('sz'))
+		except (TypeError, ValueError):
+			size = 0.0
+		if side not in ('buy', 'sell') or size < inst.min_size:
+			return self._reject(order, "51008", "Order size is invalid")
+		if side == 'sell' and order.get('reduceOnly') and inst.position < size - 1e-12:
+			return self._reject(order, "51169", "No position to reduce")
+		ord_type = order.get('ordType', "market")
+		if ord_type in ('limit', 'post_only'):
+			try:
+				px = float(order.get('px'))
+			except (TypeError, ValueError):
+				px = 0.0
+			if px <= 0:
+				return self._reject(order, "51006", "Order price is invalid")
+		elif ord_type != 'market':
+			return self._reject(order, "51000", f"Parameter ordType error: {ord_type}")
+
+		order = {**order, 'ordId': str(next(self._ord_id)), '_sz': size, '_acc': 0.0, '_avg': 0.0, '_fee': 0.0, '_notional': 0.0,
+				 '_ctime': str(int(time.time() * 1000))}
+		result = {"ordId": order['ordId'], "clOrdId": order.get('clOrdId', ""), "tag": "", "sCode": "0", "sMsg": ""}
+		if ord_type == 'market':
+			return result, [self._push(inst, order, "filled", inst.ask if side == 'buy' else inst.bid, size)]
+
+		crosses = px >= inst.ask if side == 'buy' else px <= inst.bid
+		if crosses and ord_type == 'post_only':
+			# Как на бирже: post-only, который взял бы ликвидность, снимается сразу после приёма
+			return result, [self._push(inst, order, "canceled")]
+		if crosses:
+			fill_px = inst.ask if side == 'buy' else inst.bid
+			return result, [self._push(inst, order, "filled", fill_px, size)]
+		inst.resting[order['ordId']] = order
+		return result, [self._push(inst, order, "live")]
+
+	def match_resting(self, inst: SimInstrument):
+		"""Исполняет ордера стакана, до цены которых дошёл last (по цене ордера, комиссия maker)"""
+		pushes = []
+		for ord_id, order in list(inst.resting.items()):
+			px = float(order['px'])
+			if (order['side'] == 'buy' and inst.last <= px) or (order['side'] == 'sell' and inst.last >= px):
+				if order['side'] == 'sell' and order.get('reduceOnly') and inst.position < order['_sz'] - 1e-12:
+					del inst.resting[ord_id]
+					pushes.append(self._push(inst, order, "canceled"))
+					continue
+				del inst.resting[ord_id]
+				pushes.append(self._push(inst, order, "filled", px, order['_sz'] - order['_acc'], maker=True))
+		if pushes:
+			asyncio.create_task(self._push_orders(pushes))
+
+	def _find_resting(self, request: dict):
+		inst = self.instruments.get(request.get('instId'))
+		if inst is None:
+			return None, None
+		ord_id = request.get('ordId')
+		if not ord_id and request.get('clOrdId'):
+			ord_id = next((i for i, o in inst.resting.items() if o.get('clOrdId') == request['clOrdId']), None)
+		return inst, inst.resting.get(ord_id)
+
+	def cancel(self, request: dict) -> tuple:
+		inst, order = self._find_resting(request)
+		if order is None:
+			return self._reject(request, "51400", "Cancellation failed as the order has been filled, canceled or does not exist")
+		del inst.resting[order['ordId']]
+		return {"ordId": order['ordId'], "clOrdId": order.get('clOrdId', ""), "sCode": "0", "sMsg": ""}, [self._push(inst, order, "canceled")]
+
+	def amend(self, request: dict) -> tuple:
+		inst, order = self._find_resting(request)
+		if order is None:
+			return self._reject(request, "51503", "Order modification failed as the order has been filled, canceled or does not exist")
+		if request.get('newSz'):
+			order['_sz'] = float(request['newSz'])
+			order['sz'] = request['newSz']
+		if request.get('newPx'):
+			order['px'] = request['newPx']
+		result = {"ordId": order['ordId'], "clOrdId": order.get('clOrdId', ""), "reqId": request.get('reqId', ""), "sCode": "0", "sMsg": ""}
+		px = float(order['px'])
+		if order.get('ordType') == 'post_only' and (px >= inst.ask if order['side'] == 'buy' else px <= inst.bid):
+			del inst.resting[order['ordId']]
+			return result, [self._push(inst, order, "canceled")]
+		return result, [self._push(inst, order, "live")]
+
+	def place(self, orders: list, handler=None) -> tuple:
+		"""Пакет ордеров через execute (или cancel / amend). Возвращает (code ответа, data)"""
+		handler = handler or self.execute
+		results, pushes = [], []
+		for order in orders:
+			result, order_pushes = handler(order)
+			results.append(result)
+			if order_pushes:
+				pushes += order_pushes
+		failed = sum(1 for r in results if r["sCode"] != "0")
+		code = "0" if not failed else ("1" if failed == len(results) else "2")
+		if pushes:
+			asyncio.create_task(self._push_orders(pushes))
+		return code, results
+
+	async def _push_orders(self, pushes: list):
+		if self.fill_delay:
+			await asyncio.sleep(self.fill_delay)
+		msg = dumps({"arg": {"channel": "orders", "instType": "SWAP", "uid": "sim"}, "data": pushes})
+		await self._broadcast(self.order_subs, msg)
+
+	# === REST ===
+	async def rest_instruments(self, request):
+		inst_id = request.query.get('instId')
+		data = [
+			{"instType": "SWAP", "instId": inst.inst_id, "lotSz": str(inst.lot_size), "ctVal": str(inst.ct_val),
+			 "minSz": str(inst.min_size), "tickSz": str(inst.tick_size), "settleCcy": "USDT", "state": "live"}
+			for inst in self.instruments.values() if inst_id in (None, inst.inst_id)
+		]
+		return web.json_response({"code": "0", "msg": "", "data": data}, dumps=dumps)
+
+	async def rest_candles(self, request):
+		inst = self.instruments.get(request.query.get('instId'))
+		if inst is None:
+			return web.json_response({"code": "51001", "msg": "Instrument ID does not exist", "data": []}, dumps=dumps)
+		limit = min(int(request.query.get('limit', 100)), 300)
+		# Новые свечи первыми, текущая - неподтверждённая
+		rows = [_candle_row(inst.bar, "0")] if inst.bar else []
+		rows += [_candle_row(c, "1") for c in reversed(inst.candles[-limit:])]
+		return web.json_response({"code": "0", "msg": "", "data": rows[:limit]}, dumps=dumps)
+
+	async def rest_order(self, request):
+		code, results = self.place([loads(await request.text())])
+		return web.json_response({"code": code, "msg": "", "data": results}, dumps=dumps)
+
+	async def rest_order_details(self, request):
+		inst_id = request.query.get('instId')
+		push = self.order_states.get((inst_id, request.query.get('ordId') or request.query.get('clOrdId')))
+		if push is None:
+			return web.json_response({"code": "51603", "msg": "Order does not exist", "data": []}, dumps=dumps)
+		return web.json_response({"code": "0", "msg": "", "data": [push]}, dumps=dumps)
+
+	async def rest_batch_orders(self, request):
+		code, results = self.place(loads(await request.text()))
+		return web.json_response({"code": code, "msg": "", "data": results}, dumps=dumps)
+
+	async def rest_cancel_batch_orders(self, request):
+		code, results = self.place(loads(await request.text()), self.cancel)
+		return web.json_response({"code": code, "msg": "", "data": results}, dumps=dumps)
+
+	async def rest_amend_batch_orders(self, request):
+		code, results = self.place(loads(await request.text()), self.amend)
+		return web.json_response({"code": code, "msg": "", "data": results}, dumps=dumps)
+
+	async def rest_orders_pending(self, request):
+		inst_id = request.query.get('instId')
+		data = [{k: v for k, v in order.items() if not k.startswith('_')}
+				for inst in self.instruments.values() if inst_id in (None, inst.inst_id) for order in inst.resting.values()]
+		return web.json_response({"code": "0", "msg": "", "data": data}, dumps=dumps)
+
+	async def rest_positions(self, request):
+		inst_id = request.query.get('instId')
+		data = [
+			{"instType": "SWAP", "instId": inst.inst_id, "pos": str(inst.position), "posSide": "net", "last": str(inst.last)}
+			for inst in self.instruments.values() if inst.position and inst_id in (None, inst.inst_id)
+		]
+		return web.json_response({"code": "0", "msg": "", "data": data}, dumps=dumps)
+
+	async def rest_orders_history(self, request):
+		inst_id = request.query.get('instId')
+		limit = int(request.query.get('limit', 100))
+		data = [o for o in reversed(self.orders_history) if inst_id in (None, o["instId"])][:limit]
+		return web.json_response({"code": "0", "msg": "", "data": data}, dumps=dumps)
+
+	# === WebSocket ===
+	async def _ws_loop(self, request, handle):
+		ws = web.WebSocketResponse()
+		await ws.prepare(request)
+		try:
+			async for msg in ws:
+				if msg.type != WSMsgType.TEXT:
+					continue
+				if msg.data == 'ping':
+					await ws.send_str('pong')
+					continue
+				await handle(ws, loads(msg.data))
+		finally:
+			for subs in self.ticker_subs.values():
+				subs.discard(ws)
+			for subs in self.candle_subs.values():
+				subs.pop(ws, None)
+			for subs in self.book_subs.values():
+				subs.pop(ws, None)
+			self.order_subs.discard(ws)
+		return ws
+
+	async def ws_public(self, request):
+		async def handle(ws, data):
+			op = data.get("op")
+			if op == "unsubscribe":
+				for arg in data.get("args", []):
+					self.ticker_subs.get(arg.get("instId"), set()).discard(ws)
+					self.book_subs.get(arg.get("instId"), {}).pop(ws, None)
+					await ws.send_str(dumps({"event": "unsubscribe", "arg": arg, "connId": "sim"}))
+				return
+			if op != "subscribe":
+				return
+			for arg in data.get("args", []):
+				channel, inst_id = arg.get("channel"), arg.get("instId")
+				if channel == "tickers" and inst_id in self.ticker_subs:
+					self.ticker_subs[inst_id].add(ws)
+					await ws.send_str(dumps({"event": "subscribe", "arg": arg, "connId": "sim"}))
+				elif channel in BOOK_CHANNELS and inst_id in self.book_subs:
+					self.book_subs[inst_id][ws] = channel
+					await ws.send_str(dumps({"event": "subscribe", "arg": arg, "connId": "sim"}))
+					if channel == "books":
+						await ws.send_str(self._books_snapshot(self.instruments[inst_id], int(time.time() * 1000)))
+				else:
+					await ws.send_str(dumps({"event": "error", "code": "60018", "msg": f"Wrong URL or channel: {arg}", "connId": "sim"}))
+		return await self._ws_loop(request, handle)
+
+	async def ws_business(self, request):
+		async def handle(ws, data):
+			if data.get("op") != "subscribe":
+				return
+			for arg in data.get("args", []):
+				if arg.get("channel", "").startswith("candle") and arg.get("instId") in self.candle_subs:
+					self.candle_subs[arg["instId"]][ws] = arg["channel"]
+					await ws.send_str(dumps({"event": "subscribe", "arg": arg, "connId": "sim"}))
+		return await self._ws_loop(request, handle)
+
+	async def ws_private(self, request):
+		state = {'logged_in': False}
+
+		async def handle(ws, data):
+			op = data.get("op")
+			if op == "login":
+				state['logged_in'] = True
+				await ws.send_str(dumps({"event": "login", "code": "0", "msg": "", "connId": "sim"}))
+			elif not state['logged_in']:
+				await ws.send_str(dumps({"event": "error", "code": "60011", "msg": "Please log in", "connId": "sim"}))
+			elif op == "subscribe":
+				for arg in data.get("args", []):
+					if arg.get("channel") == "orders":
+						self.order_subs.add(ws)
+					await ws.send_str(dumps({"event": "subscribe", "arg": arg, "connId": "sim"}))
+			elif op in ("order", "batch-orders", "cancel-order", "batch-cancel-orders", "amend-order", "batch-amend-orders"):
+				in_time = str(int(time.time() * 1_000_000))
+				handler = self.cancel if "cancel" in op else self.amend if "amend" in op else self.execute
+				code, results = self.place(data.get("args", []), handler)
+				await ws.send_str(dumps({"id": data.get("id"), "op": op, "code": code, "msg": "", "data": results,
+										 "inTime": in_time, "outTime": str(int(time.time() * 1_000_000))}))
+		return await self._ws_loop(request, handle)
+
+	# === Lifecycle ===
+	async def start(self):
+		self.runner = web.AppRunner(self.app, access_log=None)
+		await self.runner.setup()
+		await web.TCPSite(self.runner, self.host, self.port).start()
+		self._ticker_task = asyncio.create_task(self.ticker_loop())
+		logging.info(f"🧪 OKX simulator on http://{self.host}:{self.port} for {list(self.instruments)}")
+
+	async def stop(self):
+		if self._ticker_task:
+			self._ticker_task.cancel()
+		if self.runner:
+			await self.runner.cleanup()
+
+
+async def serve(simulator: OkxSimulator):
+	await simulator.start()
+	try:
+		await asyncio.Event().wait()
+	finally:
+		await simulator.stop()
+
+
+if __name__ == '__main__':
+	parser = argparse.ArgumentParser(description="Local OKX REST + WebSocket simulator")
+	parser.add_argument("--port", type=int, default=8080)
+	parser.add_argument("--tick-interval", type=float, default=0.1)
+	parser.add_argument("--bar-seconds", type=int, default=60)
+	parser.add_argument("--volatility", type=float, default=0.001)
+	parser.add_argument("--replay", help="файл с ценами (по одной в строке), повторяется по кругу")
+	parser.add_argument("instruments", nargs="*", default=["DEGEN-USDT-SWAP:0.0043:0.000001"],
+						help="instId:start_price:tick_size")
+	args = parser.parse_args()
+
+	replay = None
+	if args.replay:
+		with open(args.replay) as f:
+			replay = [float(line) for line in f if line.strip()]
+	instruments = {}
+	for i, spec in enumerate(args.instruments):
+		inst_id, price, tick_size = spec.split(":")
+		instruments[inst_id] = {"price": float(price), "tick_size": float(tick_size), "volatility": args.volatility,
+								"seed": i, "replay": replay}
+	try:
+		asyncio.run(serve(OkxSimulator(instruments, tick_interval=args.tick_interval, bar_seconds=args.bar_seconds, port=args.port)))
+	except KeyboardInterrupt:
+		pass
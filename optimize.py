@@ -0,0 +1,178 @@
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing.shared_memory import SharedMemory
+import argparse
+import itertools
+import json
+import math
+import os
+import sys
+import time
+import numpy as np
+from backtest import TickSeries, run_grid, load_recording, load_candles_csv
+
+
+# Перебор параметров сетки (grid_step, profit_target, quantity, sma_length) на истории через backtest.run_grid()
+# в пуле процессов.
+#
+# Тики каждого инструмента кладутся один раз в shared memory (ts и цены подряд, float64), воркеры подключаются
+# к сегментам в initializer и строят TickSeries поверх них без копирования массивов - своя у воркера только
+# пирамида FirstPassage (~3% от размера цен) и кэш свечей/SMA.
+#
+# Отсев (successive halving): все комбинации сначала считаются на первой четверти истории, на следующий
+# отрезок (половина, затем вся история) проходит лучшая доля keep, убыточные на отрезке отбрасываются сразу.
+# Итог - таблица по каждому инструменту и JSON в формате instruments из main.py.
+
+RUNGS = (0.25, 0.5, 1.0)
+PARAMS = ("grid_step", "profit_target", "quantity", "sma_length")
+
+_segments = {}  # в воркере: instId -> SharedMemory
+_series = {}  # в воркере: (instId, длина префикса) -> TickSeries
+
+
+def share_ticks(ts, prices) -> SharedMemory:
+	"""Копирует тики в новый сегмент shared memory: [ts * n][prices * n]"""
+	n = len(prices)
+	shm = SharedMemory(create=True, size=max(16 * n, 1))
+	view = np.ndarray((2, n), dtype=np.float64, buffer=shm.buf)
+	view[0] = ts
+	view[1] = prices
+	return shm
+
+
+def _attach(segments: dict):
+	"""initializer воркера: segments - instId -> (имя сегмента, количество тиков)"""
+	for inst_id, (name, n) in segments.items():
+		# Сегмент удаляет родитель (unlink). resource_tracker у пула общий с родителем и хранит имена множеством,
+		# поэтому повторная регистрация при подключении ничего не меняет
+		if sys.version_info >= (3, 13):
+			_segments[inst_id] = (SharedMemory(name=name, track=False), n)
+		else:
+			_segments[inst_id] = (SharedMemory(name=name), n)
+
+
+def _get_series(inst_id: str, end: int) -> TickSeries:
+	key = (inst_id, end)
+	if key not in _series:
+		shm, n = _segments[inst_id]
+		view = np.ndarray((2, n), dtype=np.float64, buffer=shm.buf)
+		_series[key] = TickSeries(view[0, :end], view[1, :end])
+	return _series[key]
+
+
+def _evaluate(inst_id: str, end: int, combos: list, fixed: dict) -> list:
+	series = _get_series(inst_id, end)
+	return [(combo, run_grid(series, **dict(zip(PARAMS, combo)), **fixed)) for combo in combos]
+
+
+def param_grid(grid_steps, profit_targets, quantities, sma_lengths) -> list:
+	"""Все комбинации (grid_step, profit_target, quantity, sma_length)"""
+	return list(itertools.product(grid_steps, profit_targets, quantities, sma_lengths))
+
+
+def score(result: dict) -> float:
+	"""Итог по рынку: реализованный PnL минус комиссии плюс переоценка открытых уровней"""
+	return result['net_pnl'] + result['unrealized_pnl']
+
+
+def optimize(histories: dict, combos: list, fixed: dict, workers: int = None, keep: float = 0.5, top: int = 10) -> dict:
+	"""
+	histories - instId -> (ts, prices), fixed - instId -> параметры инструмента для run_grid()
+	(tick_size, lot_size, ct_val, min_size, balance, bar_seconds, fee_rate).
+	Возвращает instId -> [(params, result), ...] по убыванию score на всей истории.
+	"""
+	workers = workers or os.cpu_count()
+	shared = {inst_id: share_ticks(ts, prices) for inst_id, (ts, prices) in histories.items()}
+	try:
+		segments = {inst_id: (shm.name, len(histories[inst_id][1])) for inst_id, shm in shared.items()}
+		alive = {inst_id: list(combos) for inst_id in histories}
+		results = {}
+		with ProcessPoolExecutor(max_workers=workers, initializer=_attach, initargs=(segments,)) as pool:
+			for rung, fraction in enumerate(RUNGS):
+				started = time.perf_counter()
+				futures = []
+				for inst_id, candidates in alive.items():
+					end = max(1, int(len(histories[inst_id][1]) * fraction))
+					# Несколько пачек на воркер, чтобы быстрые комбинации не ждали медленных
+					chunk = max(1, math.ceil(len(candidates) / (workers * 4)))
+					for i in range(0, len(candidates), chunk):
+						futures.append((inst_id, pool.submit(_evaluate, inst_id, end, candidates[i:i + chunk], fixed[inst_id])))
+				results = {inst_id: [] for inst_id in alive}
+				for inst_id, future in futures:
+					results[inst_id].extend(future.result())
+				for inst_id in results:
+					results[inst_id].sort(key=lambda item: score(item[1]), reverse=True)
+				evaluated = sum(len(r) for r in results.values())
+				print(f"rung {rung + 1}/{len(RUNGS)}: {fraction:.0%} of history, {evaluated} runs in {time.perf_counter() - started:.1f}s")
+				if rung == len(RUNGS) - 1:
+					break
+				for inst_id, ranked in results.items():
+					best = ranked[:max(top, math.ceil(len(ranked) * keep))]
+					profitable = [combo for combo, result in best if score(result) >= 0]
+					alive[inst_id] = profitable if len(profitable) >= top else [combo for combo, _ in best[:top]]
+	finally:
+		for shm in shared.values():
+			shm.close()
+			shm.unlink()
+	return {inst_id: [(dict(zip(PARAMS, combo)), result) for combo, result in ranked] for inst_id, ranked in results.items()}
+
+
+def print_table(inst_id: str, ranked: list, top: int = 10):
+	print(f"\n{inst_id}")
+	print(f"{'#':>3} {'grid_step':>9} {'profit':>8} {'qty':>5} {'sma':>4} {'score':>12} {'net_pnl':>12} {'unreal':>10} {'fees':>10} {'sells':>7} {'resets':>6} {'max_inv_usdt':>12}")
+	for i, (params, r) in enumerate(ranked[:top], 1):
+		print(f"{i:>3} {params['grid_step']:>9g} {params['profit_target']:>8g} {params['quantity']:>5} {params['sma_length']:>4} "
+			  f"{score(r):>12.4f} {r['net_pnl']:>12.4f} {r['unrealized_pnl']:>10.4f} {r['fees']:>10.4f} {r['sells']:>7} {r['resets']:>6} {r['max_inventory_usdt']:>12.2f}")
+
+
+def best_settings(ranked: dict) -> dict:
+	"""Лучшие параметры каждого инструмента в формате instruments из main.py"""
+	return {inst_id: rows[0][0] for inst_id, rows in ranked.items() if rows}
+
+
+def span(text: str) -> list:
+	"""'0.001:0.005:5' -> 5 значений от 0.001 до 0.005, '0.002,0.003' -> список"""
+	if ':' in text:
+		start, stop, num = text.split(':')
+		return [round(float(v), 10) for v in np.linspace(float(start), float(stop), int(num))]
+	return [float(v) for v in text.split(',')]
+
+
+if __name__ == '__main__':
+	parser = argparse.ArgumentParser(description="Parallel grid parameter sweep over recorded history")
+	source = parser.add_mutually_exclusive_group(required=True)
+	source.add_argument("--record-dir", help="каталог записи recorder.py, инструменты - через --inst")
+	source.add_argument("--candles", nargs="+", metavar="INST=CSV", help="CSV свечей ts,open,high,low,close для каждого инструмента")
+	parser.add_argument("--inst", nargs="+", default=[])
+	parser.add_argument("--grid-steps", type=span, default=span("0.001:0.006:11"))
+	parser.add_argument("--profit-targets", type=span, default=span("0.001:0.008:15"))
+	parser.add_argument("--quantities", type=lambda t: [int(v) for v in span(t)], default=[25, 50, 100, 200])
+	parser.add_argument("--sma-lengths", type=lambda t: [int(v) for v in span(t)], default=[7, 14, 28])
+	parser.add_argument("--bar-seconds", type=float, default=60)
+	parser.add_argument("--balance", type=float, default=50)
+	parser.add_argument("--tick-size", type=float, default=0.000001)
+	parser.add_argument("--lot-size", type=float, default=1)
+	parser.add_argument("--ct-val", type=float, default=1)
+	parser.add_argument("--min-size", type=float, default=1)
+	parser.add_argument("--fee-rate", type=float, default=0.0005)
+	parser.add_argument("--workers", type=int, default=None)
+	parser.add_argument("--keep", type=float, default=0.5, help="доля лучших комбинаций, проходящих на следующий отрезок истории")
+	parser.add_argument("--top", type=int, default=10)
+	parser.add_argument("--out", help="JSON с лучшими параметрами для instruments_file в main.py")
+	args = parser.parse_args()
+
+	if args.record_dir:
+		histories = {inst_id: load_recording(args.record_dir, inst_id) for inst_id in args.inst}
+	else:
+		histories = dict((inst_id, load_candles_csv(path)) for inst_id, path in (item.split('=', 1) for item in args.candles))
+	instrument = {"bar_seconds": args.bar_seconds, "balance": args.balance, "tick_size": args.tick_size, "lot_size": args.lot_size,
+				  "ct_val": args.ct_val, "min_size": args.min_size, "fee_rate": args.fee_rate}
+	combos = param_grid(args.grid_steps, args.profit_targets, args.quantities, args.sma_lengths)
+	print(f"{len(combos)} combinations x {len(histories)} instruments")
+
+	ranked = optimize(histories, combos, {inst_id: instrument for inst_id in histories}, workers=args.workers, keep=args.keep, top=args.top)
+	for inst_id, rows in ranked.items():
+		print_table(inst_id, rows, args.top)
+	if args.out:
+		with open(args.out, "w") as f:
+			json.dump(best_settings(ranked), f, indent=1)
+		print(f"\nSaved {args.out}")
@@ -0,0 +1,123 @@
+from bisect import bisect_left
+import zlib
+
+# Каналы стакана OKX, которые умеет вести OrderBook:
+# bbo-tbt - лучший bid/ask на каждое изменение (снимок из 1 уровня), books5 - снимок 5 уровней,
+# books - 400 уровней: снимок при подписке, дальше инкрементальные обновления с seqId/prevSeqId и checksum
+BOOK_CHANNELS = ('bbo-tbt', 'books5', 'books')
+CHECKSUM_DEPTH = 25
+
+
+class BookDesync(Exception):
+	"""Локальный стакан разошёлся с биржей (пропуск seqId или неверный checksum) - нужен новый снимок"""
+
+
+class OrderBook:
+	"""
+	Локальный L2 стакан одного инструмента.
+
+	Каждая сторона - пара параллельных массивов, отсортированных от лучшей цены к худшей:
+	ключи для bisect (цена для asks, минус цена для bids) и исходные строки [px, sz].
+	Строки храним как пришли: OKX считает CRC32 по ним, а float -> str не всегда даёт тот же текст.
+	Лучший уровень стороны - всегда элемент 0, поэтому top() стоит O(1), обновление уровня - O(log n).
+	"""
+
+	__slots__ = ('_keys', '_levels', 'seq_id', 'ts', 'synced', 'updates', 'resyncs')
+
+	def __init__(self):
+		self._keys = {'bids': [], 'asks': []}
+		self._levels = {'bids': [], 'asks': []}
+		self.seq_id = None
+		self.ts = 0
+		self.synced = False
+		self.updates = 0   # сколько push применено
+		self.resyncs = 0   # сколько раз стакан пришлось перезапрашивать
+
+	def snapshot(self, bids: list, asks: list, seq_id: int = None, ts: int = 0):
+		"""Полностью заменяет стакан (снимок books или каждый push bbo-tbt / books5)"""
+		for side, levels, sign in (('bids', bids, -1.0), ('asks', asks, 1.0)):
+			rows = sorted(((sign * float(level[0]), level[0], level[1]) for level in levels if float(level[1])))
+			self._keys[side] = [key for key, _, _ in rows]
+			self._levels[side] = [[px, sz] for _, px, sz in rows]
+		self.seq_id = seq_id
+		self.ts = ts
+		self.synced = True
+		self.updates += 1
+
+	def update(self, bids: list, asks: list, seq_id: int, prev_seq_id: int, ts: int = 0):
+		"""
+		Инкрементальное обновление канала books: sz "0" удаляет уровень, иначе уровень ставится или заменяется.
+		prevSeqId должен совпасть с seqId предыдущего push, иначе BookDesync.
+		"""
+		if prev_seq_id != self.seq_id:
+			self.synced = False
+			raise BookDesync(f"seqId gap: expected prevSeqId {self.seq_id}, got {prev_seq_id}")
+		for side, levels, sign in (('bids', bids, -1.0), ('asks', asks, 1.0)):
+			keys, rows = self._keys[side], self._levels[side]
+			for level in levels:
+				px, sz = level[0], level[1]
+				key = sign * float(px)
+				i = bisect_left(keys, key)
+				found = i < len(keys) and keys[i] == key
+				if not float(sz):
+					if found:
+						del keys[i]
+						del rows[i]
+				elif found:
+					rows[i] = [px, sz]
+				else:
+					keys.insert(i, key)
+					rows.insert(i, [px, sz])
+		self.seq_id = seq_id
+		self.ts = ts
+		self.updates += 1
+
+	def checksum(self) -> int:
+		"""CRC32 по 25 лучшим уровням в формате OKX: bidPx:bidSz:askPx:askSz:..., как знаковое 32-битное число"""
+		bids = self._levels['bids'][:CHECKSUM_DEPTH]
+		asks = self._levels['asks'][:CHECKSUM_DEPTH]
+		parts = []
+		for i in range(max(len(bids), len(asks))):
+			if i < len(bids):
+				parts += bids[i]
+			if i < len(asks):
+				parts += asks[i]
+		crc = zlib.crc32(':'.join(parts).encode())
+		return crc - (1 << 32) if crc >= 1 << 31 else crc
+
+	def verify(self, checksum: int):
+		if self.checksum() != checksum:
+			self.synced = False
+			raise BookDesync(f"checksum mismatch at seqId {self.seq_id}")
+
+	def reset(self):
+		"""Стакан больше не актуален: до нового снимка обновления игнорируются"""
+		for side in ('bids', 'asks'):
+			self._keys[side].clear()
+			self._levels[side].clear()
+		self.seq_id = None
+		self.synced = False
+
+	@property
+	def best_bid(self) -> float:
+		keys = self._keys['bids']
+		return -keys[0] if keys else 0.0
+
+	@property
+	def best_ask(self) -> float:
+		keys = self._keys['asks']
+		return keys[0] if keys else 0.0
+
+	def top(self):
+		"""(bid, ask) или None, если одна из сторон пуста"""
+		bids, asks = self._keys['bids'], self._keys['asks']
+		if not bids or not asks:
+			return None
+		return -bids[0], asks[0]
+
+	def depth(self, side: str, levels: int = 5) -> list:
+		"""[(price, size), ...] лучших уровней стороны 'bids' или 'asks'"""
+		return [(float(px), float(sz)) for px, sz in self._levels[side][:levels]]
+
+	def __len__(self):
+		return len(self._keys['bids']) + len(self._keys['asks'])
@@ -0,0 +1,202 @@
+from collections import OrderedDict
+from enum import IntEnum
+import itertools
+import time
+
+
+class OrderStatus(IntEnum):
+	LIVE = 0
+	PARTIALLY_FILLED = 1
+	FILLED = 2
+	CANCELED = 3
+
+	@classmethod
+	def from_okx(cls, state: str) -> 'OrderStatus':
+		"""state из канала orders OKX -> OrderStatus"""
+		return _OKX_STATES.get(state, cls.LIVE)
+
+
+_OKX_STATES = {
+	'live': OrderStatus.LIVE,
+	'partially_filled': OrderStatus.PARTIALLY_FILLED,
+	'filled': OrderStatus.FILLED,
+	'canceled': OrderStatus.CANCELED,
+	'mmp_canceled': OrderStatus.CANCELED,
+}
+
+
+class OrderRecord:
+	"""Маркет ордер стратегии. Время - unix timestamp (float), статус - OrderStatus"""
+	__slots__ = ('ord_id', 'side', 'level', 'entry_price', 'close_price', 'size', 'filled_price',
+				 'usdt_size', 'fee', 'status', 'created_ts', 'filled_ts', 'group_with_id')
+
+	def __init__(self, ord_id: str, side: str, level: int, entry_price: float, close_price: float, size: float,
+				 filled_price: float, group_with_id: str = None, status: OrderStatus = OrderStatus.FILLED):
+		now = time.time()
+		self.ord_id = ord_id
+		self.side = side
+		self.level = level
+		self.entry_price = entry_price
+		self.close_price = close_price
+		self.size = size
+		self.filled_price = filled_price
+		self.usdt_size = None
+		self.fee = None
+		self.status = status
+		self.created_ts = now
+		self.filled_ts = now if status == OrderStatus.FILLED else None
+		self.group_with_id = group_with_id
+
+	def __repr__(self):
+		return f"OrderRecord({self.ord_id} {self.side} level={self.level} {self.size}@{self.filled_price} {self.status.name})"
+
+
+class OrderStore:
+	"""
+	Ордера стратегии одного инструмента.
+	hot - ордера открытых уровней (ordId -> OrderRecord), by_level - уровень -> ordId покупки с открытой позицией.
+	Закрытые круги (покупка + продажа) и ордера сброшенной сетки переезжают в archive,
+	ограниченный archive_size записями, поэтому память и стоимость проверок не растут со временем работы.
+	"""
+
+	def __init__(self, archive_size: int = 1000):
+		self.hot = {}
+		self.by_level = {}
+		self.archive = OrderedDict()
+		self.archive_size = archive_size
+		self.round_trips = 0
+
+	def add(self, record: OrderRecord):
+		self.hot[record.ord_id] = record
+		if record.side == 'buy':
+			self.by_level[record.level] = record.ord_id
+
+	def get(self, ord_id: str) -> OrderRecord:
+		"""Ищет ордер среди активных, затем в архиве (поздние события исполнения)"""
+		record = self.hot.get(ord_id)
+		if record is None:
+			record = self.archive.get(ord_id)
+		return record
+
+	def level_buy(self, level: int) -> OrderRecord:
+		ord_id = self.by_level.get(level)
+		return self.hot.get(ord_id) if ord_id is not None else None
+
+	def close_level(self, level: int, sell_id: str):
+		"""Продажа закрыла уровень: покупка и продажа уходят в архив"""
+		buy_id = self.by_level.pop(level, None)
+		for ord_id in (buy_id, sell_id):
+			record = self.hot.pop(ord_id, None)
+			if record is not None:
+				self._to_archive(record)
+		self.round_trips += 1
+
+	def clear(self):
+		"""Сброс сетки: все активные ордера уходят в архив"""
+		for record in self.hot.values():
+			self._to_archive(record)
+		self.hot.clear()
+		self.by_level.clear()
+
+	def _to_archive(self, record: OrderRecord):
+		self.archive[record.ord_id] = record
+		if len(self.archive) > self.archive_size:
+			self.archive.popitem(last=False)
+
+	@property
+	def open_positions(self) -> int:
+		"""Сколько уровней держат позицию (куплены и ещё не проданы)"""
+		return len(self.by_level)
+
+	def __contains__(self, ord_id: str) -> bool:
+		return ord_id in self.hot
+
+	def __getitem__(self, ord_id: str) -> OrderRecord:
+		return self.hot[ord_id]
+
+	def __len__(self) -> int:
+		return len(self.hot)
+
+	def __bool__(self) -> bool:
+		return bool(self.hot)
+
+	def values(self):
+		return self.hot.values()
+
+
+class RestingOrder:
+	"""
+	Лимитный ордер уровня сетки в стакане биржи. Ключ - clOrdId, ordId приходит в ответе или в push.
+	post_only=False - уровень уже пересечён ценой, ордер исполняется сразу по цене уровня или лучше.
+	canceled=True - биржа подтвердила снятие, запись ждёт итоговый push с исполненным объёмом.
+	"""
+	__slots__ = ('cl_ord_id', 'ord_id', 'side', 'level', 'price', 'size', 'post_only', 'filled', 'canceled', 'placed_ts')
+
+	def __init__(self, cl_ord_id: str, side: str, level: int, price: float, size: float, post_only: bool = True):
+		self.cl_ord_id = cl_ord_id
+		self.ord_id = None
+		self.side = side
+		self.level = level
+		self.price = price
+		self.size = size
+		self.post_only = post_only
+		self.filled = 0.0
+		self.canceled = False
+		self.placed_ts = time.time()
+
+	def __repr__(self):
+		return f"RestingOrder({self.cl_ord_id} {self.side} level={self.level} {self.size}@{self.price} filled={self.filled})"
+
+
+class RestingOrders:
+	"""
+	Ордера, стоящие в стакане в режиме order_mode='limit': clOrdId -> RestingOrder и (side, level) -> clOrdId.
+	clOrdId вида gb12n<seq> / gs12n<seq> (сторона, уровень, номер) - по префиксу находятся
+	ордера бота, оставшиеся на бирже после рестарта.
+	"""
+	PREFIXES = ('gb', 'gs')
+
+	def __init__(self):
+		self.by_id = {}
+		self.by_level = {}
+		self._seq = itertools.count(int(time.time() * 1000))
+
+	def new(self, side: str, level: int, price: float, size: float, post_only: bool = True) -> RestingOrder:
+		order = RestingOrder(f"g{side[0]}{level}n{next(self._seq)}", side, level, price, size, post_only)
+		self.by_id[order.cl_ord_id] = order
+		self.by_level[(side, level)] = order.cl_ord_id
+		return order
+
+	def get(self, cl_ord_id: str) -> RestingOrder:
+		return self.by_id.get(cl_ord_id) if cl_ord_id else None
+
+	def at(self, side: str, level: int) -> RestingOrder:
+		cl_ord_id = self.by_level.get((side, level))
+		return self.by_id.get(cl_ord_id) if cl_ord_id is not None else None
+
+	def remove(self, cl_ord_id: str) -> RestingOrder:
+		order = self.by_id.pop(cl_ord_id, None)
+		if order is not None and self.by_level.get((order.side, order.level)) == cl_ord_id:
+			del self.by_level[(order.side, order.level)]
+		return order
+
+	def detach(self, cl_ord_id: str) -> RestingOrder:
+		"""Снятый ордер освобождает уровень, но остаётся по clOrdId до своего push canceled"""
+		order = self.by_id.get(cl_ord_id)
+		if order is not None:
+			order.canceled = True
+			if self.by_level.get((order.side, order.level)) == cl_ord_id:
+				del self.by_level[(order.side, order.level)]
+		return order
+
+	def clear(self) -> list:
+		orders = list(self.by_id.values())
+		self.by_id.clear()
+		self.by_level.clear()
+		return orders
+
+	def __len__(self) -> int:
+		return len(self.by_id)
+
+	def values(self):
+		return self.by_id.values()
@@ -0,0 +1,69 @@
+import asyncio
+import time
+
+
+class PriceMailbox:
+	"""
+	Однослотовый канал "последнее значение" между фидом и стратегией.
+
+	put() перезаписывает значение на месте и будит потребителя, get() всегда
+	отдаёт самую свежую цену. Если стратегия занята (например, ждёт ответ на ордер),
+	промежуточные тики не копятся, а схлопываются - память фиксирована при любых всплесках.
+	"""
+
+	def __init__(self):
+		self._value = None
+		self._put_time = 0.0
+		self._has_value = False
+		self._event = asyncio.Event()
+
+		# Счётчики
+		self.published = 0   # сколько тиков положил фид
+		self.delivered = 0   # сколько тиков забрала стратегия
+		self.conflated = 0   # сколько тиков перезаписано до того, как их забрали
+		self.last_age = 0.0  # возраст последней отданной цены, сек
+		self.max_age = 0.0   # максимальный возраст отданной цены, сек
+
+	def put(self, value):
+		"""Кладёт новое значение, перезаписывая непрочитанное (не блокирует)"""
+		if self._has_value:
+			self.conflated += 1
+		self._value = value
+		self._put_time = time.monotonic()
+		self._has_value = True
+		self.published += 1
+		self._event.set()
+
+	def get_nowait(self):
+		if not self._has_value:
+			raise asyncio.QueueEmpty
+		return self._take()
+
+	async def get(self):
+		"""Ждёт новое значение и возвращает самое свежее"""
+		while not self._has_value:
+			self._event.clear()
+			await self._event.wait()
+		return self._take()
+
+	def _take(self):
+		self._has_value = False
+		self._event.clear()
+		age = time.monotonic() - self._put_time
+		self.last_age = age
+		if age > self.max_age:
+			self.max_age = age
+		self.delivered += 1
+		return self._value
+
+	def empty(self) -> bool:
+		return not self._has_value
+
+	def stats(self) -> dict:
+		return {
+			'published': self.published,
+			'delivered': self.delivered,
+			'conflated': self.conflated,
+			'last_age_ms': round(self.last_age * 1000, 3),
+			'max_age_ms': round(self.max_age * 1000, 3),
+		}
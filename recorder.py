@@ -0,0 +1,197 @@
+import json
+import logging
+import mmap
+import os
+import struct
+import time
+import numpy as np
+from orders import OrderStatus
+
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s [%(levelname)s] %(message)s',
+    handlers=[
+        logging.FileHandler("grid.log"),
+        logging.StreamHandler()
+    ]
+)
+
+# Запись фида в бинарные сегменты фиксированного размера через mmap.
+#
+# Каталог записи:
+#   symbols.json                    - instId -> номер символа
+#   seg-<start_ns>.bin              - сегмент: заголовок 64 байта + записи по 48 байт
+#
+# Запись (RECORD / RECORD_DTYPE):
+#   ts        - локальное время получения, ns
+#   ord_id    - ordId для событий ордеров, 0 для тиков
+#   price     - last для тика, avgPx для ордера
+#   exch_dt   - время биржи минус локальное, ms
+#   size      - lastSz для тика, accFillSz для ордера
+#   a, b      - bid - last и ask - last для тика, fee и notionalUsd для ордера
+#   symbol    - номер инструмента из symbols.json
+#   kind      - KIND_TICK / KIND_ORDER
+#   flag      - для ордера: сторона (1 buy, 2 sell) | OrderStatus << 2
+#
+# Запись тика - один struct.pack_into в отображённую память и обновление счётчика в заголовке,
+# без системных вызовов на горячем пути. Индекс по времени двухуровневый: время начала сегмента
+# в имени файла, внутри сегмента записи упорядочены по ts и ищутся через searchsorted.
+
+MAGIC = 0x54434B52  # "RKCT"
+VERSION = 1
+HEADER = struct.Struct('<IIIIqq32x')  # magic, version, record_size, reserved, start_ns, count
+COUNT_OFFSET = 24
+RECORD = struct.Struct('<qQdifffHBB4x')
+RECORD_DTYPE = np.dtype([
+	('ts', '<i8'), ('ord_id', '<u8'), ('price', '<f8'), ('exch_dt', '<i4'),
+	('size', '<f4'), ('a', '<f4'), ('b', '<f4'), ('symbol', '<u2'), ('kind', 'u1'), ('flag', 'u1'), ('_pad', 'V4'),
+])
+KIND_TICK = 0
+KIND_ORDER = 1
+SIDES = {'buy': 1, 'sell': 2}
+
+
+class TickRecorder:
+	"""
+	Пишет тики и события ордеров. Подключается к WebSocketClient:
+	ws.tick_listeners.append(recorder.tick), ws.order_listeners.append(recorder.order)
+	"""
+
+	def __init__(self, root: str, segment_records: int = 1_000_000):
+		self.root = root
+		self.segment_records = segment_records
+		os.makedirs(root, exist_ok=True)
+		self._symbols_path = os.path.join(root, "symbols.json")
+		self.symbols = {}
+		if os.path.exists(self._symbols_path):
+			with open(self._symbols_path) as f:
+				self.symbols = json.load(f)
+		self._file = None
+		self._mm = None
+		self._count = 0
+		self.recorded = 0
+		self._open_segment()
+
+	def _symbol(self, inst_id: str) -> int:
+		symbol = self.symbols.get(inst_id)
+		if symbol is None:
+			symbol = self.symbols[inst_id] = len(self.symbols)
+			with open(self._symbols_path, "w") as f:
+				json.dump(self.symbols, f)
+		return symbol
+
+	def _open_segment(self):
+		start_ns = time.time_ns()
+		path = os.path.join(self.root, f"seg-{start_ns}.bin")
+		size = HEADER.size + self.segment_records * RECORD.size
+		self._file = open(path, "w+b")
+		self._file.truncate(size)
+		self._mm = mmap.mmap(self._file.fileno(), size)
+		HEADER.pack_into(self._mm, 0, MAGIC, VERSION, RECORD.size, 0, start_ns, 0)
+		self._count = 0
+
+	def _close_segment(self):
+		if self._mm is None:
+			return
+		self._mm.flush()
+		self._mm.close()
+		# Отрезаем неиспользованный хвост предвыделенного файла
+		self._file.truncate(HEADER.size + self._count * RECORD.size)
+		self._file.close()
+		self._mm = None
+
+	def _append(self, ts: int, ord_id: int, price: float, exch_dt: int, size: float, a: float, b: float, symbol: int, kind: int, flag: int):
+		if self._count == self.segment_records:
+			self._close_segment()
+			self._open_segment()
+		RECORD.pack_into(self._mm, HEADER.size + self._count * RECORD.size, ts, ord_id, price, exch_dt, size, a, b, symbol, kind, flag)
+		self._count += 1
+		struct.pack_into('<q', self._mm, COUNT_OFFSET, self._count)
+		self.recorded += 1
+
+	def tick(self, tick):
+		"""Ticker из decode_okx"""
+		ts = time.time_ns()
+		self._append(ts, 0, tick.last, tick.ts - ts // 1_000_000 if tick.ts else 0, tick.size,
+					 tick.bid - tick.last if tick.bid else 0.0, tick.ask - tick.last if tick.ask else 0.0,
+					 self._symbol(tick.inst_id), KIND_TICK, 0)
+
+	def order(self, update):
+		"""OrderUpdate из decode_okx"""
+		ts = time.time_ns()
+		ord_id = int(update.ord_id) if update.ord_id and update.ord_id.isdigit() else 0
+		flag = SIDES.get(update.side, 0) | OrderStatus.from_okx(update.state) << 2
+		self._append(ts, ord_id, update.avg_px, update.u_time - ts // 1_000_000 if update.u_time else 0, update.acc_fill_sz,
+					 update.fee, update.notional_usd, self._symbol(update.inst_id), KIND_ORDER, flag)
+
+	def close(self):
+		self._close_segment()
+		logging.info(f"✅ Recorder closed ({self.recorded} records)")
+
+
+class TickReader:
+	"""Чтение записи как массивов NumPy без копирования сегментов (mmap)"""
+
+	def __init__(self, root: str):
+		self.root = root
+		with open(os.path.join(root, "symbols.json")) as f:
+			self.symbols = json.load(f)
+
+	def segments(self) -> list:
+		"""[(start_ns, path), ...] по возрастанию времени"""
+		out = []
+		for name in os.listdir(self.root):
+			if name.startswith("seg-") and name.endswith(".bin"):
+				out.append((int(name[4:-4]), os.path.join(self.root, name)))
+		return sorted(out)
+
+	def _segment_records(self, path: str) -> np.ndarray:
+		header = np.memmap(path, dtype=np.uint8, mode='r', shape=(HEADER.size,))
+		magic, version, record_size, _, _, count = HEADER.unpack(header.tobytes())
+		if magic != MAGIC or record_size != RECORD.size:
+			raise ValueError(f"{path} is not a tick recorder segment")
+		if count == 0:
+			return np.empty(0, dtype=RECORD_DTYPE)
+		return np.memmap(path, dtype=RECORD_DTYPE, mode='r', offset=HEADER.size, shape=(count,))
+
+	def stream(self, start_ns: int = None, end_ns: int = None):
+		"""Отдаёт по сегментам zero-copy срезы записей с start_ns <= ts < end_ns"""
+		segments = self.segments()
+		for i, (seg_start, path) in enumerate(segments):
+			seg_end = segments[i + 1][0] if i + 1 < len(segments) else None
+			if end_ns is not None and seg_start >= end_ns:
+				break
+			if start_ns is not None and seg_end is not None and seg_end <= start_ns:
+				continue
+			records = self._segment_records(path)
+			lo = np.searchsorted(records['ts'], start_ns) if start_ns is not None else 0
+			hi = np.searchsorted(records['ts'], end_ns) if end_ns is not None else len(records)
+			if hi > lo:
+				yield records[lo:hi]
+
+	def read(self, start_ns: int = None, end_ns: int = None, inst_id: str = None, kind: int = None) -> np.ndarray:
+		"""Все записи диапазона одним массивом (копия), с фильтром по инструменту и типу записи"""
+		parts = list(self.stream(start_ns, end_ns))
+		records = np.concatenate(parts) if parts else np.empty(0, dtype=RECORD_DTYPE)
+		mask = np.ones(len(records), dtype=bool)
+		if inst_id is not None:
+			mask &= records['symbol'] == self.symbols[inst_id]
+		if kind is not None:
+			mask &= records['kind'] == kind
+		return records[mask]
+
+	def ticks(self, inst_id: str, start_ns: int = None, end_ns: int = None) -> dict:
+		"""Тики инструмента как отдельные массивы: ts, exch_ts, price, size, bid, ask"""
+		records = self.read(start_ns, end_ns, inst_id, KIND_TICK)
+		price = records['price']
+		return {
+			'ts': records['ts'],
+			'exch_ts': records['ts'] // 1_000_000 + records['exch_dt'],
+			'price': price,
+			'size': records['size'].astype(np.float64),
+			'bid': price + records['a'],
+			'ask': price + records['b'],
+		}
+
+	def orders(self, inst_id: str = None, start_ns: int = None, end_ns: int = None) -> np.ndarray:
+		return self.read(start_ns, end_ns, inst_id, KIND_ORDER)
@@ -0,0 +1,116 @@
+from datetime import datetime, timezone
+from urllib.parse import urlencode
+from rest_scheduler import RequestScheduler
+import base64
+import hashlib
+import hmac
+import json
+import logging
+import httpx
+
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s [%(levelname)s] %(message)s',
+    handlers=[
+        logging.FileHandler("grid.log"),
+        logging.StreamHandler()
+    ]
+)
+
+class OkxRestClient:
+	"""
+	Асинхронный REST клиент OKX v5.
+
+	Один httpx.AsyncClient с HTTP/2 держит постоянный пул соединений, поэтому
+	запросы не блокируют event loop и могут идти параллельно (мультиплексирование
+	по одному соединению). Ответы возвращаются в том же виде, что и у okx SDK:
+	{"code": "0", "msg": "", "data": [...]}.
+
+	Все запросы идут через RequestScheduler: лимиты OKX соблюдаются ожиданием в очереди,
+	ордера отправляются раньше чтения, одинаковые GET в полёте объединяются.
+	"""
+
+	def __init__(self, api_key: str = "", secret_key: str = "", passphrase: str = "", flag: str = '0',
+				 base_url: str = "https://www.okx.com", timeout: float = 10.0, scheduler: RequestScheduler = None):
+		self.api_key = api_key
+		self.secret_key = secret_key
+		self.passphrase = passphrase
+		self.flag = flag  # '0' - реальная торговля, '1' - демо
+		self.scheduler = scheduler or RequestScheduler()
+		self.client = httpx.AsyncClient(
+			base_url=base_url,
+			http2=True,
+			timeout=timeout,
+			limits=httpx.Limits(max_connections=10, max_keepalive_connections=10),
+			headers={"Content-Type": "application/json"},
+		)
+
+	def _sign(self, timestamp: str, method: str, request_path: str, body: str) -> str:
+		message = timestamp + method + request_path + body
+		mac = hmac.new(self.secret_key.encode(), message.encode(), hashlib.sha256)
+		return base64.b64encode(mac.digest()).decode()
+
+	def _auth_headers(self, method: str, request_path: str, body: str) -> dict:
+		timestamp = datetime.now(timezone.utc).isoformat(timespec='milliseconds').replace('+00:00', 'Z')
+		return {
+			"OK-ACCESS-KEY": self.api_key,
+			"OK-ACCESS-SIGN": self._sign(timestamp, method, request_path, body),
+			"OK-ACCESS-TIMESTAMP": timestamp,
+			"OK-ACCESS-PASSPHRASE": self.passphrase,
+		}
+
+	async def request(self, method: str, path: str, params: dict = None, body=None, auth: bool = False) -> dict:
+		request_path = path
+		if params:
+			request_path += '?' + urlencode({k: v for k, v in params.items() if v is not None})
+		body_str = json.dumps(body) if body is not None else ""
+
+		async def send() -> dict:
+			headers = {}
+			if self.flag == '1':
+				headers["x-simulated-trading"] = "1"
+			if auth:
+				# Подписываем в момент отправки: запрос мог ждать токены в очереди
+				headers.update(self._auth_headers(method, request_path, body_str))
+			response = await self.client.request(method, request_path, content=body_str or None, headers=headers)
+			return response.json()
+
+		coalesce_key = f"{auth}:{request_path}" if method == "GET" else None
+		return await self.scheduler.run(path, send, params=params, body=body, coalesce_key=coalesce_key, method=method)
+
+	# === Market / Public data ===
+	async def get_candles(self, instId: str, bar: str = "1m", limit: str = "100") -> dict:
+		return await self.request("GET", "/api/v5/market/candles", params={"instId": instId, "bar": bar, "limit": limit})
+
+	async def get_instruments(self, instType: str, instId: str = None) -> dict:
+		return await self.request("GET", "/api/v5/public/instruments", params={"instType": instType, "instId": instId})
+
+	# === Account ===
+	async def get_positions(self, instType: str = None, instId: str = None) -> dict:
+		return await self.request("GET", "/api/v5/account/positions", params={"instType": instType, "instId": instId}, auth=True)
+
+	# === Trade ===
+	async def place_order(self, **order) -> dict:
+		return await self.request("POST", "/api/v5/trade/order", body=order, auth=True)
+
+	async def place_batch_orders(self, orders: list) -> dict:
+		return await self.request("POST", "/api/v5/trade/batch-orders", body=orders, auth=True)
+
+	async def cancel_batch_orders(self, orders: list) -> dict:
+		return await self.request("POST", "/api/v5/trade/cancel-batch-orders", body=orders, auth=True)
+
+	async def amend_batch_orders(self, orders: list) -> dict:
+		return await self.request("POST", "/api/v5/trade/amend-batch-orders", body=orders, auth=True)
+
+	async def get_order(self, instId: str, ordId: str = None, clOrdId: str = None) -> dict:
+		return await self.request("GET", "/api/v5/trade/order", params={"instId": instId, "ordId": ordId, "clOrdId": clOrdId}, auth=True)
+
+	async def get_orders_pending(self, instType: str, instId: str = None) -> dict:
+		return await self.request("GET", "/api/v5/trade/orders-pending", params={"instType": instType, "instId": instId}, auth=True)
+
+	async def get_orders_history(self, instType: str, instId: str = None, limit: str = "100") -> dict:
+		return await self.request("GET", "/api/v5/trade/orders-history", params={"instType": instType, "instId": instId, "limit": limit}, auth=True)
+
+	async def close(self):
+		await self.client.aclose()
+		logging.info("✅ REST client closed")
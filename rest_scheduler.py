@@ -0,0 +1,237 @@
+from metrics import LatencyStats
+import asyncio
+import itertools
+import logging
+import time
+
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s [%(levelname)s] %(message)s',
+    handlers=[
+        logging.FileHandler("grid.log"),
+        logging.StreamHandler()
+    ]
+)
+
+# Приоритеты очереди: меньше - раньше. Ордера всегда обгоняют чтение счёта и рыночных данных
+PRIORITY_ORDER = 0
+PRIORITY_ACCOUNT = 1
+PRIORITY_MARKET = 2
+PRIORITY_NAMES = {PRIORITY_ORDER: 'order', PRIORITY_ACCOUNT: 'account', PRIORITY_MARKET: 'market'}
+
+# Лимиты OKX v5 из документации: path (или "METHOD path", если у методов endpoint разные лимиты) ->
+# (лимит, период в секундах, область, приоритет, считать по ордерам).
+# Область: 'instrument' - User ID + Instrument ID, 'inst_type' - IP + instType, 'user' / 'ip' - один клиент на пользователя и IP.
+# Пакетные ордера считаются по количеству ордеров в пакете, а не по запросам.
+OKX_RATE_LIMITS = {
+	"/api/v5/trade/order": (60, 2, 'instrument', PRIORITY_ORDER, False),
+	# Статус ордера по clOrdId - выяснение судьбы ордера после таймаута, поэтому приоритет ордеров
+	"GET /api/v5/trade/order": (60, 2, 'instrument', PRIORITY_ORDER, False),
+	"/api/v5/trade/batch-orders": (300, 2, 'instrument', PRIORITY_ORDER, True),
+	"/api/v5/trade/cancel-batch-orders": (300, 2, 'instrument', PRIORITY_ORDER, True),
+	"/api/v5/trade/amend-batch-orders": (300, 2, 'instrument', PRIORITY_ORDER, True),
+	"/api/v5/trade/orders-pending": (60, 2, 'user', PRIORITY_ACCOUNT, False),
+	"/api/v5/trade/orders-history": (40, 2, 'user', PRIORITY_ACCOUNT, False),
+	"/api/v5/account/positions": (10, 2, 'user', PRIORITY_ACCOUNT, False),
+	"/api/v5/market/candles": (40, 2, 'ip', PRIORITY_MARKET, False),
+	"/api/v5/public/instruments": (20, 2, 'inst_type', PRIORITY_MARKET, False),
+}
+# Общий лимит субаккаунта на новые и изменённые ордера (по всем инструментам)
+OKX_ORDER_LIMIT = (1000, 2)
+ORDER_LIMIT_PATHS = ("/api/v5/trade/order", "/api/v5/trade/batch-orders", "/api/v5/trade/amend-batch-orders")
+RATE_LIMITED_CODE = "50011"
+
+
+class TokenBucket:
+	"""Корзина токенов: capacity - допустимый всплеск, rate - пополнение в секунду"""
+	__slots__ = ('capacity', 'rate', 'tokens', 'updated')
+
+	def __init__(self, capacity: float, rate: float):
+		self.capacity = capacity
+		self.rate = rate
+		self.tokens = capacity
+		self.updated = time.monotonic()
+
+	def _refill(self, now: float):
+		if now > self.updated:
+			self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+			self.updated = now
+
+	def wait_time(self, cost: float, now: float) -> float:
+		"""Через сколько секунд наберётся cost токенов (0 - уже есть)"""
+		self._refill(now)
+		missing = min(cost, self.capacity) - self.tokens
+		return missing / self.rate if missing > 0 else 0.0
+
+	def take(self, cost: float, now: float):
+		self._refill(now)
+		self.tokens -= min(cost, self.capacity)
+
+	def drain(self, now: float):
+		"""Биржа всё равно ответила 50011 - считаем корзину пустой"""
+		self._refill(now)
+		self.tokens = min(self.tokens, 0.0)
+
+
+class RequestScheduler:
+	"""
+	Планировщик всех REST запросов процесса к OKX.
+
+	Каждый запрос перед отправкой берёт токены из корзин своих лимитов (endpoint и область, для ордеров -
+	ещё общий лимит субаккаунта). Если токенов нет, запрос ждёт в очереди (backpressure) вместо ответа 50011.
+	Очередь разбирается по приоритету: ордера, затем чтение счёта, затем рыночные данные; запрос не обгоняет
+	более приоритетный, который ждёт ту же корзину. Одинаковые GET запросы, уже находящиеся в полёте,
+	не отправляются повторно - все ждут один ответ (его нельзя менять на месте).
+
+	burst - доля лимита, доступная всплеском: корзина ёмкостью burst * limit пополняется так, что за любое окно
+	period уходит не больше limit запросов.
+	"""
+
+	def __init__(self, limits: dict = None, order_limit: tuple = OKX_ORDER_LIMIT, burst: float = 0.5, max_retries: int = 3):
+		self.limits = OKX_RATE_LIMITS if limits is None else limits
+		self.order_limit = order_limit
+		self.burst = burst
+		self.max_retries = max_retries
+		self.buckets = {}
+		self._waiting = []  # [(priority, seq, costs, future, enqueued_at), ...]
+		self._seq = itertools.count()
+		self._timer = None
+		self._inflight = {}  # ключ GET запроса -> Task
+		self.metrics = {
+			name: {'queued': 0, 'max_queued': 0, 'sent': 0, 'coalesced': 0, 'rate_limited': 0, 'wait': LatencyStats()}
+			for name in PRIORITY_NAMES.values()
+		}
+
+	def _bucket(self, key: tuple, limit: int, period: float) -> TokenBucket:
+		bucket = self.buckets.get(key)
+		if bucket is None:
+			capacity = max(1.0, limit * self.burst)
+			bucket = self.buckets[key] = TokenBucket(capacity, max(limit - capacity, 1.0) / period)
+		return bucket
+
+	def costs(self, path: str, params: dict = None, body=None, method: str = None):
+		"""(приоритет, {ключ корзины: стоимость}) запроса по таблице лимитов"""
+		if method and f"{method} {path}" in self.limits:
+			path = f"{method} {path}"
+		rule = self.limits.get(path)
+		if rule is None:
+			return PRIORITY_MARKET, {}
+		limit, period, scope, priority, per_order = rule
+		items = body if isinstance(body, list) else [body or params or {}]
+		costs = {}
+		if scope == 'instrument':
+			for item in items:
+				key = (path, item.get('instId'))
+				costs[key] = costs.get(key, 0) + 1
+		elif scope == 'inst_type':
+			costs[(path, (params or {}).get('instType'))] = 1
+		else:
+			costs[(path,)] = len(items) if per_order else 1
+		for key in costs:
+			self._bucket(key, limit, period)
+		if path in ORDER_LIMIT_PATHS and self.order_limit:
+			key = ('orders',)
+			self._bucket(key, *self.order_limit)
+			costs[key] = len(items)
+		return priority, costs
+
+	async def acquire(self, priority: int, costs: dict):
+		"""Ждёт, пока во всех корзинах запроса наберутся токены, и забирает их"""
+		stats = self.metrics[PRIORITY_NAMES[priority]]
+		now = time.monotonic()
+		if not self._waiting and all(self.buckets[key].wait_time(cost, now) <= 0 for key, cost in costs.items()):
+			# Очереди нет и токены есть - без future и переключения задач
+			for key, cost in costs.items():
+				self.buckets[key].take(cost, now)
+			stats['wait'].add(0.0)
+			return
+		future = asyncio.get_running_loop().create_future()
+		self._waiting.append((priority, next(self._seq), costs, future, now))
+		stats['queued'] += 1
+		stats['max_queued'] = max(stats['max_queued'], stats['queued'])
+		self._pump()
+		try:
+			await future
+		finally:
+			stats['queued'] -= 1
+			if future.cancelled():
+				self._pump()
+		stats['wait'].add(time.monotonic() - now)
+
+	def _pump(self):
+		"""Отпускает из очереди все запросы, для которых есть токены, и заводит таймер до следующего"""
+		if self._timer is not None:
+			self._timer.cancel()
+			self._timer = None
+		now = time.monotonic()
+		blocked = set()
+		waiting = []
+		next_at = None
+		for entry in sorted(self._waiting, key=lambda e: (e[0], e[1])):
+			priority, _, costs, future, _ = entry
+			if future.done():
+				continue
+			if blocked.intersection(costs):
+				# Ту же корзину ждёт более приоритетный запрос
+				waiting.append(entry)
+				continue
+			wait = max((self.buckets[key].wait_time(cost, now) for key, cost in costs.items()), default=0.0)
+			if wait <= 0:
+				for key, cost in costs.items():
+					self.buckets[key].take(cost, now)
+				future.set_result(None)
+			else:
+				blocked.update(costs)
+				waiting.append(entry)
+				next_at = wait if next_at is None else min(next_at, wait)
+		self._waiting = waiting
+		if next_at is not None:
+			self._timer = asyncio.get_running_loop().call_later(next_at, self._pump)
+
+	async def admit(self, path: str, params: dict = None, body=None):
+		"""Токены для запроса, который уходит мимо REST: ордера через приватный WS OKX считает в тех же лимитах"""
+		priority, costs = self.costs(path, params, body)
+		await self.acquire(priority, costs)
+		self.metrics[PRIORITY_NAMES[priority]]['sent'] += 1
+
+	async def run(self, path: str, send, params: dict = None, body=None, coalesce_key: str = None, method: str = None) -> dict:
+		"""
+		Выполняет send() (корутина, отправляющая запрос и возвращающая ответ OKX) с учётом лимитов path.
+		coalesce_key - для GET: одинаковые запросы в полёте получают один ответ.
+		"""
+		if coalesce_key is None:
+			return await self._run(path, send, params, body, method)
+		task = self._inflight.get(coalesce_key)
+		if task is not None:
+			priority, _ = self.costs(path, params, body, method)
+			self.metrics[PRIORITY_NAMES[priority]]['coalesced'] += 1
+		else:
+			task = asyncio.ensure_future(self._run(path, send, params, body, method))
+			self._inflight[coalesce_key] = task
+			task.add_done_callback(lambda _: self._inflight.pop(coalesce_key, None))
+		# shield: отмена одного из ожидающих не отменяет общий запрос
+		return await asyncio.shield(task)
+
+	async def _run(self, path: str, send, params: dict, body, method: str = None) -> dict:
+		priority, costs = self.costs(path, params, body, method)
+		stats = self.metrics[PRIORITY_NAMES[priority]]
+		for attempt in range(self.max_retries + 1):
+			await self.acquire(priority, costs)
+			stats['sent'] += 1
+			response = await send()
+			if not isinstance(response, dict) or response.get('code') != RATE_LIMITED_CODE or attempt == self.max_retries:
+				return response
+			# Лимит оказался меньше модели (например, тот же ключ используют с другого хоста) - ждём пополнения и повторяем
+			stats['rate_limited'] += 1
+			logging.warning(f"❗️ {path} rate limited by OKX, retrying after bucket refill")
+			now = time.monotonic()
+			for key in costs:
+				self.buckets[key].drain(now)
+		return response
+
+	def stats(self) -> dict:
+		"""Глубина очереди, ожидание токенов и счётчики по приоритетам"""
+		return {
+			name: {**{k: v for k, v in m.items() if k != 'wait'}, 'wait': m['wait'].summary()}
+			for name, m in self.metrics.items()
+		}
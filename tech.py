@@ -1,6 +1,8 @@
-from okx.api import Market
-from okx.api import Public
 import asyncio
+from rest_okx import OkxRestClient
+import numpy as np
+from indicators import SMA
+from grid_builder import step_decimals
 
 import logging
 
@@ -13,37 +15,48 @@ logging.basicConfig(
     ]
 )
 
+# Map numeric timeframes to OKX string format
+tf_map = {
+	1: "1m",
+	3: "3m",
+	5: "5m",
+	15: "15m",
+	30: "30m",
+	60: "1H",
+	120: "2H",
+	240: "4H",
+	24: '1D'
+}
+
+def okx_bar(timeframe) -> str:
+	"""Convert numeric timeframe to OKX bar string if needed"""
+	if isinstance(timeframe, int):
+		if timeframe not in tf_map:
+			raise ValueError(f"Invalid timeframe value: {timeframe}. Allowed: {list(tf_map.keys())}")
+		return tf_map[timeframe]
+	return timeframe
+
 class TechAnalysis:
-	def __init__(self, instrument_id: str, lookback: int, timeframe):
-		# Map numeric timeframes to OKX string format
-		tf_map = {
-			1: "1m",
-			3: "3m",
-			5: "5m",
-			15: "15m",
-			30: "30m",
-			60: "1H",
-			120: "2H",
-			240: "4H",
-			24: '1D'
-		}
+	def __init__(self, instrument_id: str, lookback: int, timeframe, rest: OkxRestClient = None):
 		self.instrument_id = instrument_id
-		self.marketDataAPI = Market(flag='0')	
-		self.publicDataAPI = Public(flag='0')
+		# Публичные методы не требуют ключей, клиент можно разделить с Trading
+		self.rest = rest or OkxRestClient(flag='0')
 		self.lookback = lookback  
 		self.midpoint_05 = None
-		# Convert numeric timeframe to string if needed
-		if isinstance(timeframe, int):
-			if timeframe not in tf_map:
-				raise ValueError(f"Invalid timeframe value: {timeframe}. Allowed: {list(tf_map.keys())}")
-			self.timeframe = tf_map[timeframe]
-		else:
-			self.timeframe = timeframe
+		# Потоковая SMA по подтверждённым свечам из WS канала candle{bar}
+		self.sma = None
+		self.sma_price_index = 4
+		self.last_candle_ts = None
+		# Дополнительные индикаторы (EMA, ATR, Bollinger, VWAP), обновляются теми же свечами
+		self.indicators = {}
+		self.timeframe = okx_bar(timeframe)
+		bar_seconds = {"m": 60, "H": 3600, "D": 86400}
+		self.bar_seconds = int(self.timeframe[:-1]) * bar_seconds[self.timeframe[-1]]
 
 	# Получаем необработанные данные по свечам
 	async def get_candle_data(self) -> dict:
 		try:
-			candle_data = self.marketDataAPI.get_candles(
+			candle_data = await self.rest.get_candles(
 				instId=self.instrument_id,
 				bar=self.timeframe,
 				limit=str(94)
@@ -74,8 +87,67 @@ class TechAnalysis:
 		
 		return self.round_tick(sma, self.tick_size)
 
+	async def seed_sma(self, length: int = 14, price_type: str = "close") -> float:
+		"""Один раз заполняет потоковую SMA подтверждёнными свечами из REST"""
+		candles = await self.get_candle_data()
+		if not candles or "data" not in candles:
+			logging.warning("Не удалось получить свечи для SMA")
+			return None
+		idx = {"open": 1, "high": 2, "low": 3, "close": 4}[price_type.lower()]
+
+		# REST отдаёт свечи от новой к старой, последняя (текущая) не подтверждена
+		confirmed = [c for c in candles["data"] if c[8] == "1"][:length]
+		if len(confirmed) < length:
+			logging.warning("Недостаточно данных для расчёта SMA")
+		self.sma = SMA(length)
+		self.sma_price_index = idx
+		for c in reversed(confirmed):
+			self.sma.update(float(c[idx]))
+		self.last_candle_ts = int(confirmed[0][0]) if confirmed else None
+
+		# Векторизованный прогрев остальных индикаторов по всей загруженной истории
+		if self.indicators:
+			history = np.array([c[1:6] for c in candles["data"] if c[8] == "1"][::-1], dtype=np.float64)
+			if len(history):
+				_, highs, lows, closes, volumes = history.T
+				for indicator in self.indicators.values():
+					indicator.warmup_bars(highs, lows, closes, volumes)
+		return self.sma_value()
+
+	def add_indicator(self, name: str, indicator):
+		"""Регистрирует индикатор из indicators.py, он будет прогрет в seed_sma() и обновляться в update_candle()"""
+		self.indicators[name] = indicator
+
+	def indicator_value(self, name: str):
+		indicator = self.indicators.get(name)
+		return indicator.value if indicator else None
+
+	def update_candle(self, candle: list) -> float:
+		"""
+		Принимает строку свечи из WS канала candle{bar} и обновляет SMA за O(1).
+		Учитываются только подтверждённые (confirm == "1") и ещё не учтённые свечи.
+		Возвращает текущее значение SMA.
+		"""
+		if self.sma is None or candle[8] != "1":
+			return self.sma_value()
+		ts = int(candle[0])
+		if self.last_candle_ts is not None and ts <= self.last_candle_ts:
+			return self.sma_value()
+		self.last_candle_ts = ts
+		self.sma.update(float(candle[self.sma_price_index]))
+		if self.indicators:
+			high, low, close, volume = (float(x) for x in candle[2:6])
+			for indicator in self.indicators.values():
+				indicator.update_bar(high, low, close, volume)
+		return self.sma_value()
+
+	def sma_value(self) -> float:
+		if self.sma is None or self.sma.value is None:
+			return None
+		return self.round_tick(self.sma.value, self.tick_size)
+
 	async def get_lot_tick_min(self, inst_type: str = "SWAP") -> tuple:
-		res = self.publicDataAPI.get_instruments(instType=inst_type, instId=self.instrument_id)
+		res = await self.rest.get_instruments(instType=inst_type, instId=self.instrument_id)
 		if "data" not in res or not res["data"]:
 			logging.warning("Не удалось получить данные инструмента")
 			return None, None, None, None
@@ -94,10 +166,21 @@ class TechAnalysis:
 		"""
 		if tick_size is None:
 			return round(value, 2)
-		if tick_size >= 1:
-			decimals = 0
-		else:
-			decimals = len(str(tick_size).split('.')[-1].rstrip('0'))
-		return round(value, decimals)
+		return round(value, step_decimals(tick_size))
 
 
+async def get_instruments_info(rest: OkxRestClient, inst_ids: list, inst_type: str = "SWAP") -> dict:
+	"""
+	Параметры сразу для нескольких инструментов одним запросом.
+	Возвращает {instId: (lot_size, ct_val, min_size, tick_size)}.
+	"""
+	res = await rest.get_instruments(instType=inst_type)
+	wanted = set(inst_ids)
+	info = {}
+	for item in res.get("data", []):
+		if item["instId"] in wanted:
+			info[item["instId"]] = (float(item["lotSz"]), float(item["ctVal"]), float(item["minSz"]), float(item["tickSz"]))
+	missing = wanted - set(info)
+	if missing:
+		logging.warning(f"Не удалось получить данные инструментов: {sorted(missing)}")
+	return info
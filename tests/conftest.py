@@ -0,0 +1,9 @@
+import os
+import sys
+import tempfile
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+sys.path.insert(0, ROOT)
+
+# Модули бота пишут grid.log (и журналы) в текущую папку - тесты работают во временной
+os.chdir(tempfile.mkdtemp(prefix='grid-tests-'))
@@ -0,0 +1,66 @@
+import asyncio
+
+import numpy as np
+
+from trade_okx import Trading
+
+INST = "TEST-USDT-SWAP"
+
+
+def make_trading() -> Trading:
+	return Trading("", "", "", 100000, 1, INST, 1, 1, 1, 0.01, 0.001, 0.001)
+
+
+def assert_arrays_match_levels(trading: Trading):
+	entry, close, sizes = trading._grid_arrays
+	for n, buy in trading.buy_grid_orders.items():
+		assert (entry[n], close[n], sizes[n]) == (buy['entry_price'], buy['close_price'], buy['size'])
+	missing = [n for n in range(len(entry)) if n not in trading.buy_grid_orders]
+	assert np.isnan(entry[missing]).all()
+
+
+def test_skipped_open_level_is_updated_once_it_is_free():
+	trading = make_trading()
+	asyncio.run(trading.recenter_grid(start_from=100, quantity=5))
+	trading.open_level(2, '1')
+	old_entry = trading.buy_grid_orders[2]['entry_price']
+
+	stats = asyncio.run(trading.recenter_grid(start_from=101, quantity=5))
+	assert stats['changed'] == 4
+	assert trading.buy_grid_orders[2]['entry_price'] == old_entry
+	assert_arrays_match_levels(trading)
+
+	# Уровень закрылся: следующий пересчёт с теми же ценами уровней должен его сдвинуть
+	trading.close_level(2)
+	stats = asyncio.run(trading.recenter_grid(start_from=101, quantity=6))
+	assert stats == {'changed': 1, 'added': 1, 'removed': 0}
+	fresh = make_trading()
+	asyncio.run(fresh.recenter_grid(start_from=101, quantity=6))
+	assert trading.buy_grid_orders[2]['entry_price'] == fresh.buy_grid_orders[2]['entry_price'] != old_entry
+	assert_arrays_match_levels(trading)
+
+
+def test_open_level_beyond_new_edge_stays_until_free():
+	trading = make_trading()
+	asyncio.run(trading.recenter_grid(start_from=100, quantity=6))
+	trading.open_level(5, '1')
+	level = dict(trading.buy_grid_orders[5])
+
+	stats = asyncio.run(trading.recenter_grid(start_from=100, quantity=4))
+	assert stats == {'changed': 0, 'added': 0, 'removed': 1}
+	assert sorted(trading.buy_grid_orders) == [0, 1, 2, 3, 5]
+	assert_arrays_match_levels(trading)
+
+	# Сетка снова выросла: убранный уровень 4 создаётся заново, открытый уровень 5 не перезаписывается
+	stats = asyncio.run(trading.recenter_grid(start_from=100, quantity=6))
+	assert stats == {'changed': 0, 'added': 1, 'removed': 0}
+	assert trading.buy_grid_orders[5] == level
+	assert trading.sell_grid_orders[5]['status'] == 'live'
+	assert_arrays_match_levels(trading)
+
+	# Позиция закрыта: уровни за краем убираются следующим пересчётом
+	trading.close_level(5)
+	stats = asyncio.run(trading.recenter_grid(start_from=100.5, quantity=4))
+	assert stats['removed'] == 2
+	assert sorted(trading.buy_grid_orders) == [0, 1, 2, 3]
+	assert len(trading._grid_arrays[0]) == 4
@@ -0,0 +1,67 @@
+import asyncio
+
+import pytest
+
+from decode_okx import OrderUpdate
+from journal import GridJournal
+from trade_okx import Trading
+
+INST = "TEST-USDT-SWAP"
+
+
+def make_trading(journal) -> Trading:
+	return Trading("", "", "", 100000, 1, INST, 1, 1, 1, 0.01, 0.001, 0.001, journal=journal, order_mode='limit')
+
+
+def canceled_update(order, ord_id: str, filled: float, avg_px: float, fee: float) -> OrderUpdate:
+	return OrderUpdate({'instId': INST, 'ordId': ord_id, 'clOrdId': order.cl_ord_id, 'side': order.side, 'state': 'canceled',
+						'accFillSz': str(filled), 'avgPx': str(avg_px), 'fee': str(fee), 'notionalUsd': '1', 'uTime': '1700000000000'})
+
+
+def test_restore_replays_partial_fills_of_canceled_resting_orders(tmp_path):
+	journal = GridJournal(str(tmp_path / "journal.db"))
+	trading = make_trading(journal)
+	asyncio.run(trading.recenter_grid(start_from=100, quantity=5))
+	level = trading.buy_grid_orders[1]
+	full_size = level['size']
+
+	# Покупка снята после частичного исполнения: продавать только купленные 3 контракта
+	buy = trading.resting.new('buy', 1, level['entry_price'], full_size)
+	assert trading.apply_resting_update(canceled_update(buy, '101', 3, 99.8, -0.03)) == ('buy', False, {})
+	assert trading.sell_grid_orders[1]['size'] == 3
+
+	# Продажа снята после частичного исполнения: продан 1 контракт, уровень держит 2
+	sell = trading.resting.new('sell', 1, trading.sell_grid_orders[1]['entry_price'], 3)
+	assert trading.apply_resting_update(canceled_update(sell, '102', 1, 100.1, -0.01)) == ('sell', False, {})
+	assert trading.sell_grid_orders[1]['size'] == 2
+
+	asyncio.run(journal.flush())
+	restored = make_trading(None)
+	assert restored.restore(journal.load(INST)) == 1
+
+	assert restored.sell_grid_orders[1]['size'] == 2
+	assert restored.sell_grid_orders[1]['status'] == 'live'
+	assert round(restored.realized_pnl, 9) == round(trading.realized_pnl, 9) != 0
+	assert round(restored.fees_paid, 9) == round(trading.fees_paid, 9)
+	asyncio.run(journal.close())
+
+
+def test_failed_flush_keeps_events_in_order(tmp_path):
+	journal = GridJournal(str(tmp_path / "journal.db"))
+	journal.record(INST, 'reset')
+	journal.record(INST, 'fill', ord_id='1')
+	write = journal._write
+
+	def failing_write(batch):
+		journal.record(INST, 'fill', ord_id='2')  # событие, пришедшее во время записи
+		raise OSError("disk full")
+
+	journal._write = failing_write
+	with pytest.raises(OSError):
+		asyncio.run(journal.flush())
+	journal._write = write
+	asyncio.run(journal.flush())
+
+	assert [(kind, payload.get('ord_id')) for _, kind, payload in journal.load(INST)] == [('reset', None), ('fill', '1'), ('fill', '2')]
+	assert journal.written == 3
+	asyncio.run(journal.close())
@@ -0,0 +1,106 @@
+import asyncio
+
+from trade_okx import ORDER_NOT_FOUND, Trading
+
+INST = "TEST-USDT-SWAP"
+
+
+class FakeRest:
+	"""REST клиент: на GET /trade/order отдаёт заранее заданные ответы и запоминает запрошенные clOrdId"""
+
+	def __init__(self, *responses):
+		self.responses = list(responses)
+		self.lookups = []
+
+	async def get_order(self, instId: str, ordId: str = None, clOrdId: str = None) -> dict:
+		self.lookups.append(clOrdId)
+		response = self.responses.pop(0)
+		if isinstance(response, Exception):
+			raise response
+		return response
+
+
+def make_trading(rest) -> Trading:
+	trading = Trading("", "", "", 100000, 1, INST, 1, 1, 1, 0.01, 0.001, 0.001, rest=rest)
+	asyncio.run(trading.recenter_grid(start_from=100, quantity=5))
+	return trading
+
+
+def filled(ord_id: str, size: float) -> dict:
+	return {'code': '0', 'msg': '', 'data': [{'ordId': ord_id, 'state': 'filled', 'accFillSz': str(size), 'avgPx': '99.9',
+											 'notionalUsd': '10', 'fee': '-0.01', 'uTime': '1700000000000'}]}
+
+
+def test_timeout_resolved_by_cl_ord_id_records_order_without_resending():
+	rest = FakeRest(filled('777', 3))
+	trading = make_trading(rest)
+	sent = []
+
+	async def send_order(**order):
+		sent.append(order)
+		raise asyncio.TimeoutError()
+
+	trading.send_order = send_order
+	results = asyncio.run(trading.place_market_orders('buy', {0: trading.buy_grid_orders[0]}, 99.9))
+
+	assert results == {0: '777'}
+	assert rest.lookups == [sent[0]['clOrdId']]
+	assert trading.strategy_orders.get('777').filled_price == 99.9
+	assert trading.ready_levels('buy', [0]) == [0]
+	assert not trading._unresolved
+
+
+def test_connection_error_and_missing_order_retries_after_delay():
+	rest = FakeRest({'code': ORDER_NOT_FOUND, 'msg': 'Order does not exist', 'data': []})
+	trading = make_trading(rest)
+	sent = []
+
+	async def send_order(**order):
+		sent.append(order)
+		if len(sent) == 1:
+			raise ConnectionError("private WS closed before order response")
+		return {'code': '0', 'msg': '', 'data': [{'ordId': '888', 'clOrdId': order['clOrdId'], 'sCode': '0', 'sMsg': ''}]}
+
+	trading.send_order = send_order
+	assert asyncio.run(trading.place_market_orders('buy', {1: trading.buy_grid_orders[1]}, 99.9)) == {1: None}
+	assert trading.ready_levels('buy', [1]) == []
+
+	trading._failed_levels.clear()
+	assert asyncio.run(trading.place_market_orders('buy', {1: trading.buy_grid_orders[1]}, 99.9)) == {1: '888'}
+	assert sent[0]['clOrdId'] != sent[1]['clOrdId']
+
+
+def test_unknown_outcome_blocks_level_until_resolved():
+	rest = FakeRest(OSError("network down"), filled('999', 2))
+	trading = make_trading(rest)
+	sent = []
+
+	async def send_order(**order):
+		sent.append(order)
+		raise asyncio.TimeoutError()
+
+	trading.send_order = send_order
+	assert asyncio.run(trading.place_market_orders('buy', {2: trading.buy_grid_orders[2]}, 99.9)) == {2: None}
+	assert trading._unresolved == {('buy', 2): sent[0]['clOrdId']}
+
+	# Уровень снова пересечён: вместо нового ордера - запрос статуса старого
+	trading._failed_levels.clear()
+	assert asyncio.run(trading.place_market_orders('buy', {2: trading.buy_grid_orders[2]}, 99.9)) == {2: '999'}
+	assert len(sent) == 1
+	assert rest.lookups == [sent[0]['clOrdId']] * 2
+	assert not trading._unresolved
+
+
+def test_partly_successful_batch_records_placed_orders():
+	trading = make_trading(FakeRest())
+
+	async def send_batch_orders(orders):
+		return {'code': '2', 'msg': '', 'data': [{'ordId': '111', 'sCode': '0', 'sMsg': ''},
+												 {'ordId': '', 'sCode': '51008', 'sMsg': 'Insufficient margin'}]}
+
+	trading.send_batch_orders = send_batch_orders
+	results = asyncio.run(trading.place_market_orders('buy', {0: trading.buy_grid_orders[0], 1: trading.buy_grid_orders[1]}, 99.9))
+
+	assert results == {0: '111', 1: None}
+	assert trading.strategy_orders.get('111') is not None
+	assert list(trading._failed_levels) == [('buy', 1)]
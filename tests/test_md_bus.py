@@ -0,0 +1,59 @@
+from multiprocessing.shared_memory import SharedMemory
+import os
+
+import pytest
+
+from md_bus import BusReader, BusWriter
+
+
+def bus_name(suffix: str) -> str:
+	return f"grid_test_bus_{os.getpid()}_{suffix}"
+
+
+def crash(writer: BusWriter):
+	"""Процесс фида упал: сегмент не удалён"""
+	writer.owner = False
+	writer.close()
+
+
+def test_writer_reuses_segment_left_by_crashed_feed():
+	name = bus_name("reuse")
+	writer = BusWriter(name, capacity=64, max_symbols=8)
+	symbol = writer.register_symbol("BTC-USDT-SWAP")
+	writer.publish(symbol, 100.0, 99.9, 100.1, 1)
+	reader = BusReader(name)
+	crash(writer)
+
+	writer = BusWriter(name, capacity=64, max_symbols=8)
+	try:
+		assert writer.register_symbol("BTC-USDT-SWAP") == symbol
+		writer.publish(symbol, 101.0, 100.9, 101.1, 2)
+		records = reader.read()
+		assert [(seq, last) for seq, _, _, last, *_ in records] == [(2, 101.0)]
+		assert reader.overruns == 0
+	finally:
+		reader.close()
+		writer.close()
+
+
+def test_writer_recreates_segment_with_another_layout():
+	name = bus_name("layout")
+	crash(BusWriter(name, capacity=64, max_symbols=8))
+	writer = BusWriter(name, capacity=128, max_symbols=8)
+	try:
+		assert writer.capacity == 128
+		assert writer.write_seq == 0 and writer.n_symbols == 0
+	finally:
+		writer.close()
+
+
+def test_writer_does_not_take_over_foreign_segment():
+	name = bus_name("foreign")
+	foreign = SharedMemory(name=name, create=True, size=4096)
+	try:
+		with pytest.raises(FileExistsError):
+			BusWriter(name, capacity=64, max_symbols=8)
+		assert bytes(foreign.buf[:4]) == b'\0' * 4
+	finally:
+		foreign.close()
+		foreign.unlink()
@@ -0,0 +1,121 @@
+import asyncio
+import json
+import time
+
+from rest_okx import OkxRestClient
+from rest_scheduler import PRIORITY_ACCOUNT, PRIORITY_ORDER, RequestScheduler
+from trade_okx import Trading
+from ws_okx import WebSocketClient
+
+INST = "TEST-USDT-SWAP"
+
+
+class FakePrivateWS:
+	"""Залогиненный приватный сокет: сразу отвечает на op ордеров и запоминает время каждой отправки"""
+
+	def __init__(self, client: WebSocketClient):
+		self.client = client
+		self.sent = []  # (time.monotonic(), op, количество ордеров)
+		self._ord_id = 0
+
+	async def send(self, message: str):
+		request = json.loads(message)
+		self.sent.append((time.monotonic(), request['op'], len(request['args'])))
+		data = []
+		for _ in request['args']:
+			self._ord_id += 1
+			data.append({'ordId': str(self._ord_id), 'clOrdId': '', 'sCode': '0', 'sMsg': ''})
+		future = self.client._pending_requests[request['id']]
+		asyncio.get_running_loop().call_soon(future.set_result, {'id': request['id'], 'code': '0', 'msg': '', 'data': data})
+
+
+def make_trading(scheduler: RequestScheduler):
+	rest = OkxRestClient(scheduler=scheduler)
+	ws = WebSocketClient("", "", "", public=False, scheduler=scheduler)
+	ws.private_ws = FakePrivateWS(ws)
+	ws.private_ready = True
+	trading = Trading("", "", "", 100000, 1, INST, 1, 1, 1, 0.01, 0.001, 0.001, rest=rest, order_ws=ws)
+	return trading, ws.private_ws
+
+
+def test_ws_order_burst_is_paced_by_okx_limits():
+	async def run():
+		scheduler = RequestScheduler()
+		trading, private_ws = make_trading(scheduler)
+		await trading.recenter_grid(start_from=100, quantity=200)
+		crossed = trading.ready_levels('buy', trading.grid_book.crossed_buys(1))
+		assert len(crossed) == 200
+
+		started = time.monotonic()
+		results = await trading.place_market_orders('buy', {n: trading.buy_grid_orders[n] for n in crossed}, 1)
+		elapsed = time.monotonic() - started
+
+		assert all(results.values())
+		assert [op for _, op, _ in private_ws.sent] == ['batch-orders'] * 10
+		# batch-orders: 300 ордеров за 2 с на инструмент, всплеск - половина. Сразу уходят 150, остальные 50
+		# ждут пополнения корзины (75 ордеров в секунду)
+		burst = sum(count for sent_at, _, count in private_ws.sent if sent_at - started < 0.1)
+		assert burst <= 150
+		assert 0.5 < elapsed < 1.5
+		stats = scheduler.stats()['order']
+		assert stats['sent'] == 10
+		assert stats['wait']['max_ms'] > 400
+		await trading.rest.close()
+
+	asyncio.run(run())
+
+
+def test_ws_and_rest_share_per_instrument_bucket():
+	async def run():
+		scheduler = RequestScheduler()
+		trading, private_ws = make_trading(scheduler)
+		# trade/order: 60 за 2 с на инструмент - всплеск 30, дальше 15 в секунду
+		started = time.monotonic()
+		for _ in range(36):
+			await trading.order_ws.place_order(instId=INST, side='buy', ordType='market', sz='1')
+		assert time.monotonic() - started > 0.3
+		priority, costs = scheduler.costs("/api/v5/trade/order", body={'instId': INST})
+		assert priority == PRIORITY_ORDER
+		assert scheduler.buckets[("/api/v5/trade/order", INST)].tokens < 1
+		await trading.rest.close()
+
+	asyncio.run(run())
+
+
+def test_orders_go_before_reads_waiting_on_the_same_bucket():
+	async def run():
+		scheduler = RequestScheduler(order_limit=None)
+		scheduler._bucket(('shared',), 4, 2)
+		order = []
+
+		async def acquire(tag, priority):
+			await scheduler.acquire(priority, {('shared',): 1})
+			order.append(tag)
+
+		tasks = [asyncio.create_task(acquire(f"read{i}", PRIORITY_ACCOUNT)) for i in range(3)]
+		await asyncio.sleep(0)
+		tasks.append(asyncio.create_task(acquire("order", PRIORITY_ORDER)))
+		await asyncio.gather(*tasks)
+		assert order == ['read0', 'read1', 'order', 'read2']
+
+	asyncio.run(run())
+
+
+def test_identical_reads_in_flight_are_coalesced():
+	async def run():
+		scheduler = RequestScheduler()
+		calls = []
+
+		async def send():
+			calls.append(1)
+			await asyncio.sleep(0.05)
+			return {'code': '0', 'data': []}
+
+		responses = await asyncio.gather(*(
+			scheduler.run("/api/v5/market/candles", send, params={'instId': INST}, coalesce_key='candles') for _ in range(5)
+		))
+		assert len(calls) == 1
+		assert all(response is responses[0] for response in responses)
+		assert scheduler.stats()['market']['coalesced'] == 4
+
+	asyncio.run(run())
@@ -0,0 +1,31 @@
+import asyncio
+
+from trade_okx import Trading
+
+INST = "TEST-USDT-SWAP"
+
+
+def test_rejected_resting_levels_wait_retry_delay():
+	trading = Trading("", "", "", 100000, 1, INST, 1, 1, 1, 0.01, 0.001, 0.001, order_mode='limit', resting_levels=2)
+	asyncio.run(trading.recenter_grid(start_from=100, quantity=5))
+	sent = []
+
+	async def send_batch_orders(orders):
+		# Цена уже у уровней: биржа отклоняет все post-only и обычные лимитные ордера
+		sent.append([order['clOrdId'] for order in orders])
+		return {'code': '1', 'msg': '', 'data': [{'ordId': '', 'clOrdId': order['clOrdId'], 'sCode': '51019', 'sMsg': 'Post only order rejected'}
+												 for order in orders]}
+
+	trading.send_batch_orders = send_batch_orders
+	first = asyncio.run(trading.sync_resting(99.95))
+	assert first['placed'] == 0 and sent
+	assert len(trading.resting) == 0
+
+	# Следующий тик: отклонённые уровни не отправляются повторно
+	assert asyncio.run(trading.sync_resting(99.96)) is None
+	assert len(sent) == 1
+
+	# После order_retry_delay уровни выставляются снова
+	trading.order_retry_delay = 0
+	assert asyncio.run(trading.sync_resting(99.97)) is not None
+	assert len(sent) == 2 and len(sent[1]) == len(sent[0])
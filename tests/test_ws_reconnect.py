@@ -0,0 +1,49 @@
+import asyncio
+import time
+
+import websockets
+
+from ws_okx import WebSocketClient
+
+
+def test_business_ws_backs_off_after_clean_closes():
+	async def scenario():
+		connections = []
+
+		async def handler(ws):
+			# Сервер принимает подписку и сразу чисто закрывает соединение
+			connections.append(time.monotonic())
+			await ws.recv()
+			await ws.close()
+
+		async with websockets.serve(handler, "127.0.0.1", 0) as server:
+			port = server.sockets[0].getsockname()[1]
+			client = WebSocketClient("", "", "", candle_bar="1m", public=False, private=False, ws_url=f"ws://127.0.0.1:{port}")
+			client.add_instrument("TEST-USDT-SWAP", None, None, asyncio.Queue())
+			client.reconnect_delay = 0.05
+			client.reconnect_max_delay = 0.4
+			task = asyncio.create_task(client.connect_business())
+			await asyncio.sleep(1.5)
+			client.running = False
+			task.cancel()
+			await asyncio.gather(task, return_exceptions=True)
+		return client, connections
+
+	client, connections = asyncio.run(scenario())
+	# Без backoff было бы ~40 подключений (задержка _backoff(0) ~ 0.04 с)
+	assert 3 <= len(connections) <= 10
+	assert client.business_failures >= len(connections) - 1
+	gaps = [b - a for a, b in zip(connections, connections[1:])]
+	assert gaps[-1] > gaps[0]
+
+
+def test_healthy_session_resets_failures():
+	client = WebSocketClient("", "", "", public=False, private=False)
+	client.reconnect_delay = 1
+	client.reconnect_max_delay = 8
+	delay, failures = client._session_backoff(3, None)
+	assert failures == 4 and 4 <= delay <= 8
+	delay, failures = client._session_backoff(failures, time.monotonic() - client.healthy_session)
+	assert failures == 1 and 0.5 <= delay <= 1
+	delay, failures = client._session_backoff(failures, time.monotonic())
+	assert failures == 2
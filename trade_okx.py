@@ -1,6 +1,15 @@
 from datetime import datetime
+import asyncio
+import itertools
 import logging
-import okx.Trade as Trade
+import time
+import numpy as np
+from rest_okx import OkxRestClient
+from ws_okx import OrderChannelUnavailable
+from grid_book import GridBook
+from grid_builder import InstrumentRounding, build_grid, step_decimals
+from metrics import LatencyStats
+from orders import OrderRecord, OrderStatus, OrderStore, RestingOrder, RestingOrders
 
 logging.basicConfig(
     level=logging.INFO,
@@ -11,9 +20,18 @@ logging.basicConfig(
     ]
 )
 
+ORDER_NOT_FOUND = "51603"  # OKX: Order does not exist
+
+
 class Trading:
-	def __init__(self, api_key: str, secret_key: str, passphrase: str, balance: float, leverage: float, instrument_id: str, lot_size: float, ct_val: float, min_size: float, tick_size: float, grid_step: float, profit_target: float):
-		self.tradeAPI = Trade.TradeAPI(api_key, secret_key, passphrase, False, '0')
+	def __init__(self, api_key: str, secret_key: str, passphrase: str, balance: float, leverage: float, instrument_id: str, lot_size: float, ct_val: float, min_size: float, tick_size: float, grid_step: float, profit_target: float, rest: OkxRestClient = None, order_ws=None, journal=None, order_mode: str = 'market', resting_levels: int = 5):
+		# Общий асинхронный REST клиент, если не передан - создаём свой
+		self.rest = rest or OkxRestClient(api_key, secret_key, passphrase, flag='0')
+		# WebSocketClient с залогиненным приватным сокетом для отправки ордеров (REST - запасной путь)
+		self.order_ws = order_ws
+		# GridJournal: сетка, ордера и исполнения пишутся в журнал для восстановления после рестарта
+		self.journal = journal
+		self._replaying = False
 		self.balance = balance
 		self.leverage = leverage
 		self.instrument_id = instrument_id
@@ -21,12 +39,39 @@ class Trading:
 		self.ct_val = ct_val
 		self.min_size = min_size
 		self.tick_size = tick_size
-		self.strategy_orders = {}
+		# Маркет ордера стратегии: активные по ordId и уровню, закрытые круги - в ограниченном архиве
+		self.strategy_orders = OrderStore()
 		self.first_order_id = None
 		self.grid_step = grid_step
 		self.profit_target = profit_target
 		self.buy_grid_orders = {}
 		self.sell_grid_orders = {}
+		self.grid_book = GridBook()
+		# Якорь и массивы текущей сетки для инкрементального пересчёта (recenter_grid)
+		self.grid_anchor = None
+		self._grid_arrays = None
+		# Сериализует обработку тика в strategy() и применение событий ордеров
+		self.state_lock = asyncio.Lock()
+		self.fill_latency = LatencyStats()
+		# От прихода тика в PriceMailbox до ответа биржи на ордера этого тика
+		self.order_latency = LatencyStats()
+		# Оценка реализованного PnL (по цене срабатывания) и уплаченные комиссии, USDT
+		self.realized_pnl = 0.0
+		self.fees_paid = 0.0
+		# order_mode='market' - strategy() сама ловит пересечение уровней и бьёт маркет ордерами.
+		# order_mode='limit' - на resting_levels ближайших buy и sell уровнях стоят post-only ордера,
+		# исполняет их биржа, а состояние уровней меняется по событиям канала orders (apply_resting_update)
+		self.order_mode = order_mode
+		self.resting_levels = resting_levels
+		self.resting = RestingOrders()
+		self.orphaned = {}  # clOrdId продажи, исполнившейся во время сброса сетки -> данные её уровня
+		# Уровень, ордер которого не размещён (маркет или в стакане), остаётся живым; повтор - не раньше order_retry_delay секунд
+		self.order_retry_delay = 1.0
+		self._failed_levels = {}  # (side, order_number) -> time.monotonic() неудачной попытки
+		# Маркет ордера без ответа биржи: (side, order_number) -> clOrdId. Уровень не стреляет снова, пока статус не выяснен
+		self._unresolved = {}
+		self._cl_ord_seq = itertools.count(int(time.time() * 1000))
+		self.last_price = None
 
 		def get_precision(value):
 			value_str = f'{value:.16f}'.rstrip('0')
@@ -34,6 +79,8 @@ class Trading:
 				return max(0, len(value_str.split('.')[-1]))
 			return 0
 		self.lot_precision = get_precision(self.lot_size)
+		# Округление под tick_size / lot_size считается один раз на инструмент
+		self.rounding = InstrumentRounding(self.tick_size, self.lot_size)
 
 	def round_tick(self, value: float, tick_size: float = None) -> float:
 		"""
@@ -42,45 +89,26 @@ class Trading:
 		"""
 		if tick_size is None:
 			return round(value, 2)
-		if tick_size >= 1:
-			decimals = 0
-		else:
-			decimals = len(str(tick_size).split('.')[-1].rstrip('0'))
-		return round(value, decimals)
+		return round(value, step_decimals(tick_size))
 
-	async def get_buy_grid(self, start_from: float, quantity: int) -> dict:
+	async def get_buy_grid(self, start_from: float, quantity: int, grid_step: float = None, profit_target: float = None) -> dict:
+		# Шаг и тейк можно передать из индикаторов волатильности, иначе берутся настройки Trading
+		grid_step = grid_step or self.grid_step
+		profit_target = profit_target or self.profit_target
 
-		buy_grid_orders = {}
-		orders_have = 0  # для совместимости с оригинальной функцией
-		
-		for i in range(quantity):
-			index = orders_have + i  # абсолютный номер ордера в сетке
-
-			usdt_amount = self.balance * 0.01 # 1% от баланса			
-			px = self.round_tick(start_from * (1 - self.grid_step * index), self.tick_size)
-
-			# Расчет размера ордера с учетом ct_val и lot_size
-			contracts = usdt_amount / (px * self.ct_val)
-			lots = contracts / self.lot_size
-			size_i = lots * self.lot_size
-			# Если у нас размер ордера меньше размера минимального объема
-			if size_i < self.min_size:
-				size_i = self.min_size
-			size_i = self.round_tick(size_i, self.lot_size)
-			
+		usdt_amount = self.balance * 0.01 # 1% от баланса
+		# Цены входа, закрытия и размеры всех уровней считаются одним проходом по массивам
+		entry_prices, close_prices, sizes = build_grid(
+			start_from, quantity, grid_step, profit_target, usdt_amount,
+			self.ct_val, self.min_size, self.rounding
+		)
+		if len(entry_prices) < quantity:
+			logging.warning(f"❗️Grid truncated to {len(entry_prices)} levels: deeper levels would have non-positive price")
 
-			buy_grid_orders[i] = {
-				'entry_price': px,
-				'close_price': self.round_tick(px * (1 + self.profit_target), self.tick_size),
-				'size': size_i,
-				'crTime': datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
-				'status': 'live', 
-				'side': 'buy',
-				'group_with_id': None,
-				'filledTime': None,
-				'filledPrice': None,
-				'order_index': index,
-			}
+		cr_time = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+		buy_grid_orders = {}
+		for i, (px, close_px, size_i) in enumerate(zip(entry_prices.tolist(), close_prices.tolist(), sizes.tolist())):
+			buy_grid_orders[i] = self._buy_level(i, px, close_px, size_i, cr_time)
 
 		
 		# Красивый вывод сетки
@@ -91,12 +119,16 @@ class Trading:
 		# 	logging.info(f"{order_id:<3} {order['entry_price']:<12} {order['close_price']:<14} {order['size']:<12}")
 		# logging.info("="*80 + "\n")
 
-		logging.info(f"🔶Grid calculated: {quantity} orders starting from price {start_from}")
+		logging.info(f"🔶Grid calculated: {len(buy_grid_orders)} orders starting from price {start_from}")
 		self.buy_grid_orders = buy_grid_orders
+		self._grid_arrays = (entry_prices, close_prices, sizes)
+		self.grid_anchor = None
+		self.grid_book.load('buy', buy_grid_orders)
 		return buy_grid_orders
 
 	async def get_sell_grid(self, buy_orders: dict) -> dict:
 		sell_grid_orders = {}
+		cr_time = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
 		
 		for buy_order_number, buy_order in buy_orders.items():
 			price = buy_order['close_price']  # цена закрытия из buy ордера
@@ -105,18 +137,7 @@ class Trading:
 			
 			
 			# Создаем sell ордер
-			sell_grid_orders[buy_order_number] = {
-				'entry_price': price,
-				'close_price': None,
-				'size': size,
-				'crTime': datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
-				'status': 'calculated', 
-				'side': 'sell',
-				'group_with_id': buy_order_number,
-				'filledTime': None,
-				'filledPrice': None,
-				'order_index': order_index,
-			}
+			sell_grid_orders[buy_order_number] = self._sell_level(buy_order_number, price, size, cr_time, order_index)
 		
 		# Красивый вывод sell сетки
 		# logging.info("\n" + "="*80)
@@ -128,94 +149,699 @@ class Trading:
 		
 		logging.info(f"🔶Sell grid calculated: {len(sell_grid_orders)} orders")
 		self.sell_grid_orders = sell_grid_orders
+		self.grid_book.load('sell', sell_grid_orders)
 		return sell_grid_orders
 
-	async def place_market_buy_order(self, order_data: dict, price) -> str:
-		try:
-			market_order = self.tradeAPI.place_order(
-				instId=self.instrument_id,
-				tdMode="isolated",
-				side='buy',
-				ccy="USDT",
-				ordType="market",
-				sz=str(round(order_data['size'], self.lot_precision)),
+	def _buy_level(self, order_number: int, px: float, close_px: float, size: float, cr_time: str) -> dict:
+		return {
+			'entry_price': px,
+			'close_price': close_px,
+			'size': size,
+			'crTime': cr_time,
+			'status': 'live', 
+			'side': 'buy',
+			'group_with_id': None,
+			'filledTime': None,
+			'filledPrice': None,
+			'order_index': order_number,
+		}
+
+	def _sell_level(self, order_number: int, px: float, size: float, cr_time: str, order_index: int = None) -> dict:
+		return {
+			'entry_price': px,
+			'close_price': None,
+			'size': size,
+			'crTime': cr_time,
+			'status': 'calculated', 
+			'side': 'sell',
+			'group_with_id': order_number,
+			'filledTime': None,
+			'filledPrice': None,
+			'order_index': order_number if order_index is None else order_index,
+		}
+
+	async def recenter_grid(self, start_from: float, quantity: int, grid_step: float = None, profit_target: float = None) -> dict:
+		"""
+		Пересчитывает сетку от нового якоря, меняя только отличающиеся уровни.
+		Если якорь (SMA, округлённая до тика) и параметры не изменились - ничего не делает и возвращает None.
+		Изменения применяются под state_lock одним синхронным шагом, поэтому strategy()
+		никогда не видит наполовину заменённую сетку. Уровни с открытой позицией не трогаются.
+		Возвращает статистику {'changed', 'added', 'removed'}.
+		"""
+		grid_step = grid_step or self.grid_step
+		profit_target = profit_target or self.profit_target
+		anchor = (self.rounding.round_price(start_from), quantity, grid_step, profit_target)
+		if anchor == self.grid_anchor and self.buy_grid_orders:
+			return None
+
+		entry_prices, close_prices, sizes = build_grid(
+			start_from, quantity, grid_step, profit_target, self.balance * 0.01,
+			self.ct_val, self.min_size, self.rounding
+		)
+		async with self.state_lock:
+			stats = self._apply_grid(entry_prices, close_prices, sizes)
+			self.grid_anchor = anchor
+			self._journal('grid', anchor=list(anchor), entry=entry_prices.tolist(), close=close_prices.tolist(), sizes=sizes.tolist())
+		logging.info(f"🔶Grid recentered from {start_from}: {stats}")
+		return stats
+
+	def _apply_grid(self, entry_prices, close_prices, sizes) -> dict:
+		"""Применяет к живой сетке только разницу с новыми массивами уровней"""
+		cr_time = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+		new_count = len(entry_prices)
+		old_arrays = self._grid_arrays if self.buy_grid_orders else None
+		old_count = len(old_arrays[0]) if old_arrays is not None else 0
+		if old_arrays is None:
+			self.buy_grid_orders = {}
+			self.sell_grid_orders = {}
+			self.grid_book.clear()
+
+		# Уровни, которые есть в обеих сетках: сравниваем массивы и трогаем только отличающиеся
+		common = min(old_count, new_count)
+		changed = []
+		if common:
+			diff = (
+				(entry_prices[:common] != old_arrays[0][:common]) |
+				(close_prices[:common] != old_arrays[1][:common]) |
+				(sizes[:common] != old_arrays[2][:common])
 			)
-			
-			if market_order.get("code") == "0":
-				logging.info(market_order)
-				ord_id = market_order['data'][0]['ordId']
-				filled_size = float(market_order['data'][0].get('sz', order_data['size']))
-				
-				# Добавляем полную информацию в strategy_orders
-				self.strategy_orders[ord_id] = {
-					'entry_price': order_data['entry_price'],
-					'close_price': order_data['close_price'],
-					'size': filled_size,
-					'crTime': datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
-					'status': 'filled',
-					'side': 'buy',
-					'group_with_id': None,
-					'filledTime': datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
-					'filledPrice': price,
-					'order_index': order_data.get('order_index', 0),
-					'market_order_id': ord_id,
-					'usdt_size': None, 
-					'fee': None, 
-				}
-				
-				# Если это первый ордер (order_index = 0), назначаем first_order_id
-				if order_data.get('order_index', 0) == 0:
-					self.first_order_id = ord_id
-					logging.info(f"First order ID set: {self.first_order_id}")
-				
-				return ord_id
-			else:
-				logging.warning(f"❌Failed to place market buy order: {market_order.get('msg')}")
-				return None
-				
-		except Exception as e:
-			logging.warning(f"❌Error placing market buy order: {e}")
+			changed = np.flatnonzero(diff).tolist()
+		kept = []  # уровни, оставшиеся со старыми параметрами: в _grid_arrays пишутся их старые значения
+		applied, added = 0, max(0, new_count - old_count)
+		for n in changed:
+			buy, sell = self.buy_grid_orders.get(n), self.sell_grid_orders.get(n)
+			if buy is None and sell is None:
+				# Пропуск в старой сетке (край, убранный раньше, чем уровень за ним) - уровень создаётся заново
+				px, close_px, size = float(entry_prices[n]), float(close_prices[n]), float(sizes[n])
+				self.buy_grid_orders[n] = self._buy_level(n, px, close_px, size, cr_time)
+				self.sell_grid_orders[n] = self._sell_level(n, close_px, size, cr_time)
+				self.grid_book.add('buy', n, px)
+				added += 1
+				continue
+			if buy is None or sell is None or buy['status'] != 'live' or sell['status'] == 'live':
+				kept.append(n)
+				continue
+			buy['entry_price'] = float(entry_prices[n])
+			buy['close_price'] = float(close_prices[n])
+			buy['size'] = float(sizes[n])
+			buy['crTime'] = cr_time
+			sell['entry_price'] = buy['close_price']
+			sell['size'] = buy['size']
+			sell['crTime'] = cr_time
+			self.grid_book.add('buy', n, buy['entry_price'])
+			applied += 1
+
+		# Новые уровни на краю сетки
+		for n in range(old_count, new_count):
+			px, close_px, size = float(entry_prices[n]), float(close_prices[n]), float(sizes[n])
+			self.buy_grid_orders[n] = self._buy_level(n, px, close_px, size, cr_time)
+			self.sell_grid_orders[n] = self._sell_level(n, close_px, size, cr_time)
+			self.grid_book.add('buy', n, px)
+
+		# Лишние уровни на краю сетки (только если по ним нет позиции)
+		removed = 0
+		for n in range(new_count, old_count):
+			buy = self.buy_grid_orders.get(n)
+			if buy is not None and buy['status'] == 'live':
+				self.grid_book.remove('buy', n)
+				self.grid_book.remove('sell', n)
+				self.buy_grid_orders.pop(n, None)
+				self.sell_grid_orders.pop(n, None)
+				removed += 1
+			elif buy is not None:
+				kept.append(n)
+
+		# Массивы описывают сетку, которая реально стоит: пропущенные уровни - со старыми значениями,
+		# уровни за краем с позицией остаются в массивах и будут убраны следующим пересчётом, пропуски - NaN
+		count = max(new_count, max(self.buy_grid_orders, default=-1) + 1)
+		if kept or count != new_count:
+			arrays = tuple(np.full(count, np.nan) for _ in range(3))
+			for array, new_array, old_array in zip(arrays, (entry_prices, close_prices, sizes), old_arrays):
+				array[:new_count] = new_array
+				array[kept] = old_array[kept]
+			entry_prices, close_prices, sizes = arrays
+		self._grid_arrays = (entry_prices, close_prices, sizes)
+		return {'changed': applied, 'added': added, 'removed': removed}
+
+	def set_level_status(self, side: str, order_number: int, status: str):
+		"""Меняет статус уровня сетки и синхронно обновляет grid_book"""
+		grid_orders = self.buy_grid_orders if side == 'buy' else self.sell_grid_orders
+		order = grid_orders[order_number]
+		order['status'] = status
+		if status == 'live':
+			self.grid_book.add(side, order_number, order['entry_price'])
+		else:
+			self.grid_book.remove(side, order_number)
+
+	def ready_levels(self, side: str, order_numbers: list) -> list:
+		"""Пересечённые уровни без уровней, чей ордер недавно не прошёл (ждут order_retry_delay)"""
+		if not self._failed_levels:
+			return order_numbers
+		now = time.monotonic()
+		return [n for n in order_numbers
+				if now - self._failed_levels.get((side, n), -self.order_retry_delay) >= self.order_retry_delay]
+
+	def open_level(self, order_number: int, ord_id: str):
+		"""Покупка уровня исполнена: buy уровень закрыт, sell уровень ждёт цену закрытия"""
+		self.set_level_status('buy', order_number, 'filled')
+		self.sell_grid_orders[order_number]['group_with_id'] = ord_id
+		self.set_level_status('sell', order_number, 'live')
+
+	def close_level(self, order_number: int) -> bool:
+		"""
+		Продажа уровня исполнена. Для не первого уровня снова активирует buy уровень,
+		продажа первого уровня сбрасывает сетку целиком - тогда возвращает True.
+		"""
+		self.set_level_status('sell', order_number, 'filled')
+		if order_number == 0:
+			self.clear_grid()
+			return True
+		self.set_level_status('buy', order_number, 'live')
+		return False
+
+	def resize_level(self, order_number: int, size: float):
+		"""Покупка уровня снята после частичного исполнения: продаётся только купленный объём"""
+		self._journal('resize', level=order_number, size=size)
+		self.sell_grid_orders[order_number]['size'] = size
+
+	def reduce_level(self, order_number: int, size: float, avg_px: float, fee: float):
+		"""Продажа уровня снята после частичного исполнения: проданная часть даёт PnL, уровень держит остаток"""
+		self._journal('reduce', level=order_number, size=size, avg_px=avg_px, fee=fee)
+		level = self.sell_grid_orders[order_number]
+		buy_order = self.strategy_orders.level_buy(order_number)
+		if buy_order is not None and buy_order.filled_price:
+			self.realized_pnl += (avg_px - buy_order.filled_price) * size * self.ct_val
+		self.fees_paid -= fee
+		level['size'] = round(level['size'] - size, self.lot_precision)
+
+	def clear_grid(self):
+		"""Сбрасывает сетку и ордера стратегии"""
+		self._journal('reset')
+		self.strategy_orders.clear()
+		self.buy_grid_orders.clear()
+		self.sell_grid_orders.clear()
+		self.grid_book.clear()
+		self._failed_levels.clear()
+		if self._unresolved:
+			logging.warning(f"❗️ {self.instrument_id}: grid reset with unresolved market orders {self._unresolved}, reconcile will check the position")
+			self._unresolved.clear()
+		self.grid_anchor = None
+		self._grid_arrays = None
+
+	def apply_fill(self, ord_id: str, state: str, size: float, avg_px: float, notional_usd: float, fee: float, ts: float = None):
+		"""
+		Применяет исполнение из канала orders к ордеру стратегии (активному или уже в архиве).
+		Возвращает OrderRecord или None, если ордер не наш.
+		"""
+		order = self.strategy_orders.get(ord_id)
+		if order is None:
 			return None
+		self._journal('fill', ord_id=ord_id, state=state, size=size, avg_px=avg_px, notional_usd=notional_usd, fee=fee, ts=ts)
+		order.status = OrderStatus.from_okx(state)
+		order.size = size
+		order.filled_price = avg_px
+		order.filled_ts = ts or time.time()
+		order.usdt_size = notional_usd
+		# fee в OKX накопительный по ордеру и отрицательный, когда комиссию платим мы
+		self.fees_paid += -(fee - (order.fee or 0.0))
+		order.fee = fee
+		return order
 
-	async def place_market_sell_order(self, order_data: dict, price) -> str:
+	def _journal(self, kind: str, **payload):
+		if self.journal is not None and not self._replaying:
+			self.journal.record(self.instrument_id, kind, **payload)
+
+	def restore(self, events: list) -> int:
+		"""
+		Восстанавливает сетку и позиции из событий журнала (GridJournal.load) теми же методами,
+		которыми их меняет strategy(). Возвращает количество открытых уровней.
+		"""
+		self._replaying = True
 		try:
-			market_order = self.tradeAPI.place_order(
-				instId=self.instrument_id,
-				tdMode="isolated",
-				side='sell',
-				ccy="USDT",
-				ordType="market",
-				sz=str(round(order_data['size'], self.lot_precision)),
-				reduceOnly='true',
-			)
-			
-			if market_order.get("code") == "0":
-				ord_id = market_order['data'][0]['ordId']
-				filled_size = float(market_order['data'][0].get('sz', order_data['size']))
-				
-				# Добавляем полную информацию в strategy_orders
-				self.strategy_orders[ord_id] = {
-					'entry_price': order_data['entry_price'],
-					'close_price': order_data['close_price'],
-					'size': filled_size,
-					'crTime': datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
-					'status': 'filled',
-					'side': 'sell',
-					'group_with_id': order_data.get('group_with_id', None),
-					'filledTime': datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
-					'filledPrice': price,
-					'order_index': order_data.get('order_index', 0),
-					'market_order_id': ord_id,
-					'usdt_size': None, 
-					'fee': None, 
-				}
-				
-				return ord_id
+			for _, kind, payload in events:
+				if kind == 'grid':
+					arrays = tuple(np.array(payload[key], dtype=np.float64) for key in ('entry', 'close', 'sizes'))
+					self._apply_grid(*arrays)
+					self.grid_anchor = tuple(payload['anchor'])
+				elif kind == 'order':
+					level = payload['level']
+					order_data = {'entry_price': payload['entry_price'], 'close_price': payload['close_price'],
+								  'order_index': level, 'group_with_id': payload['group_with_id']}
+					self._record_order(payload['side'], order_data, payload['ord_id'], payload['size'], payload['price'])
+					if level not in self.buy_grid_orders:
+						continue
+					if payload['side'] == 'buy':
+						self.open_level(level, payload['ord_id'])
+					else:
+						self.close_level(level)
+				elif kind == 'fill':
+					self.apply_fill(payload['ord_id'], payload['state'], payload['size'], payload['avg_px'],
+									payload['notional_usd'], payload['fee'], payload['ts'])
+				elif kind == 'resize':
+					if payload['level'] in self.sell_grid_orders:
+						self.resize_level(payload['level'], payload['size'])
+				elif kind == 'reduce':
+					if payload['level'] in self.sell_grid_orders:
+						self.reduce_level(payload['level'], payload['size'], payload['avg_px'], payload['fee'])
+				elif kind == 'reset':
+					self.clear_grid()
+		finally:
+			self._replaying = False
+		if self.buy_grid_orders:
+			logging.info(f"♻️ {self.instrument_id} restored from journal: {len(self.buy_grid_orders)} levels, {self.strategy_orders.open_positions} open")
+		return self.strategy_orders.open_positions
+
+	async def reconcile(self):
+		"""
+		Сверяет восстановленное состояние с биржей: позиция по инструменту и последние ордера.
+		Исполнения, пропущенные за время простоя, применяются к ордерам стратегии.
+		Если позиции на бирже нет, а журнал считает уровни открытыми - сетка сбрасывается.
+		"""
+		positions, history = await asyncio.gather(
+			self.rest.get_positions(instType="SWAP", instId=self.instrument_id),
+			self.rest.get_orders_history(instType="SWAP", instId=self.instrument_id),
+			return_exceptions=True
+		)
+		if isinstance(history, dict):
+			for item in history.get('data') or []:
+				if item.get('ordId') in self.strategy_orders and item.get('state') in ('filled', 'partially_filled'):
+					self.apply_fill(item['ordId'], item['state'], float(item.get('accFillSz') or 0), float(item.get('avgPx') or 0),
+									float(item.get('notionalUsd') or 0), float(item.get('fee') or 0), int(item.get('uTime') or 0) / 1000)
+		if not isinstance(positions, dict) or positions.get('code') != '0':
+			logging.warning(f"❗️ {self.instrument_id} reconcile: positions request failed: {positions}")
+			return
+
+		exchange_size = sum(float(p.get('pos') or 0) for p in positions.get('data') or [])
+		journal_size = sum(order.size for order in self.strategy_orders.values() if order.side == 'buy')
+		if exchange_size == 0 and self.strategy_orders.open_positions:
+			logging.warning(f"❗️ {self.instrument_id} reconcile: no position on exchange, journal had {journal_size} - resetting grid")
+			self.clear_grid()
+		elif round(exchange_size - journal_size, self.lot_precision) != 0:
+			logging.warning(f"❗️ {self.instrument_id} reconcile: exchange position {exchange_size} != journal {journal_size}")
+		else:
+			logging.info(f"✅ {self.instrument_id} reconcile: position {exchange_size} matches journal")
+
+	async def send_order(self, **order) -> dict:
+		"""Отправляет ордер через приватный WS, а если сокет не подключен - через REST"""
+		if self.order_ws is not None:
+			try:
+				return await self.order_ws.place_order(**order)
+			except OrderChannelUnavailable as e:
+				logging.warning(f"⚠️ Order WS unavailable ({e}), sending order via REST")
+		return await self.rest.place_order(**order)
+
+	async def _batch_request(self, method: str, orders: list) -> dict:
+		"""Пакет (до 20 ордеров) через приватный WS, запасной путь - тот же метод REST клиента"""
+		if self.order_ws is not None:
+			try:
+				return await getattr(self.order_ws, method)(orders)
+			except OrderChannelUnavailable as e:
+				logging.warning(f"⚠️ Order WS unavailable ({e}), sending {method} via REST")
+		return await getattr(self.rest, method)(orders)
+
+	async def send_batch_orders(self, orders: list) -> dict:
+		return await self._batch_request('place_batch_orders', orders)
+
+	async def send_cancel_orders(self, orders: list) -> dict:
+		return await self._batch_request('cancel_batch_orders', orders)
+
+	async def send_amend_orders(self, orders: list) -> dict:
+		return await self._batch_request('amend_batch_orders', orders)
+
+	def _market_order_args(self, side: str, order_data: dict, cl_ord_id: str) -> dict:
+		args = {
+			'instId': self.instrument_id,
+			'tdMode': "isolated",
+			'side': side,
+			'ccy': "USDT",
+			'ordType': "market",
+			'sz': str(round(order_data['size'], self.lot_precision)),
+			# По clOrdId выясняется судьба ордера, ответ на который не пришёл
+			'clOrdId': cl_ord_id,
+		}
+		if side == 'sell':
+			args['reduceOnly'] = True
+		return args
+
+	def _record_order(self, side: str, order_data: dict, ord_id: str, filled_size: float, price):
+		"""Записывает исполненный маркет ордер в strategy_orders, продажа закрывает уровень"""
+		level = order_data.get('order_index', 0)
+		group_with_id = order_data.get('group_with_id', None) if side == 'sell' else None
+		self._journal('order', side=side, level=level, ord_id=ord_id, size=filled_size, price=price,
+					  entry_price=order_data['entry_price'], close_price=order_data['close_price'], group_with_id=group_with_id)
+		record = OrderRecord(ord_id, side, level, order_data['entry_price'], order_data['close_price'],
+							 filled_size, price, group_with_id=group_with_id)
+
+		if side == 'sell':
+			# Закрытие уровня: PnL считаем от цены исполнения соответствующей покупки
+			buy_order = self.strategy_orders.get(group_with_id)
+			if buy_order and buy_order.filled_price:
+				self.realized_pnl += (price - buy_order.filled_price) * filled_size * self.ct_val
+			self.strategy_orders.add(record)
+			self.strategy_orders.close_level(level, ord_id)
+			return
+
+		self.strategy_orders.add(record)
+		# Если это первый ордер (order_index = 0), назначаем first_order_id
+		if level == 0:
+			self.first_order_id = ord_id
+			logging.info(f"First order ID set: {self.first_order_id}")
+
+	async def place_market_orders(self, side: str, orders: dict, price, track_levels: bool = True) -> dict:
+		"""
+		Размещает маркет ордера для всех уровней, пересечённых одним тиком.
+		orders: {order_number: order_data}. Один уровень уходит обычным ордером,
+		несколько - пакетами batch-orders по 20 штук, пакеты отправляются параллельно.
+		Возвращает {order_number: ord_id или None, если ордер не размещён}.
+
+		Повтор (через order_retry_delay) - только после явного отказа биржи (sCode != 0). Если ответа нет
+		(таймаут, обрыв сокета, ошибка HTTP), ордер мог дойти до OKX: его статус запрашивается по clOrdId,
+		и пока он не выяснен, новый ордер на уровень не отправляется.
+		track_levels=False - ордера не уровней текущей сетки (продажа остатков после сброса): без повторов.
+		"""
+		if not orders:
+			return {}
+		results = {}
+		to_send = {}
+		for n, order_data in orders.items():
+			cl_ord_id = self._unresolved.get((side, n)) if track_levels else None
+			if cl_ord_id is None:
+				to_send[n] = order_data
+				continue
+			# Прошлый ордер уровня остался без ответа - сначала узнаём, дошёл ли он
+			known, ord_id = await self._resolve_market_order(side, n, order_data, cl_ord_id, price)
+			if known and ord_id is None:
+				to_send[n] = order_data
 			else:
-				logging.warning(f"❌Failed to place market sell order: {market_order.get('msg')}")
-				return None
-				
+				results[n] = ord_id
+				if not known:
+					self._failed_levels[(side, n)] = time.monotonic()
+
+		order_numbers = list(to_send)
+		cl_ord_ids = {n: f"m{side[0]}{n}n{next(self._cl_ord_seq)}" for n in order_numbers}
+		args = [self._market_order_args(side, to_send[n], cl_ord_ids[n]) for n in order_numbers]
+		if len(args) == 1:
+			chunks = [(order_numbers, self.send_order(**args[0]))]
+		else:
+			chunks = [
+				(order_numbers[i:i + 20], self.send_batch_orders(args[i:i + 20]))
+				for i in range(0, len(args), 20)
+			]
+		responses = await asyncio.gather(*(request for _, request in chunks), return_exceptions=True)
+
+		for (numbers, _), response in zip(chunks, responses):
+			if isinstance(response, Exception):
+				logging.warning(f"❗️ No response for market {side} orders {numbers} ({response!r}), checking them by clOrdId")
+				for n in numbers:
+					if track_levels:
+						self._unresolved[(side, n)] = cl_ord_ids[n]
+					known, ord_id = await self._resolve_market_order(side, n, to_send[n], cl_ord_ids[n], price, track_levels)
+					results[n] = ord_id
+					if ord_id is None and track_levels:
+						self._failed_levels[(side, n)] = time.monotonic()
+				continue
+			if side == 'buy':
+				logging.info(response)
+
+			# Ответ batch-orders содержит data в том же порядке, что и запрос.
+			# Успех решает sCode каждого ордера: code "1"/"2" - не прошли все или только часть пакета
+			data = response.get('data') or []
+			for j, n in enumerate(numbers):
+				item = data[j] if j < len(data) else {'sCode': response.get('code'), 'sMsg': response.get('msg')}
+				if item.get('sCode', '0') == '0' and item.get('ordId'):
+					ord_id = item['ordId']
+					filled_size = float(item.get('sz', to_send[n]['size']))
+					self._record_order(side, to_send[n], ord_id, filled_size, price)
+					self._failed_levels.pop((side, n), None)
+					results[n] = ord_id
+				else:
+					logging.warning(f"❌Failed to place market {side} order {n}: {item.get('sMsg') or response.get('msg')}")
+					if track_levels:
+						self._failed_levels[(side, n)] = time.monotonic()
+					results[n] = None
+		return results
+
+	async def _resolve_market_order(self, side: str, n: int, order_data: dict, cl_ord_id: str, price, track_levels: bool = True) -> tuple:
+		"""
+		Статус маркет ордера по clOrdId. Возвращает (known, ord_id): (True, ord_id) - ордер на бирже и записан,
+		(True, None) - ордера нет, можно отправлять заново, (False, None) - выяснить не удалось.
+		"""
+		try:
+			response = await self.rest.get_order(instId=self.instrument_id, clOrdId=cl_ord_id)
 		except Exception as e:
-			logging.warning(f"❌Error placing market sell order: {e}")
+			response = {'code': None, 'msg': repr(e)}
+		data = response.get('data') or []
+		if response.get('code') == '0' and data:
+			self._unresolved.pop((side, n), None)
+			item = data[0]
+			state = item.get('state')
+			filled = float(item.get('accFillSz') or 0)
+			if state in ('canceled', 'mmp_canceled') and not filled:
+				return True, None
+			ord_id = item['ordId']
+			logging.info(f"🔸Market {side} order {n} ({cl_ord_id}) is on exchange as {ord_id}, state {state}")
+			self._record_order(side, order_data, ord_id, filled or order_data['size'], price)
+			if state in ('filled', 'partially_filled'):
+				# Push этого исполнения мог прийти, пока ордера не было в strategy_orders
+				self.apply_fill(ord_id, state, filled, float(item.get('avgPx') or 0), float(item.get('notionalUsd') or 0),
+								float(item.get('fee') or 0), int(item.get('uTime') or 0) / 1000)
+			self._failed_levels.pop((side, n), None)
+			return True, ord_id
+		if response.get('code') == ORDER_NOT_FOUND:
+			self._unresolved.pop((side, n), None)
+			return True, None
+		logging.warning(f"❗️ Market {side} order {n} ({cl_ord_id}) status unknown: {response.get('msg')}"
+						+ (", level waits" if track_levels else ""))
+		return False, None
+
+	async def place_market_buy_order(self, order_data: dict, price) -> str:
+		results = await self.place_market_orders('buy', {0: order_data}, price)
+		return results[0]
+
+	async def place_market_sell_order(self, order_data: dict, price) -> str:
+		results = await self.place_market_orders('sell', {0: order_data}, price)
+		return results[0]
+
+	# === order_mode='limit': post-only ордера в стакане ===
+	def _limit_order_args(self, order: RestingOrder) -> dict:
+		args = {
+			'instId': self.instrument_id,
+			'tdMode': "isolated",
+			'side': order.side,
+			'ccy': "USDT",
+			'ordType': "post_only" if order.post_only else "limit",
+			'px': f"{order.price:.{self.rounding.price_decimals}f}",
+			'sz': str(round(order.size, self.lot_precision)),
+			'clOrdId': order.cl_ord_id,
+		}
+		if order.side == 'sell':
+			args['reduceOnly'] = True
+		return args
+
+	async def _batched(self, send, args: list) -> list:
+		"""Отправляет args пакетами по 20, возвращает элементы data ответа в порядке args (исключение - если пакет не ушёл)"""
+		chunks = [args[i:i + 20] for i in range(0, len(args), 20)]
+		responses = await asyncio.gather(*(send(chunk) for chunk in chunks), return_exceptions=True)
+		items = []
+		for chunk, response in zip(chunks, responses):
+			if isinstance(response, Exception):
+				items += [response] * len(chunk)
+				continue
+			data = response.get('data') or []
+			for j in range(len(chunk)):
+				items.append(data[j] if j < len(data) else {'sCode': response.get('code'), 'sMsg': response.get('msg')})
+		return items
+
+	async def _place_resting(self, orders: list) -> int:
+		items = await self._batched(self.send_batch_orders, [self._limit_order_args(o) for o in orders])
+		placed, unknown = 0, []
+		for order, item in zip(orders, items):
+			if isinstance(item, Exception):
+				# Неизвестно, дошёл ли ордер до биржи - снимаем его по clOrdId
+				logging.warning(f"❌Error placing post-only {order.side} {order.level}: {item}")
+				unknown.append(order)
+				self._failed_levels[(order.side, order.level)] = time.monotonic()
+			elif item.get('sCode') == '0' and item.get('ordId'):
+				order.ord_id = item['ordId']
+				self._failed_levels.pop((order.side, order.level), None)
+				placed += 1
+			else:
+				# Чаще всего post-only отклонён, потому что цена уже у уровня: уровень выставится снова не раньше order_retry_delay
+				logging.info(f"🔸Post-only {order.side} {order.level} @ {order.price} rejected: {item.get('sMsg')}")
+				self.resting.remove(order.cl_ord_id)
+				self._failed_levels[(order.side, order.level)] = time.monotonic()
+		if unknown:
+			await self._cancel_resting(unknown)
+		return placed
+
+	async def _amend_resting(self, amends: list) -> int:
+		args = [{'instId': self.instrument_id, 'clOrdId': order.cl_ord_id,
+				 'newPx': f"{price:.{self.rounding.price_decimals}f}", 'newSz': str(round(size, self.lot_precision))}
+				for order, price, size in amends]
+		items = await self._batched(self.send_amend_orders, args)
+		amended = 0
+		for (order, price, size), item in zip(amends, items):
+			if not isinstance(item, Exception) and item.get('sCode') == '0':
+				order.price, order.size = price, size
+				amended += 1
+			else:
+				# Ордер мог успеть исполниться - тогда всё решит push из канала orders, иначе повтор на следующем синке
+				logging.info(f"🔸Amend {order.side} {order.level} -> {price} failed: {item if isinstance(item, Exception) else item.get('sMsg')}")
+		return amended
+
+	async def _cancel_resting(self, orders: list) -> int:
+		args = [{'instId': self.instrument_id, 'clOrdId': order.cl_ord_id} for order in orders]
+		items = await self._batched(self.send_cancel_orders, args)
+		canceled = 0
+		for order, item in zip(orders, items):
+			if not isinstance(item, Exception) and item.get('sCode') == '0':
+				# Запись ждёт push canceled: только в нём итоговый accFillSz, исполненную часть учтёт apply_resting_update
+				self.resting.detach(order.cl_ord_id)
+				canceled += 1
+			elif order.ord_id is None:
+				# Биржа ордер так и не подтвердила - ждать по нему событий нечего
+				self.resting.remove(order.cl_ord_id)
+			else:
+				# Уже исполнен или снят: запись уберёт push из канала orders
+				logging.info(f"🔸Cancel {order.side} {order.level} failed: {item if isinstance(item, Exception) else item.get('sMsg')}")
+		return canceled
+
+	async def sync_resting(self, price: float = None) -> dict:
+		"""
+		Приводит ордера в стакане к текущей цене (вызывается под state_lock):
+		- на resting_levels ближайших не пересечённых buy и sell уровнях стоят post-only ордера;
+		- уровни, которые цена уже пересекла (разрыв цены, уровень 0 выше рынка при построении сетки),
+		  получают обычный лимитный ордер по цене уровня - он исполняется сразу, как маркет в order_mode='market';
+		- ордера за краем окна и на уровнях, которых больше нет, снимаются, сдвинутые пересчётом сетки - amend;
+		- уровень, ордер которого отклонён или остался без ответа, выставляется снова не раньше order_retry_delay.
+		Возвращает {'placed', 'amended', 'canceled'} или None, если менять ничего не нужно.
+		"""
+		if price is None:
+			price = self.last_price
+		if price is None:
+			return None
+		self.last_price = price
+		# С фидом стакана price - (bid, ask): buy окно считается от ask, sell окно от bid
+		bid, ask = price if type(price) is tuple else (price, price)
+
+		cancels, amends, places = [], [], []
+		for side, grid_orders in (('buy', self.buy_grid_orders), ('sell', self.sell_grid_orders)):
+			side_price = ask if side == 'buy' else bid
+			crossed = self.grid_book.crossed_buys(side_price) if side == 'buy' else self.grid_book.crossed_sells(side_price)
+			wanted = {n: (grid_orders[n]['entry_price'], grid_orders[n]['size'], False) for n in crossed}
+			for entry_price, n in self.grid_book.nearest(side, side_price, self.resting_levels):
+				wanted[n] = (entry_price, grid_orders[n]['size'], True)
+			for order in [o for o in self.resting.values() if o.side == side]:
+				target = wanted.pop(order.level, None)
+				if order.canceled:
+					# Снятый ордер ещё ждёт итоговый push - новый на его уровень не ставим
+					continue
+				if order.filled and self.grid_book.is_live(side, order.level):
+					# Частично исполненный ордер живого уровня не трогаем до конца исполнения
+					continue
+				if target is None:
+					cancels.append(order)
+				elif target[:2] != (order.price, order.size):
+					amends.append((order, target[0], target[1]))
+			# Уровень, ордер которого биржа только что отклонила, ждёт order_retry_delay, как в маркет режиме
+			for n in self.ready_levels(side, list(wanted)):
+				entry_price, size, post_only = wanted[n]
+				places.append(self.resting.new(side, n, entry_price, size, post_only))
+
+		if not (cancels or amends or places):
+			return None
+		placed, amended, canceled = await asyncio.gather(
+			self._place_resting(places), self._amend_resting(amends), self._cancel_resting(cancels)
+		)
+		return {'placed': placed, 'amended': amended, 'canceled': canceled}
+
+	async def cancel_resting(self) -> int:
+		"""Снимает все ордера из стакана (пауза, остановка)"""
+		orders = [order for order in self.resting.values() if not order.canceled]
+		if not orders:
+			return 0
+		canceled = await self._cancel_resting(orders)
+		logging.info(f"🔶{self.instrument_id}: {canceled} resting orders canceled")
+		return canceled
+
+	async def close_leftovers(self, leftovers: dict, price) -> dict:
+		"""
+		Сброс сетки с открытыми уровнями: сначала снимаются их продажи из стакана, затем по рынку продаётся
+		только то, что биржа не успела исполнить. Не снятая продажа уже исполнилась и позицию закрыла сама.
+		"""
+		orders = [order for order in (self.resting.at('sell', n) for n in leftovers) if order is not None]
+		if orders:
+			await self._cancel_resting(orders)
+		to_sell = {}
+		for order in orders:
+			# Исполнение (или снятие с частичным исполнением) придёт push'ем уже после сброса -
+			# PnL исполненной части посчитаем по сохранённому уровню
+			self.orphaned[order.cl_ord_id] = dict(leftovers[order.level])
+			if order.canceled:
+				level = leftovers[order.level]
+				level['size'] = round(level['size'] - order.filled, self.lot_precision)
+				if level['size'] > 0:
+					to_sell[order.level] = level
+		busy = {order.level for order in orders}
+		to_sell.update({n: level for n, level in leftovers.items() if n not in busy})
+		return await self.place_market_orders('sell', to_sell, price, track_levels=False)
+
+	async def cancel_stale_orders(self) -> int:
+		"""При старте снимает ордера бота, оставшиеся в стакане с прошлого запуска (clOrdId с префиксом RestingOrders.PREFIXES)"""
+		response = await self.rest.get_orders_pending(instType="SWAP", instId=self.instrument_id)
+		stale = [{'instId': self.instrument_id, 'ordId': item['ordId']} for item in response.get('data') or []
+				 if (item.get('clOrdId') or '').startswith(RestingOrders.PREFIXES)]
+		if stale:
+			await self._batched(self.send_cancel_orders, stale)
+			logging.warning(f"❗️ {self.instrument_id}: canceled {len(stale)} resting orders left from previous run")
+		return len(stale)
+
+	def apply_resting_update(self, update):
+		"""
+		Событие канала orders для ордера из стакана (вызывается под state_lock).
+		Исполнение открывает или закрывает уровень теми же методами, что и маркет режим, снятый ордер
+		с частичным исполнением - на исполненный объём. Возвращает (side, reset, leftovers) для исполнений, иначе None.
+		leftovers - уровни, которые ещё держали позицию, когда продажа уровня 0 сбросила сетку: их надо продать.
+		"""
+		order = self.resting.get(update.cl_ord_id)
+		if order is None:
+			return None
+		order.ord_id = update.ord_id or order.ord_id
+		if update.state == 'partially_filled':
+			order.filled = update.acc_fill_sz
+			return None
+		if update.state not in ('filled', 'canceled', 'mmp_canceled'):
+			return None
+		self.resting.remove(order.cl_ord_id)
+		orphan = self.orphaned.pop(order.cl_ord_id, None)
+		size = update.acc_fill_sz
+		if not size:
+			return None
+
+		n = order.level
+		ts = update.u_time / 1000
+		if orphan is not None:
+			self._record_order('sell', {**orphan, 'size': size}, order.ord_id, size, update.avg_px)
+			self.apply_fill(order.ord_id, update.state, size, update.avg_px, update.notional_usd, update.fee, ts)
+			return 'sell', False, {}
+		grid_orders = self.buy_grid_orders if order.side == 'buy' else self.sell_grid_orders
+		level = grid_orders.get(n)
+		if level is None:
+			logging.warning(f"❗️ {self.instrument_id}: {order} filled {size} after its level was removed")
 			return None
-		
\ No newline at end of file
+		if order.side == 'buy':
+			self._record_order('buy', level, order.ord_id, size, update.avg_px)
+			self.apply_fill(order.ord_id, update.state, size, update.avg_px, update.notional_usd, update.fee, ts)
+			self.open_level(n, order.ord_id)
+			if round(self.sell_grid_orders[n]['size'] - size, self.lot_precision) != 0:
+				self.resize_level(n, size)
+			return 'buy', False, {}
+		if round(level['size'] - size, self.lot_precision) > 0:
+			self.reduce_level(n, size, update.avg_px, update.fee)
+			return 'sell', False, {}
+		self._record_order('sell', level, order.ord_id, size, update.avg_px)
+		self.apply_fill(order.ord_id, update.state, size, update.avg_px, update.notional_usd, update.fee, ts)
+		leftovers = {}
+		if n == 0:
+			leftovers = {m: dict(self.sell_grid_orders[m]) for m in self.strategy_orders.by_level if m in self.sell_grid_orders}
+		return 'sell', self.close_level(n), leftovers
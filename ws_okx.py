@@ -1,11 +1,14 @@
 import logging
 import websockets
 import asyncio
-import json
 import hmac
+import random
 import time 
 import hashlib
 import base64
+from price_mailbox import PriceMailbox
+from orderbook import BOOK_CHANNELS, BookDesync, OrderBook
+from decode_okx import loads, dumps, decode_tickers, decode_books, decode_private, Ticker
 
 logging.basicConfig(
     level=logging.INFO,
@@ -16,69 +19,262 @@ logging.basicConfig(
     ]
 )
 
+# op приватного WS -> REST endpoint: OKX считает лимиты ордеров общими для WS и REST
+WS_ORDER_PATHS = {
+	"order": "/api/v5/trade/order",
+	"batch-orders": "/api/v5/trade/batch-orders",
+	"batch-cancel-orders": "/api/v5/trade/cancel-batch-orders",
+	"batch-amend-orders": "/api/v5/trade/amend-batch-orders",
+}
+
+
+class OrderChannelUnavailable(Exception):
+	"""Приватный WS не подключен: ордер не отправлялся и его можно безопасно отправить через REST"""
+
+
+class FeedConnection:
+	"""Одно из публичных соединений: сокет и счётчики для слияния фидов и контроля зависаний"""
+	__slots__ = ('index', 'ws', 'task', 'last_rx', 'last_data', 'frames', 'first', 'reconnects', 'failures')
+
+	def __init__(self, index: int):
+		self.index = index
+		self.ws = None
+		self.task = None
+		self.last_rx = 0.0    # time.monotonic() последнего кадра (включая pong)
+		self.last_data = 0.0  # time.monotonic() последнего кадра с данными
+		self.frames = 0       # сколько кадров с данными пришло
+		self.first = 0        # сколько обновлений применено с этого соединения (пришли раньше копий с других)
+		self.reconnects = 0
+		self.failures = 0     # неудачных подключений подряд, от них считается задержка переподключения
+
+	def stats(self) -> dict:
+		return {'frames': self.frames, 'first': self.first, 'reconnects': self.reconnects,
+				'connected': self.ws is not None, 'idle_s': round(time.monotonic() - self.last_data, 3) if self.last_data else None}
+
+
 class WebSocketClient:
-	def __init__(self, api_key, secret_key, passphrase, instrument_id, price_queue: asyncio.Queue, orders_queue: asyncio.Queue):
-		self.instrument_id = instrument_id
-		self.price_queue = price_queue
-		self.orders_queue = orders_queue
+	"""
+	Общие для всех инструментов соединения: одно публичное, одно приватное и одно business.
+	Инструменты регистрируются через add_instrument(), подписки отправляются одним списком args,
+	а входящие сообщения раскладываются по каналам инструмента по instId.
+	"""
+
+	def __init__(self, api_key, secret_key, passphrase, candle_bar: str = None, public: bool = True, private: bool = True,
+				 ws_url: str = "wss://ws.okx.com:8443", book_channel: str = None, public_connections: int = 1,
+				 scheduler=None):
+		# instId -> {'price_mailbox', 'orders_queue', 'candle_queue'}
+		self.routes = {}
+		# public=False - цены приходят из шины рыночных данных (md_bus), private=False - процесс фида без ключей
+		self.public = public
+		self.private = private
+		# Колбэки listener(Ticker) на каждый тикер целиком (bid/ask/ts), например публикация в md_bus
+		self.tick_listeners = []
+		# Колбэки listener(OrderUpdate) на каждое обновление канала orders, например запись фида (recorder)
+		self.order_listeners = []
+		# None - цены из канала tickers (last). bbo-tbt / books5 / books - локальный стакан на инструмент,
+		# в price_mailbox уходит (bid, ask): покупки срабатывают по лучшему ask, продажи по лучшему bid
+		if book_channel is not None and book_channel not in BOOK_CHANNELS:
+			raise ValueError(f"book_channel must be one of {BOOK_CHANNELS}, got {book_channel!r}")
+		self.book_channel = book_channel
+		self.books = {}  # instId -> OrderBook
+		# Свечи (канал candle{bar}) идут через business endpoint, если candle_bar не задан - не подключаемся
+		self.candle_bar = candle_bar
 
-		self.public_url = "wss://ws.okx.com:8443/ws/v5/public"
-		self.private_url = "wss://ws.okx.com:8443/ws/v5/private"
+		# ws_url можно направить на локальный симулятор (okx_sim.py)
+		self.public_url = f"{ws_url}/ws/v5/public"
+		self.private_url = f"{ws_url}/ws/v5/private"
+		self.business_url = f"{ws_url}/ws/v5/business"
 		self.api_key = api_key
 		self.secret_key = secret_key
 		self.passphrase = passphrase
 
-		self.public_ws = None
+		# public_connections > 1 - горячий резерв: несколько соединений с одинаковыми подписками,
+		# каждое обновление применяется по первой пришедшей копии (ts тикера, ts + seqId стакана), остальные отбрасываются
+		self.feeds = [FeedConnection(i) for i in range(max(1, public_connections))]
+		self._last_ts = {}  # instId -> ts последнего применённого тикера (только при нескольких соединениях)
 		self.private_ws = None
+		self.business_ws = None
 
 		self.running = True
+		# Переподключение: экспоненциальная задержка от reconnect_delay до reconnect_max_delay со случайным разбросом
 		self.reconnect_delay = 2
+		self.reconnect_max_delay = 30
+		# Приватный и business сокеты: неудачных подключений подряд. Сбрасывается только сессией,
+		# которая после логина и подписки продержалась healthy_session секунд
+		self.healthy_session = 30
+		self.private_failures = 0
+		self.business_failures = 0
+		# Зависание: нет кадров ping_interval секунд - отправляем "ping", нет ничего stall_timeout секунд - переподключаемся
+		self.ping_interval = 5
+		self.stall_timeout = 15
 
-		self.public_task = None
 		self.private_task = None
+		self.business_task = None
+
+		# Order entry через приватный WS: ответы сопоставляются с запросами по id
+		self.private_ready = False
+		self.order_timeout = 5
+		# RequestScheduler REST клиента: ордера через WS берут токены из тех же корзин лимитов, что и REST
+		self.scheduler = scheduler
+		self._request_id = 0
+		self._pending_requests = {}
+
+	def add_instrument(self, instrument_id: str, price_mailbox: PriceMailbox, orders_queue: asyncio.Queue, candle_queue: asyncio.Queue = None):
+		"""Регистрирует инструмент до start(): его тикеры, ордера и свечи будут приходить в эти каналы"""
+		self.routes[instrument_id] = {
+			'price_mailbox': price_mailbox,
+			'orders_queue': orders_queue,
+			'candle_queue': candle_queue,
+		}
+		if self.book_channel:
+			self.books[instrument_id] = OrderBook()
+
+	def _backoff(self, failures: int) -> float:
+		"""Задержка перед переподключением: половина экспоненты фиксирована, половина случайна"""
+		delay = min(self.reconnect_max_delay, self.reconnect_delay * 2 ** failures)
+		return delay / 2 + random.uniform(0, delay / 2)
 
-	async def connect_public(self):
+	async def connect_public(self, feed: FeedConnection):
 		while self.running:
+			connected = time.monotonic()
 			try:
 				async with websockets.connect(self.public_url) as ws:
-					self.public_ws = ws
-					await self.subscribe_public()
-					await self.listen_public()
+					feed.ws = ws
+					feed.last_rx = feed.last_data = connected
+					await self.subscribe_public(ws)
+					watchdog = asyncio.create_task(self.watch_public(feed))
+					try:
+						await self.listen_public(feed)
+					finally:
+						watchdog.cancel()
+				# Чистое закрытие сервером (или watch_public) - тоже через backoff, без цикла мгновенных переподключений
+				reason = "closed"
 			except Exception as e:
-				if not self.running:
-					break
-				logging.warning(f"❗️ Public WS error: {e}, reconnecting in {self.reconnect_delay}s")
-				await asyncio.sleep(self.reconnect_delay)
+				reason = f"error: {e}"
+			finally:
+				feed.ws = None
+			if not self.running:
+				break
+			if feed.last_data > connected:
+				# Соединение успело отдать данные - задержка снова с минимальной
+				feed.failures = 0
+			delay = self._backoff(feed.failures)
+			feed.failures += 1
+			logging.warning(f"❗️ Public WS #{feed.index} {reason}, reconnecting in {delay:.1f}s")
+			await asyncio.sleep(delay)
+			feed.reconnects += 1
+
+	async def watch_public(self, feed: FeedConnection):
+		"""
+		Контроль зависания соединения, оно закрывается (и переподключается), если:
+		- дольше stall_timeout не пришло ничего, хотя после ping_interval тишины отправлен "ping" (OKX отвечает "pong");
+		- сокет отвечает, но данных нет дольше stall_timeout, а по другим соединениям они идут.
+		"""
+		ws = feed.ws
+		while True:
+			await asyncio.sleep(self.ping_interval / 2)
+			now = time.monotonic()
+			idle = now - feed.last_rx
+			if idle >= self.stall_timeout:
+				reason = f"silent for {idle:.1f}s"
+			elif now - feed.last_data >= self.stall_timeout and any(
+					now - other.last_data < self.ping_interval for other in self.feeds if other is not feed):
+				reason = f"no data for {now - feed.last_data:.1f}s while other connections receive it"
+			else:
+				if idle >= self.ping_interval:
+					try:
+						await ws.send('ping')
+					except websockets.ConnectionClosed:
+						# Сокет закрылся между проверкой и отправкой - переподключением займётся connect_public
+						return
+				continue
+			logging.warning(f"❗️ Public WS #{feed.index} stalled: {reason}, reconnecting")
+			await ws.close()
+			return
+
+	def _session_backoff(self, failures: int, established: float) -> tuple:
+		"""(задержка, новый счётчик неудач) после закрытия приватного или business сокета"""
+		if established is not None and time.monotonic() - established >= self.healthy_session:
+			failures = 0
+		return self._backoff(failures), failures + 1
 
 	async def connect_private(self):
 		while self.running:
+			established = None
 			try:
 				async with websockets.connect(self.private_url) as ws:
 					self.private_ws = ws
 					await self.login()
 					await self.subscribe_private()
+					self.private_ready = True
+					established = time.monotonic()
 					await self.listen_private()
+				# Чистое закрытие сервером - тоже через backoff, как у публичного сокета
+				reason = "closed"
+			except Exception as e:
+				reason = f"error: {e}"
+			finally:
+				self.private_ready = False
+				self._fail_pending_requests()
+			if not self.running:
+				break
+			delay, self.private_failures = self._session_backoff(self.private_failures, established)
+			logging.warning(f"❗️ Private WS {reason}, reconnecting in {delay:.1f}s")
+			await asyncio.sleep(delay)
+
+	async def connect_business(self):
+		while self.running:
+			established = None
+			try:
+				async with websockets.connect(self.business_url) as ws:
+					self.business_ws = ws
+					await self.subscribe_candles()
+					established = time.monotonic()
+					await self.listen_business()
+				reason = "closed"
 			except Exception as e:
-				if not self.running:
-					break
-				logging.warning(f"❗️ Private WS error: {e}, reconnecting in {self.reconnect_delay}s")
-				await asyncio.sleep(self.reconnect_delay)
+				reason = f"error: {e}"
+			if not self.running:
+				break
+			delay, self.business_failures = self._session_backoff(self.business_failures, established)
+			logging.warning(f"❗️ Business WS {reason}, reconnecting in {delay:.1f}s")
+			await asyncio.sleep(delay)
 
-	async def subscribe_public(self):
+	async def subscribe_public(self, ws):
+		channel = self.book_channel or "tickers"
 		msg = {
 			"op": "subscribe",
-			"args": [{"channel": "tickers", "instId": self.instrument_id}]
+			"args": [{"channel": channel, "instId": inst_id} for inst_id in self.routes]
 		}
-		await self.public_ws.send(json.dumps(msg))
-		logging.info(f"✅ Subscribed to public tickers for {self.instrument_id}")
+		await ws.send(dumps(msg))
+		logging.info(f"✅ Subscribed to public {channel} for {list(self.routes)}")
+
+	async def resubscribe_book(self, ws, inst_id: str):
+		"""Стакан разошёлся с биржей: переподписка на инструмент, OKX пришлёт новый снимок"""
+		book = self.books[inst_id]
+		book.reset()
+		book.resyncs += 1
+		arg = {"channel": self.book_channel, "instId": inst_id}
+		await ws.send(dumps({"op": "unsubscribe", "args": [arg]}))
+		await ws.send(dumps({"op": "subscribe", "args": [arg]}))
+
+	async def subscribe_candles(self):
+		inst_ids = [inst_id for inst_id, route in self.routes.items() if route['candle_queue'] is not None]
+		msg = {
+			"op": "subscribe",
+			"args": [{"channel": f"candle{self.candle_bar}", "instId": inst_id} for inst_id in inst_ids]
+		}
+		await self.business_ws.send(dumps(msg))
+		logging.info(f"✅ Subscribed to candle{self.candle_bar} for {inst_ids}")
 
 	async def subscribe_private(self):
+		# Одна подписка на все SWAP ордера, дальше они раскладываются по instId
 		msg = {
 			"op": "subscribe",
-			"args": [{"channel": "orders", "instType": "SWAP", "instId": self.instrument_id}]
+			"args": [{"channel": "orders", "instType": "SWAP"}]
 		}
-		await self.private_ws.send(json.dumps(msg))
-		logging.info(f"✅ Subscribed to private orders for {self.instrument_id}")
+		await self.private_ws.send(dumps(msg))
+		logging.info(f"✅ Subscribed to private orders for {list(self.routes)}")
 
 	async def login(self):
 		timestamp = str(time.time())
@@ -97,49 +293,213 @@ class WebSocketClient:
 				"sign": sign
 			}]
 		}
-		await self.private_ws.send(json.dumps(login_msg))
+		await self.private_ws.send(dumps(login_msg))
 
 		async for msg in self.private_ws:
-			data = json.loads(msg)
+			data = loads(msg)
 			if data.get("event") == "login" and data.get("code") == "0":
 				logging.info("✅ Login successful")
 				break
 			elif data.get("event") == "login" and data.get("code") != "0":
 				raise Exception(f"❗️Login failed: {data}")
 
-	async def listen_public(self):
-		async for msg in self.public_ws:
-			data = json.loads(msg)
-			if "arg" in data and data["arg"].get("channel") == "tickers":
-				for tick in data.get("data", []):
-					price = tick.get("last")
-					# Кладём цену в очередь, очищая предыдущие, если есть
-					if self.price_queue.full():
-						_ = self.price_queue.get_nowait()
-					await self.price_queue.put(float(price))
-					# print(f"Public price updated: {price}")
+	async def listen_public(self, feed: FeedConnection):
+		if self.book_channel:
+			return await self.listen_books(feed)
+		dedup = len(self.feeds) > 1
+		last_ts = self._last_ts
+		async for msg in feed.ws:
+			feed.last_rx = time.monotonic()
+			try:
+				inst_id, ticks = decode_tickers(msg)
+			except (KeyError, TypeError, ValueError) as e:
+				logging.warning(f"❗️ Bad public WS frame: {e}")
+				continue
+			if inst_id is None:
+				if ticks is not None and not ticks.ok:
+					logging.warning(f"❗️ Public WS event: {ticks}")
+				continue
+			feed.frames += 1
+			feed.last_data = feed.last_rx
+			route = self.routes.get(inst_id)
+			if route is None:
+				continue
+			for tick in ticks:
+				if dedup:
+					# Тикер с таким ts уже пришёл по другому соединению (или этот устарел)
+					if tick.ts <= last_ts.get(inst_id, 0):
+						continue
+					last_ts[inst_id] = tick.ts
+				feed.first += 1
+				# Перезаписываем непрочитанную цену: стратегия всегда получает самую свежую
+				route['price_mailbox'].put(tick.last)
+				# print(f"Public price updated: {tick.last}")
+				for listener in self.tick_listeners:
+					listener(tick)
+
+	async def listen_books(self, feed: FeedConnection):
+		"""
+		Push стакана применяется к OrderBook инструмента (books - с проверкой seqId и checksum).
+		Стакан общий для всех соединений: снимок не новее (ts, seqId) стакана и обновление с уже применённым
+		seqId - копии с другого соединения, они отбрасываются.
+		В price_mailbox кладётся (bid, ask), только если изменился верх стакана: изменения глубже стратегию не будят.
+		"""
+		checksums = self.book_channel == 'books'
+		async for msg in feed.ws:
+			feed.last_rx = time.monotonic()
+			try:
+				inst_id, updates = decode_books(msg)
+			except (KeyError, TypeError, ValueError) as e:
+				logging.warning(f"❗️ Bad public WS frame: {e}")
+				continue
+			if inst_id is None:
+				if updates is not None and not updates.ok:
+					logging.warning(f"❗️ Public WS event: {updates}")
+				continue
+			feed.frames += 1
+			feed.last_data = feed.last_rx
+			route = self.routes.get(inst_id)
+			if route is None:
+				continue
+			book = self.books[inst_id]
+			top = book.top() if book.synced else None
+			try:
+				for update in updates:
+					if update.action == 'snapshot':
+						if book.synced and (update.ts, update.seq_id or 0) <= (book.ts, book.seq_id or 0):
+							continue
+						book.snapshot(update.bids, update.asks, update.seq_id, update.ts)
+					elif not book.synced:
+						# Обновления до нового снимка не к чему применять
+						continue
+					elif update.prev_seq_id != book.seq_id and update.seq_id is not None and update.seq_id <= book.seq_id:
+						continue
+					else:
+						book.update(update.bids, update.asks, update.seq_id, update.prev_seq_id, update.ts)
+					feed.first += 1
+					if checksums and update.checksum is not None:
+						book.verify(update.checksum)
+			except BookDesync as e:
+				logging.warning(f"❗️ {inst_id} order book desync on public WS #{feed.index}: {e}, resubscribing")
+				await self.resubscribe_book(feed.ws, inst_id)
+				continue
+			new_top = book.top() if book.synced else None
+			if new_top is None or new_top == top:
+				continue
+			route['price_mailbox'].put(new_top)
+			if self.tick_listeners:
+				# Для записи и шины рыночных данных last - середина спреда
+				bid, ask = new_top
+				tick = Ticker(inst_id, (bid + ask) / 2, bid, ask, book.ts)
+				for listener in self.tick_listeners:
+					listener(tick)
+
+	async def listen_business(self):
+		channel = f"candle{self.candle_bar}"
+		async for msg in self.business_ws:
+			if not msg.startswith('{"arg"'):
+				continue
+			data = loads(msg)
+			if data["arg"].get("channel") == channel:
+				route = self.routes.get(data["arg"].get("instId"))
+				if route is None or route['candle_queue'] is None:
+					continue
+				for candle in data.get("data", []):
+					# Нужны только закрытые свечи: confirm == "1"
+					if candle[8] == "1":
+						await route['candle_queue'].put(candle)
 
 	async def listen_private(self):
 		async for msg in self.private_ws:
-			data = json.loads(msg)
-			if "arg" in data and data["arg"].get("channel") == "orders":
-				orders = data.get("data", [])
+			try:
+				kind, payload = decode_private(msg)
+			except (KeyError, TypeError, ValueError) as e:
+				logging.warning(f"❗️ Bad private WS frame: {e}")
+				continue
+			if kind == 'response':
+				future = self._pending_requests.pop(payload["id"], None)
+				if future and not future.done():
+					future.set_result(payload)
+			elif kind == 'orders':
 				# Only enqueue when there are actual order updates
-				if orders:
-					# print(f"Private orders update: {orders}")
-					await self.orders_queue.put(data)
+				if not payload:
+					continue
+				# print(f"Private orders update: {payload}")
+				# Время получения нужно для замера задержки обработки исполнений
+				received_at = time.monotonic()
+				by_instrument = {}
+				for update in payload:
+					by_instrument.setdefault(update.inst_id, []).append(update)
+					for listener in self.order_listeners:
+						listener(update)
+				for inst_id, updates in by_instrument.items():
+					route = self.routes.get(inst_id)
+					if route is not None:
+						await route['orders_queue'].put((received_at, updates))
+			elif kind == 'event' and not payload.ok:
+				logging.warning(f"❗️ Private WS event: {payload}")
+
+	# === Order entry over private WS ===
+	async def send_order_request(self, op: str, args: list) -> dict:
+		"""
+		Отправляет op ордеров (order, batch-orders, batch-cancel-orders, batch-amend-orders)
+		в залогиненный приватный WS и ждёт ответ с тем же id.
+		Если сокет не готов - OrderChannelUnavailable (ордер точно не ушёл).
+		Если соединение упало уже после отправки - ConnectionError: повторять через REST нельзя.
+		"""
+		if not self.private_ready or self.private_ws is None:
+			raise OrderChannelUnavailable("private WS is not connected")
+		if self.scheduler is not None:
+			await self.scheduler.admit(WS_ORDER_PATHS[op], body=args)
+			# Пока ждали токены, сокет мог отключиться - ордер ещё не ушёл
+			if not self.private_ready or self.private_ws is None:
+				raise OrderChannelUnavailable("private WS disconnected while waiting for rate limit")
+
+		self._request_id += 1
+		request_id = str(self._request_id)
+		future = asyncio.get_running_loop().create_future()
+		self._pending_requests[request_id] = future
+		try:
+			try:
+				await self.private_ws.send(dumps({"id": request_id, "op": op, "args": args}))
+			except Exception as e:
+				raise OrderChannelUnavailable(f"private WS send failed: {e}") from e
+			return await asyncio.wait_for(future, self.order_timeout)
+		finally:
+			self._pending_requests.pop(request_id, None)
+
+	async def place_order(self, **order) -> dict:
+		return await self.send_order_request("order", [order])
+
+	async def place_batch_orders(self, orders: list) -> dict:
+		return await self.send_order_request("batch-orders", orders)
+
+	async def cancel_batch_orders(self, orders: list) -> dict:
+		return await self.send_order_request("batch-cancel-orders", orders)
+
+	async def amend_batch_orders(self, orders: list) -> dict:
+		return await self.send_order_request("batch-amend-orders", orders)
+
+	def _fail_pending_requests(self):
+		for future in self._pending_requests.values():
+			if not future.done():
+				future.set_exception(ConnectionError("private WS closed before order response"))
+		self._pending_requests.clear()
 
 	async def start(self):
 		try:
 			self.running = True
 			# Launch both connect tasks
-			self.public_task = asyncio.create_task(self.connect_public())
-			self.private_task = asyncio.create_task(self.connect_private())
+			if self.public:
+				for feed in self.feeds:
+					feed.task = asyncio.create_task(self.connect_public(feed))
+			if self.private:
+				self.private_task = asyncio.create_task(self.connect_private())
+			if self.candle_bar and any(route['candle_queue'] is not None for route in self.routes.values()):
+				self.business_task = asyncio.create_task(self.connect_business())
 			# Wait until either task ends (e.g., on shutdown)
-			if self.public_task and self.private_task:
-				await asyncio.gather(self.public_task, self.private_task)
-			elif self.private_task:
-				await asyncio.gather(self.private_task)
+			tasks = [feed.task for feed in self.feeds if feed.task] + [t for t in (self.private_task, self.business_task) if t]
+			await asyncio.gather(*tasks)
 		except Exception as e:
 			logging.warning(e)
 
@@ -147,22 +507,32 @@ class WebSocketClient:
 		logging.info("🌀 Shutting down WebSocket manager...")
 		self.running = False
 
-		if self.public_ws:
-			await self.public_ws.close()
+		for feed in self.feeds:
+			if feed.ws:
+				await feed.ws.close()
 		if self.private_ws:
 			await self.private_ws.close()
+		if self.business_ws:
+			await self.business_ws.close()
 
-		if self.public_task:
-			self.public_task.cancel()
-			try:
-				await self.public_task
-			except asyncio.CancelledError:
-				pass
+		for feed in self.feeds:
+			if feed.task:
+				feed.task.cancel()
+				try:
+					await feed.task
+				except asyncio.CancelledError:
+					pass
 		if self.private_task:
 			self.private_task.cancel()
 			try:
 				await self.private_task
 			except asyncio.CancelledError:
 				pass
+		if self.business_task:
+			self.business_task.cancel()
+			try:
+				await self.business_task
+			except asyncio.CancelledError:
+				pass
 
 		logging.info("✅ WebSocket manager stopped")